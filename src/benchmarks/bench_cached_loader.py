@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+import cached_loader
+from data_cleaning import LoadSeriesTable, LoadStatCanTable, SERIES_COLUMNS, SERIES_DTYPES
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import generate_income
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time parsing a series table against the loader cache's disk and memory hits.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000], help="Row counts to time")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'load':<22} {'seconds':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        cached_loader.CACHE_DIR = os.path.join(folder, 'cache')
+        for n_rows in args.rows:
+            path = os.path.join(folder, f'series_{n_rows}.csv')
+            generate_income(path, n_rows)
+
+            parse_time, expected = timed(lambda: LoadStatCanTable(path, SERIES_COLUMNS, SERIES_DTYPES))
+            cached_loader.clear_cache()
+            cold_time, _ = timed(lambda: LoadSeriesTable(path))
+            # A new process only has the disk cache
+            cached_loader._memory.clear()
+            disk_time, from_disk = timed(lambda: LoadSeriesTable(path))
+            memory_time, from_memory = timed(lambda: LoadSeriesTable(path))
+
+            for result in (from_disk, from_memory):
+                pd.testing.assert_frame_equal(result, expected)
+            print(f"{n_rows:>10,} {'parse':<22} {parse_time:9.4f}")
+            print(f"{n_rows:>10,} {'parse, then cache':<22} {cold_time:9.4f} {parse_time / cold_time:7.2f}x")
+            print(f"{n_rows:>10,} {'disk cache hit':<22} {disk_time:9.4f} {parse_time / disk_time:7.1f}x")
+            print(f"{n_rows:>10,} {'memory cache hit':<22} {memory_time:9.4f} {parse_time / memory_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from cli import COMMANDS
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning', 'cli.py')
+
+# What every analysis script imported at the top before the CLI: the whole plotting and statistics stack
+EAGER_IMPORTS = "import pandas, matplotlib.pyplot, seaborn, scipy.stats, statsmodels.stats.multicomp"
+
+
+def best_time(command, repeat):
+    """Best wall time (s) of repeat runs of a command in a new interpreter."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time starting the CLI and each subcommand (up to its argument parsing) in a new interpreter.")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    baseline = best_time([sys.executable, '-c', EAGER_IMPORTS], args.repeat)
+    print(f"{'startup':<34} {'seconds':>9} {'vs eager':>9}")
+    print(f"{'eager imports (before the CLI)':<34} {baseline:9.3f}")
+    print(f"{'python (empty)':<34} {best_time([sys.executable, '-c', 'pass'], args.repeat):9.3f}")
+    cli_time = best_time([sys.executable, CLI, '--help'], args.repeat)
+    print(f"{'cli.py --help':<34} {cli_time:9.3f} {baseline / cli_time:8.1f}x")
+    for name in COMMANDS:
+        seconds = best_time([sys.executable, CLI, name, '--help'], args.repeat)
+        print(f"{'cli.py ' + name + ' --help':<34} {seconds:9.3f} {baseline / seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from figures import bar_chart, plt, render_all, sns
+from parallel_stats import WORKERS
+
+
+def region_summary(n_products, seed=0):
+    """An urban_vs_rural_summary.csv shaped table: one average price per product and region type."""
+    rng = np.random.default_rng(seed)
+    products = [f"Product {i:04d}, 1 unit" for i in range(n_products)]
+    return pd.DataFrame({
+        'Products': np.repeat(products, 2),
+        'region_type': ['Rural', 'Urban'] * n_products,
+        'region_avg': rng.uniform(1, 30, 2 * n_products).round(2),
+    })
+
+
+def draw_seaborn(data):
+    plt.figure(figsize=(16, 10))
+    sns.barplot(data=data, x='Products', y='region_avg', hue='region_type', palette='viridis')
+    plt.xticks(rotation=90, fontsize=6)
+    plt.tight_layout()
+
+
+def draw_fast(data):
+    plt.figure(figsize=(16, 10))
+    bar_chart(data, x='Products', y='region_avg', hue='region_type', palette='viridis')
+    plt.xticks(rotation=90, fontsize=6)
+    plt.tight_layout()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time drawing the urban / rural bar chart and rendering a batch of figures.")
+    parser.add_argument('--products', type=int, nargs='+', default=[110, 500, 2000], help="Products (bar pairs) per chart")
+    parser.add_argument('--figures', type=int, default=8, help="Figures in the rendered batch")
+    parser.add_argument('--workers', type=int, default=max(WORKERS, os.cpu_count() or 1), help="Processes rendering the batch")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'bars':>6} {'chart':<22} {'seconds':>9} {'speedup':>8}")
+        for n_products in args.products:
+            data = region_summary(n_products)
+            seaborn_time, _ = timed(lambda: render_all([(draw_seaborn, data, os.path.join(folder, 'seaborn.png'))], workers=1))
+            fast_time, _ = timed(lambda: render_all([(draw_fast, data, os.path.join(folder, 'fast.png'))], workers=1))
+            print(f"{2 * n_products:>6,} {'sns.barplot':<22} {seaborn_time:9.3f}")
+            print(f"{2 * n_products:>6,} {'bar_chart':<22} {fast_time:9.3f} {seaborn_time / fast_time:7.1f}x")
+
+        figures = [(draw_fast, region_summary(500, seed), os.path.join(folder, f"batch_{seed}.png"))
+                   for seed in range(args.figures)]
+        for path in [figure[2] for figure in figures]:
+            if os.path.exists(path):
+                os.remove(path)
+        serial_time, _ = timed(lambda: render_all(figures, workers=1))
+        for path in [figure[2] for figure in figures]:
+            os.remove(path)
+        pool_time, _ = timed(lambda: render_all(figures, workers=args.workers))
+        cached_time, drawn = timed(lambda: render_all(figures, workers=args.workers))
+        if any(drawn):
+            raise AssertionError("Unchanged figures were drawn again")
+
+        print(f"\n{args.figures} figures of 1,000 bars, {args.workers} workers")
+        print(f"{'batch':<28} {'seconds':>9} {'speedup':>8}")
+        print(f"{'serial':<28} {serial_time:9.3f}")
+        print(f"{'process pool':<28} {pool_time:9.3f} {serial_time / pool_time:7.1f}x")
+        print(f"{'unchanged, skipped':<28} {cached_time:9.3f} {serial_time / cached_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from group_means import BACKENDS, grouped_mean
+from parallel_stats import WORKERS
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import food_price_frame
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the grouped mean backends on the yearly and quarterly price roll-ups.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000], help="Row counts to time")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS, help="Backends to time")
+    parser.add_argument('--workers', type=int, default=max(WORKERS, os.cpu_count() or 1),
+                        help="Threads or processes for the partitioned backends")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers")
+    print(f"{'rows':>11} {'roll-up':<10} {'backend':<10} {'seconds':>9} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = food_price_frame(n_rows)
+        values = df['VALUE'].astype('float64')
+        year = df['REF_DATE'].dt.year.rename('Year')
+        quarter = df['REF_DATE'].dt.quarter.rename('Quarter')
+        rollups = {
+            'yearly': [year, df['GEO'], df['Products']],
+            'quarterly': [year, quarter, df['GEO'], df['Products']],
+        }
+
+        for name, keys in rollups.items():
+            baseline = None
+            for backend in args.backends:
+                seconds, means = best_time(
+                    lambda: grouped_mean(values, keys, ['GEO', 'Products'], backend, args.workers), args.repeat)
+                if baseline is None:
+                    baseline, expected = seconds, means
+                elif not means.equals(expected) or not means.index.equals(expected.index):
+                    raise AssertionError(f"The {backend} backend differs from the {args.backends[0]} backend")
+                print(f"{n_rows:>11,} {name:<10} {backend:<10} {seconds:9.3f} {baseline / seconds:7.2f}x")
+        del df, values, year, quarter, rollups
+
+
+if __name__ == "__main__":
+    main()
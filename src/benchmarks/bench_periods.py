@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from periods import label_periods
+
+
+# The row-wise labelling data_cleaning.py used before the period schemes, kept here as the baseline
+def apply_covid_period(dates):
+    lockdown_start = pd.to_datetime('2020-01-01')
+    lockdown_end = pd.to_datetime('2022-05-30')
+
+    def get_period(date):
+        if date < lockdown_start:
+            return 'Pre-COVID'
+        elif lockdown_start <= date <= lockdown_end:
+            return 'During-COVID'
+        else:
+            return 'Post-COVID'
+
+    return dates.dt.to_timestamp().apply(get_period)
+
+
+def cut_presidency(dates):
+    return pd.cut(
+        dates.dt.to_timestamp(),
+        bins=[pd.Timestamp("2015-12-31"), pd.Timestamp("2017-01-20"), pd.Timestamp("2021-01-20"), pd.Timestamp("2024-12-31")],
+        labels=["Pre-Trump", "During-Trump", "Post-Trump"],
+    )
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def random_dates(n_rows, seed=0):
+    """Monthly REF_DATE periods from 2017-01 to 2024-08, as the cleaning stage parses them."""
+    months = pd.period_range('2017-01', '2024-08', freq='M')
+    rng = np.random.default_rng(seed)
+    return pd.Series(months[rng.integers(0, len(months), n_rows)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare period labelling by binary search with the apply and pd.cut paths.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help="Row counts to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'method':<34} {'seconds':>9} {'speedup':>8}")
+    for n_rows in args.rows:
+        dates = random_dates(n_rows)
+
+        apply_time, covid_apply = best_time(lambda: apply_covid_period(dates), args.repeat)
+        cut_time, presidency_cut = best_time(lambda: cut_presidency(dates), args.repeat)
+        covid_time, covid = best_time(lambda: label_periods(dates, ['COVID_Period']), args.repeat)
+        both_time, both = best_time(lambda: label_periods(dates, ['COVID_Period', 'Presidency_Period']), args.repeat)
+
+        if not (covid['COVID_Period'].astype(object) == covid_apply).all():
+            raise AssertionError("COVID labels differ from the apply path")
+        if not both['Presidency_Period'].astype(object).equals(presidency_cut.astype(object)):
+            raise AssertionError("Presidency labels differ from pd.cut")
+
+        print(f"{n_rows:>10,} {'COVID, apply(get_period)':<34} {apply_time:9.4f}")
+        print(f"{n_rows:>10,} {'COVID, label_periods':<34} {covid_time:9.4f} {apply_time / covid_time:7.0f}x")
+        print(f"{n_rows:>10,} {'Presidency, pd.cut':<34} {cut_time:9.4f}")
+        print(f"{n_rows:>10,} {'COVID + Presidency, label_periods':<34} {both_time:9.4f} "
+              f"{(apply_time + cut_time) / both_time:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
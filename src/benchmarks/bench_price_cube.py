@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from data_cleaning import PRODUCT_CATEGORIES
+from price_cube import build_cube, rollup, select
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import GEOS
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def long_prices(n_months, missing=0.1, seed=0):
+    """Every (GEO, product, month) from 2017-01 on as a long table with parsed REF_DATE, less a share of missing rows."""
+    products = [item for items in PRODUCT_CATEGORIES.values() for item in items]
+    months = pd.period_range('2017-01', periods=n_months, freq='M')
+    index = pd.MultiIndex.from_product([GEOS, products, months], names=['GEO', 'Products', 'REF_DATE'])
+    rng = np.random.default_rng(seed)
+    df = index.to_frame(index=False)
+    df['VALUE'] = rng.uniform(1, 20, len(df)).round(2)
+    return df[rng.random(len(df)) >= missing].reset_index(drop=True)
+
+
+def groupby_yearly(df):
+    """Yearly mean per product and province, as reg_comp.compute_item_statistics computes it."""
+    return df.assign(year=df['REF_DATE'].dt.year).groupby(['GEO', 'Products', 'year'])['VALUE'].mean()
+
+
+def groupby_category_yearly(df, categories):
+    """Category means of the yearly product means, as reg_comp_cat computes them."""
+    category_of = {item: category for category, items in categories.items() for item in items}
+    yearly = groupby_yearly(df).reset_index()
+    yearly['category'] = yearly['Products'].map(category_of)
+    return yearly.groupby(['GEO', 'category', 'year'])['VALUE'].mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the price cube with the long table for memory, roll-ups and slicing.")
+    parser.add_argument('--months', type=int, nargs='+', default=[92, 600, 3000], help="Months per series to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'months':>7} {'rows':>10} {'operation':<30} {'long':>10} {'cube':>10} {'ratio':>7}")
+    for n_months in args.months:
+        df = long_prices(n_months)
+        build_time, cube = best_time(lambda: build_cube(df), args.repeat)
+        long_mb = df.memory_usage(deep=True).sum() / 1e6
+        cube_mb = cube['values'].nbytes / 1e6
+
+        long_time, by_groupby = best_time(lambda: groupby_yearly(df), args.repeat)
+        cube_time, by_cube = best_time(lambda: rollup(cube, 'REF_DATE', 'year'), args.repeat)
+        cube_yearly = by_cube['values'][tuple(by_groupby.index.codes)]
+        if not np.allclose(cube_yearly, by_groupby.to_numpy(), rtol=1e-12):
+            raise AssertionError("Yearly roll-up differs from the groupby means")
+
+        long_cat_time, cat_groupby = best_time(lambda: groupby_category_yearly(df, PRODUCT_CATEGORIES), args.repeat)
+        cube_cat_time, cat_cube = best_time(
+            lambda: rollup(rollup(cube, 'REF_DATE', 'year'), 'Products', PRODUCT_CATEGORIES, 'category'), args.repeat)
+        cat_frame = pd.Series(cat_cube['values'].ravel(), index=pd.MultiIndex.from_product(
+            list(cat_cube['axes'].values()), names=['GEO', 'category', 'year']))
+        if not np.allclose(cat_frame.reindex(cat_groupby.index).to_numpy(), cat_groupby.to_numpy(), rtol=1e-12):
+            raise AssertionError("Category roll-up differs from the groupby means")
+
+        window = ('Ontario', slice('2020-01', '2022-05'))
+        long_slice_time, _ = best_time(
+            lambda: df[(df['GEO'] == window[0]) & (df['REF_DATE'] >= pd.Period(window[1].start, 'M'))
+                       & (df['REF_DATE'] <= pd.Period(window[1].stop, 'M'))], args.repeat)
+        cube_slice_time, _ = best_time(lambda: select(cube, GEO=window[0], REF_DATE=window[1]), args.repeat)
+
+        rows = f"{len(df):>10,}"
+        print(f"{n_months:>7} {rows} {'memory (MB)':<30} {long_mb:10.2f} {cube_mb:10.2f} {long_mb / cube_mb:6.1f}x")
+        print(f"{n_months:>7} {rows} {'build cube (s)':<30} {'':>10} {build_time:10.4f}")
+        print(f"{n_months:>7} {rows} {'yearly means (s)':<30} {long_time:10.4f} {cube_time:10.4f} {long_time / cube_time:6.1f}x")
+        print(f"{n_months:>7} {rows} {'category yearly means (s)':<30} {long_cat_time:10.4f} {cube_cat_time:10.4f} "
+              f"{long_cat_time / cube_cat_time:6.1f}x")
+        print(f"{n_months:>7} {rows} {'one province, COVID months (s)':<30} {long_slice_time:10.4f} {cube_slice_time:10.6f} "
+              f"{long_slice_time / cube_slice_time:6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
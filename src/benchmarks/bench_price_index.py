@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from price_index import build_index, lookup, lookup_range, open_index, save_index
+from storage import save_table
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import GEOS, PRODUCTS
+
+
+def monthly_prices(n_months, seed=0):
+    """Every (GEO, product, month) from 2017-01 on, as the rows of covid_period_food.csv."""
+    months = pd.period_range('2017-01', periods=n_months, freq='M')
+    index = pd.MultiIndex.from_product([months, GEOS, PRODUCTS], names=['REF_DATE', 'GEO', 'Products'])
+    df = index.to_frame(index=False)
+    df['VALUE'] = np.random.default_rng(seed).uniform(1, 20, len(df)).round(2).astype('float32')
+    return df
+
+
+def mean_time(func, queries):
+    """Mean wall time (s) per query, and the results."""
+    start = time.perf_counter()
+    results = [func(*query) for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare price lookups through the (GEO, Products, period) index with filtering the table.")
+    parser.add_argument('--months', type=int, nargs='+', default=[92, 1200], help="Months per series to time")
+    parser.add_argument('--queries', type=int, default=200, help="Random lookups per measurement")
+    parser.add_argument('--file-queries', type=int, default=3, help="Lookups that re-read the table from disk")
+    parser.add_argument('--format', default='csv', help="Storage format of the table read from disk")
+    args = parser.parse_args()
+
+    print(f"{'months':>7} {'rows':>10} {'query':<7} {'method':<26} {'ms/query':>10} {'speedup':>9}")
+    rng = np.random.default_rng(1)
+    for n_months in args.months:
+        df = monthly_prices(n_months)
+        months = df['REF_DATE'].unique()
+        queries = []
+        for _ in range(args.queries):
+            start, end = sorted(rng.choice(len(months), 2, replace=False))
+            queries.append((GEOS[rng.integers(len(GEOS))], PRODUCTS[rng.integers(len(PRODUCTS))],
+                            str(months[start]), str(months[end])))
+
+        with tempfile.TemporaryDirectory() as folder:
+            table_path = os.path.join(folder, 'covid_period_food.csv')
+            save_table(df, table_path, fmt=args.format)
+            save_index(build_index(df), 'monthly', folder)
+            index = open_index('monthly', folder)
+
+            def read_and_filter(geo, product, start, end):
+                table = pd.read_csv(table_path) if args.format == 'csv' else pd.read_parquet(os.path.splitext(table_path)[0] + '.parquet')
+                return filter_range(table, geo, product, start, end)
+
+            def filter_range(table, geo, product, start, end):
+                dates = table['REF_DATE'].astype(str).str[:7]
+                rows = table[(table['GEO'] == geo) & (table['Products'] == product) & (dates >= start) & (dates <= end)]
+                return rows.sort_values('REF_DATE')['VALUE'].to_numpy(dtype='float32')
+
+            file_time, file_results = mean_time(read_and_filter, queries[:args.file_queries])
+            frame_time, frame_results = mean_time(lambda *query: filter_range(df, *query), queries[:20])
+            range_time, range_results = mean_time(lambda *query: lookup_range(index, *query), queries)
+            point_time, point_results = mean_time(lambda geo, product, start, end: lookup(index, geo, product, start), queries)
+
+            checks = list(zip(file_results, range_results)) + list(zip(frame_results, range_results))
+            for expected, result in checks:
+                if not np.array_equal(expected, result.to_numpy()):
+                    raise AssertionError("Range lookups differ from filtering the table")
+            for (geo, product, start, _), result in zip(queries, point_results):
+                expected = df.loc[(df['GEO'] == geo) & (df['Products'] == product) & (df['REF_DATE'] == pd.Period(start, 'M')), 'VALUE']
+                if expected.iloc[0] != result:
+                    raise AssertionError("Point lookups differ from filtering the table")
+
+        rows = f"{len(df):>10,}"
+        print(f"{n_months:>7} {rows} {'range':<7} {'read ' + args.format + ' and filter':<26} {file_time * 1e3:10.3f}")
+        print(f"{n_months:>7} {rows} {'range':<7} {'filter loaded frame':<26} {frame_time * 1e3:10.3f} {file_time / frame_time:8.0f}x")
+        print(f"{n_months:>7} {rows} {'range':<7} {'index lookup_range':<26} {range_time * 1e3:10.3f} {file_time / range_time:8.0f}x")
+        print(f"{n_months:>7} {rows} {'point':<7} {'index lookup':<26} {point_time * 1e3:10.3f} {file_time / point_time:8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from data_cleaning import PRODUCT_CATEGORIES
+from query import aggregate, collect, join, optimize, predicate_mask, run_scan, scan, where
+from storage import load_table, save_table
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import GEOS
+
+PROVINCES = ['Nova Scotia', 'New Brunswick']
+CATEGORIES = ['fruits', 'veggies']
+
+
+def categorised_prices(n_months, seed=0):
+    """A covid_period_food shaped table with the category and year of every price, sorted by month."""
+    category_of = {item: category for category, items in PRODUCT_CATEGORIES.items() for item in items}
+    products = list(category_of)
+    months = pd.period_range('2017-01', periods=n_months, freq='M')
+    index = pd.MultiIndex.from_product([months, GEOS, products], names=['REF_DATE', 'GEO', 'Products'])
+    df = index.to_frame(index=False)
+    df['VALUE'] = np.random.default_rng(seed).uniform(1, 20, len(df)).round(2)
+    df['category'] = df['Products'].map(category_of)
+    df['year'] = df['REF_DATE'].dt.year
+    df['REF_DATE'] = df['REF_DATE'].dt.to_timestamp()
+    return df
+
+
+def eager(path):
+    """Load the whole table, then filter and group in pandas, as the geo scripts did."""
+    data = load_table(path)
+    data = data[data['GEO'].isin(PROVINCES) & data['category'].isin(CATEGORIES)]
+    return data.groupby(['GEO', 'year', 'category']).agg(avg_value=('VALUE', 'mean')).reset_index(), data
+
+
+def lazy_plan(path):
+    plan = where(scan(path), ('GEO', 'in', PROVINCES), ('category', 'in', CATEGORIES))
+    return aggregate(plan, ['GEO', 'year', 'category'], avg_value=('VALUE', 'mean'))
+
+
+def check_joins(df, folder, fmt):
+    """
+    Checks that joins with pushed down predicates give the rows of merging, then filtering, for
+    every how: prices joined to a yearly table that has only some of the provinces and years.
+    """
+    prices_path = os.path.join(folder, f'join_prices_{fmt}.csv')
+    yearly_path = os.path.join(folder, f'join_yearly_{fmt}.csv')
+    prices = df[df['REF_DATE'].dt.month == 1][['GEO', 'year', 'Products', 'VALUE']].reset_index(drop=True)
+    yearly = pd.DataFrame({'GEO': GEOS[::2], 'year': 2017 + np.arange(len(GEOS[::2])) % 3})
+    yearly['income'] = np.arange(len(yearly)) * 1000.0
+    save_table(prices, prices_path, fmt=fmt)
+    save_table(yearly, yearly_path, fmt=fmt)
+
+    predicates = [('GEO', 'in', PROVINCES + [GEOS[0]]), ('VALUE', '>', 5), ('income', '<', 3000)]
+    for how in ['inner', 'left', 'right', 'outer']:
+        merged = pd.merge(load_table(prices_path), load_table(yearly_path), on=['GEO', 'year'], how=how)
+        merged = merged[predicate_mask(merged, predicates)]
+        plan = where(join(scan(prices_path), scan(yearly_path), ['GEO', 'year'], how=how), *predicates)
+        result = collect(plan, list(merged.columns))
+        key_cols = ['GEO', 'year', 'Products']
+        result = result.sort_values(key_cols).reset_index(drop=True)
+        expected = merged.sort_values(key_cols).reset_index(drop=True)
+        if len(expected) == 0 or not result.equals(expected):
+            raise AssertionError(f"Lazy {how} join differs from merge-then-filter")
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare lazy queries with predicate and projection pushdown against load-then-filter.")
+    parser.add_argument('--months', type=int, nargs='+', default=[92, 1200], help="Months of prices to generate")
+    parser.add_argument('--formats', nargs='+', default=['csv', 'parquet'], help="Storage formats to scan")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'format':<8} {'method':<22} {'seconds':>9} {'loaded MB':>10} {'speedup':>8}")
+    for n_months in args.months:
+        df = categorised_prices(n_months)
+        with tempfile.TemporaryDirectory() as folder:
+            for fmt in args.formats:
+                path = os.path.join(folder, f'prices_{fmt}.csv')
+                save_table(df, path, fmt=fmt)
+
+                eager_time, (expected, loaded) = best_time(lambda: eager(path), args.repeat)
+                lazy_time, result = best_time(lambda: collect(lazy_plan(path)), args.repeat)
+                if not np.allclose(result['avg_value'], expected['avg_value'], rtol=1e-12) or \
+                        not result.drop(columns='avg_value').equals(expected.drop(columns='avg_value')):
+                    raise AssertionError("Lazy query differs from load-then-filter")
+
+                check_joins(df, folder, fmt)
+
+                eager_mb = load_table(path).memory_usage(deep=True).sum() / 1e6
+                lazy_mb = run_scan(optimize(lazy_plan(path))['input']).memory_usage(deep=True).sum() / 1e6
+                rows = f"{len(df):>10,}"
+                print(f"{rows} {fmt:<8} {'load, then filter':<22} {eager_time:9.3f} {eager_mb:10.1f}")
+                print(f"{rows} {fmt:<8} {'lazy, pushed down':<22} {lazy_time:9.3f} {lazy_mb:10.1f} {eager_time / lazy_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from ref_date import parse_ref_date, quarter_of, to_periods, year_of
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def ref_dates(n_rows, seed=0):
+    """n_rows 'YYYY-MM' strings over 1995-2024, as read from a StatCan table."""
+    rng = np.random.default_rng(seed)
+    months = pd.period_range('1995-01', '2024-12', freq='M').strftime('%Y-%m').to_numpy()
+    return pd.Series(months[rng.integers(0, len(months), n_rows)], dtype=str, name='REF_DATE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time parsing 'YYYY-MM' REF_DATE strings and deriving year and quarter.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000], help="Row counts to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'rows':>11} {'step':<36} {'seconds':>9} {'speedup':>8}")
+    for n_rows in args.rows:
+        strings = ref_dates(n_rows)
+        methods = {
+            'pd.PeriodIndex(freq=M)': lambda: pd.PeriodIndex(strings, freq='M'),
+            'pd.to_datetime, inferred format': lambda: pd.PeriodIndex(pd.to_datetime(strings), freq='M'),
+            "pd.to_datetime(format='%Y-%m')": lambda: pd.PeriodIndex(pd.to_datetime(strings, format='%Y-%m'), freq='M'),
+            'parse_ref_date': lambda: to_periods(parse_ref_date(strings)),
+        }
+        baseline = None
+        for name, method in methods.items():
+            seconds, periods = best_time(method, args.repeat)
+            if baseline is None:
+                baseline, expected = seconds, periods
+            elif not periods.equals(expected):
+                raise AssertionError(f"{name} parses different months than pd.PeriodIndex")
+            print(f"{n_rows:>11,} {'parse: ' + name:<36} {seconds:9.4f} {baseline / seconds:7.1f}x")
+
+        ref_date = pd.Series(expected, name='REF_DATE')
+        pandas_time, (year, quarter) = best_time(lambda: (ref_date.dt.year, ref_date.dt.quarter), args.repeat)
+        codec_time, (fast_year, fast_quarter) = best_time(lambda: (year_of(ref_date), quarter_of(ref_date)), args.repeat)
+        if not (np.array_equal(year, fast_year) and np.array_equal(quarter, fast_quarter)):
+            raise AssertionError("year_of / quarter_of differ from the .dt accessors")
+        print(f"{n_rows:>11,} {'year + quarter: .dt accessors':<36} {pandas_time:9.4f}")
+        print(f"{n_rows:>11,} {'year + quarter: year_of, quarter_of':<36} {codec_time:9.4f} {pandas_time / codec_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kruskal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from region_compare import kruskal_by_group, pairwise_differences, region_labels, region_matrix
+
+# Region splits compared, as in coast_region_analysis.py and urban_vs_rural.py
+REGION_SPLITS = {
+    'coasts': ['East Coast', 'West Coast', 'Interior'],
+    'urban/rural': ['Urban', 'Rural'],
+}
+
+
+def region_averages(regions, n_categories, n_years=30, seed=0):
+    """A shuffled avg_value_reg.csv shaped table, with a few missing and duplicated region rows and rounded (tied) values."""
+    rng = np.random.default_rng(seed)
+    rows = pd.MultiIndex.from_product(
+        [regions, range(1995, 1995 + n_years), [f"category {i}" for i in range(n_categories)]],
+        names=['region', 'year', 'category']).to_frame(index=False)
+    rows['avg_value'] = rng.uniform(1, 20, len(rows)).round(1)
+    rows = rows.drop(index=rng.choice(len(rows), len(rows) // 50, replace=False))
+    rows = pd.concat([rows, rows.sample(len(rows) // 100, random_state=seed)])
+    return rows.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+# pairwise_region_comparison and extended_region_comparison before the engine, kept as baselines
+def loop_pairwise(data, regions):
+    labels = region_labels(regions)
+    results_list = []
+    for year in data['year'].unique():
+        year_data = data[data['year'] == year]
+        for category in year_data['category'].unique():
+            category_data = year_data[year_data['category'] == category]
+            values = [category_data[category_data['region'] == region]['avg_value'].values for region in regions]
+            if all(len(value) == 1 for value in values):
+                row = {'year': year, 'category': category}
+                for a in range(len(regions)):
+                    for b in range(a + 1, len(regions)):
+                        row[f"diff_{labels[a]}_{labels[b]}"] = abs(values[a][0] - values[b][0])
+                results_list.append(row)
+    return pd.DataFrame(results_list)
+
+
+def loop_kruskal(data, regions):
+    results_list = []
+    for category, category_data in data.groupby('category', sort=False):
+        samples = [category_data['avg_value'][category_data['region'] == region].to_numpy() for region in regions]
+        if all(len(sample) > 0 for sample in samples):
+            stat, p = kruskal(*samples)
+            results_list.append({'category': category, 'kruskal_stat': stat, 'kruskal_p': p})
+    return pd.DataFrame(results_list)
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the nested region comparison loops with the pivoted engine.")
+    parser.add_argument('--categories', type=int, nargs='+', default=[4, 100, 1000], help="Category counts to time, 30 years each")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'categories':>10} {'regions':<12} {'test':<10} {'loops (s)':>10} {'engine (s)':>11} {'speedup':>8}")
+    for n_categories in args.categories:
+        for split, regions in REGION_SPLITS.items():
+            data = region_averages(regions, n_categories)
+            tests = {
+                'pairwise': (lambda: loop_pairwise(data, regions),
+                             lambda: pairwise_differences(region_matrix(data, regions), regions)),
+                'kruskal': (lambda: loop_kruskal(data, regions),
+                            lambda: kruskal_by_group(data, 'category', regions)),
+            }
+            for name, (loops, engine) in tests.items():
+                loop_time, expected = best_time(loops, args.repeat)
+                engine_time, results = best_time(engine, args.repeat)
+                if not results.equals(expected):
+                    raise AssertionError(f"The {name} results on {split} differ from the loops")
+                print(f"{n_categories:>10,} {split:<12} {name:<10} {loop_time:10.4f} {engine_time:11.4f} "
+                      f"{loop_time / engine_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
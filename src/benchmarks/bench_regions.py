@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from regions import COAST_MAPPING, GROUPINGS, URBAN_RURAL_MAPPING, group_column, group_frame
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import food_price_frame
+
+# The urban province list urban_vs_rural.py checked every row against before the registry
+URBAN_PROVINCES = [province for province, group in URBAN_RURAL_MAPPING.items() if group == 'Urban']
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time assigning regions to rows by .map / .apply against the registry's group codes.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000], help="Row counts to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'rows':>11} {'GEO dtype':<10} {'regions':<38} {'seconds':>9} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = food_price_frame(n_rows)
+        for dtype in ['category', 'str']:
+            geo = df['GEO'].astype(dtype)
+            methods = {
+                'coast': [
+                    ('.map(dict).fillna', lambda: geo.map(COAST_MAPPING).fillna('Unknown')),
+                    ('group_column', lambda: group_column(geo, 'coast', default='Unknown')),
+                ],
+                'urban / rural': [
+                    ('.apply(lambda, list)', lambda: geo.apply(lambda x: 'Urban' if x in URBAN_PROVINCES else 'Rural')),
+                    ('group_column', lambda: group_column(geo, 'urban_rural', default='Rural')),
+                ],
+                'all groupings': [
+                    ('.map per grouping', lambda: [geo.map(mapping) for mapping in GROUPINGS.values()]),
+                    ('group_frame, one pass', lambda: group_frame(geo)),
+                ],
+            }
+            for regions, ((old_name, old), (new_name, new)) in methods.items():
+                old_time, expected = best_time(old, args.repeat)
+                new_time, result = best_time(new, args.repeat)
+                if regions == 'all groupings':
+                    expected = expected[-1]
+                    result = result[list(GROUPINGS)[-1]]
+                if not result.astype(object).equals(expected.astype(object)):
+                    raise AssertionError(f"{new_name} gives different {regions} regions than {old_name}")
+                print(f"{n_rows:>11,} {dtype:<10} {regions + ': ' + old_name:<38} {old_time:9.4f}")
+                print(f"{n_rows:>11,} {dtype:<10} {regions + ': ' + new_name:<38} {new_time:9.4f} {old_time / new_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
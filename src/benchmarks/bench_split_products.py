@@ -0,0 +1,78 @@
+import argparse
+import filecmp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from category_router import partition, route, write_partitions
+from data_cleaning import CATEGORY_CODES, CATEGORY_NAMES, PRODUCT_CATEGORIES
+from storage import save_table
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import food_price_frame
+
+
+# The per-category isin loop SplitProducts used before the router, kept here as the baseline
+def isin_split(df, folder, fmt):
+    for category, items in PRODUCT_CATEGORIES.items():
+        category_df = df[df['Products'].isin(items)]
+        save_table(category_df, os.path.join(folder, f"{category}.csv"), fmt=fmt)
+
+    all_items = [item for sublist in PRODUCT_CATEGORIES.values() for item in sublist]
+    return df[df['Products'].isin(all_items)]
+
+
+def routed_split(df, folder, fmt, threads):
+    row_codes = route(df['Products'], CATEGORY_CODES)
+    frames = partition(df, row_codes, len(CATEGORY_NAMES))
+    write_partitions(frames, [os.path.join(folder, f"{category}.csv") for category in CATEGORY_NAMES], fmt=fmt, threads=threads)
+    return df[row_codes >= 0]
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-category isin loop with the single-pass category router.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000], help="Row counts to time")
+    parser.add_argument('--formats', nargs='+', default=['csv', 'parquet'], help="Storage formats to write")
+    parser.add_argument('--threads', type=int, default=8, help="Threads writing the category files")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'format':<8} {'method':<22} {'split (s)':>10} {'split+write (s)':>16} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = food_price_frame(n_rows)
+        mask_time, _ = best_time(lambda: [df['Products'].isin(items) for items in PRODUCT_CATEGORIES.values()], args.repeat)
+        route_time, _ = best_time(
+            lambda: partition(df, route(df['Products'], CATEGORY_CODES), len(CATEGORY_NAMES)), args.repeat)
+
+        for fmt in args.formats:
+            with tempfile.TemporaryDirectory() as old_dir, tempfile.TemporaryDirectory() as new_dir:
+                old_time, old_kept = best_time(lambda: isin_split(df, old_dir, fmt), args.repeat)
+                new_time, new_kept = best_time(lambda: routed_split(df, new_dir, fmt, args.threads), args.repeat)
+
+                if not old_kept.equals(new_kept):
+                    raise AssertionError("The kept rows differ from the isin loop")
+                if fmt == 'csv':
+                    names = sorted(os.listdir(old_dir))
+                    _, mismatch, errors = filecmp.cmpfiles(old_dir, new_dir, names, shallow=False)
+                    if mismatch or errors or names != sorted(os.listdir(new_dir)):
+                        raise AssertionError(f"Category files differ from the isin loop: {mismatch + errors}")
+
+            print(f"{n_rows:>10,} {fmt:<8} {'isin per category':<22} {mask_time:10.4f} {old_time:16.4f}")
+            print(f"{n_rows:>10,} {fmt:<8} {'router, one pass':<22} {route_time:10.4f} {new_time:16.4f} "
+                  f"{old_time / new_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
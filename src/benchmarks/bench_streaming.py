@@ -0,0 +1,76 @@
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+CLEANING_DIR = os.path.join(REPO_ROOT, 'src', 'cleaning')
+SYNTHETIC_DATA = os.path.join(REPO_ROOT, 'src', 'benchmarks', 'synthetic_data.py')
+
+RUN_CLEANING = (
+    "import sys; sys.path.insert(0, {cleaning_dir!r}); import data_cleaning; "
+    "data_cleaning.RunCleaning({food!r}, {population!r}, {income!r}, chunksize={chunksize!r})"
+)
+
+
+def run_cleaning(food_path, workdir, chunksize):
+    """
+    Runs RunCleaning in a fresh process and returns its wall time (s) and peak RSS (MB).
+    """
+    code = RUN_CLEANING.format(
+        cleaning_dir=CLEANING_DIR,
+        food=food_path,
+        population=os.path.join(REPO_ROOT, 'population.csv'),
+        income=os.path.join(REPO_ROOT, 'income.csv'),
+        chunksize=chunksize,
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=workdir)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"Cleaning run with chunksize={chunksize} failed")
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def same_outputs(dir_a, dir_b):
+    """Returns the output files that differ between two runs."""
+    differing = []
+    for folder in ['cleaned_data', 'split_data']:
+        for file_name in sorted(os.listdir(os.path.join(dir_a, folder))):
+            if not filecmp.cmp(os.path.join(dir_a, folder, file_name), os.path.join(dir_b, folder, file_name), shallow=False):
+                differing.append(os.path.join(folder, file_name))
+    return differing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the in-memory and streaming cleaning paths.")
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Rows in the synthetic food price table")
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help="Chunk size for the streaming path")
+    parser.add_argument('--data', default=None, help="Reuse or create the synthetic table at this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        food_path = args.data or os.path.join(tmp, 'food_prices.csv')
+        if not os.path.exists(food_path):
+            # Generated in its own process so this one stays small: children inherit its peak RSS
+            print(f"Generating {args.rows:,} rows at {food_path}")
+            subprocess.run([sys.executable, SYNTHETIC_DATA, food_path, '--rows', str(args.rows)], check=True)
+
+        results = {}
+        for label, chunksize in [('in-memory', None), (f'streaming ({args.chunksize:,} rows)', args.chunksize)]:
+            workdir = os.path.join(tmp, 'memory' if chunksize is None else 'streaming')
+            os.makedirs(workdir)
+            results[label] = run_cleaning(food_path, workdir, chunksize)
+            print(f"{label:<30} wall {results[label][0]:8.1f} s   peak RSS {results[label][1]:8.0f} MB")
+
+        differing = same_outputs(os.path.join(tmp, 'memory'), os.path.join(tmp, 'streaming'))
+        print("Outputs identical" if not differing else f"Outputs differ: {differing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from pipeline import STAGES, run_stage
+from profiling import load_records, summarize
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import generate_dataset
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+RESULTS_FILE = 'output/benchmarks/results.jsonl'
+
+# Input files and folders of a run, linked from the generated dataset
+INPUTS = ['food_prices_sample.csv', 'population.csv', 'income.csv', 'data']
+
+# Tables the stages read that no stage writes any more (split_data categories the cleaning stage
+# dropped, and the whole table item summary urban_vs_rural.py reads), copied from the repo
+LEGACY_INPUTS = [
+    'split_data/beans.csv', 'split_data/frozen.csv', 'split_data/snacks.csv',
+    'output/geo_csv/years/food_prices_item.csv',
+]
+
+# Folders the scripts write into without creating them, present in the repo
+OUTPUT_FOLDERS = ['output/geo_csv/income', 'output/geo_csv/population', 'output/geo_csv/urban_rural']
+
+# Columns of the profiling report kept per function: the best time and the largest memory growth over the runs
+TIMING_COLUMNS = ['wall', 'self_wall', 'cpu', 'children_cpu']
+MEMORY_COLUMNS = ['peak_rss_delta_mb']
+
+
+def commit_id():
+    """Short hash of the checked out commit, with -dirty if tracked files have changes."""
+    def git(*args):
+        return subprocess.run(['git', '-C', REPO_DIR, *args], capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    return commit + ('-dirty' if git('status', '--porcelain', '--untracked-files=no') else '')
+
+
+def run_suite(folder, run_id, chunksize=None):
+    """
+    Runs every pipeline stage, in order, in a new run folder linked to the dataset in folder, with
+    the functions profiled. Returns the profiling report plus one 'stage' row per stage.
+    """
+    run_dir = os.path.join(folder, run_id)
+    os.makedirs(run_dir)
+    for name in INPUTS:
+        os.symlink(os.path.join(folder, 'dataset', name), os.path.join(run_dir, name))
+    for path in LEGACY_INPUTS:
+        os.makedirs(os.path.dirname(os.path.join(run_dir, path)), exist_ok=True)
+        shutil.copy(os.path.join(REPO_DIR, path), os.path.join(run_dir, path))
+    for path in OUTPUT_FOLDERS:
+        os.makedirs(os.path.join(run_dir, path), exist_ok=True)
+
+    profile = os.path.join(run_dir, 'profile.jsonl')
+    env = {'GROCERY_PROFILE': profile, 'GROCERY_PROFILE_RUN': run_id, 'GROCERY_CACHE_MB': '0', 'MPLBACKEND': 'Agg'}
+    saved_env = {key: os.environ.get(key) for key in env}
+    saved_cwd = os.getcwd()
+    os.environ.update(env)
+    os.chdir(run_dir)
+    stages = []
+    try:
+        for name, stage in STAGES.items():
+            if name == 'clean' and chunksize:
+                stage = dict(stage, args=['--chunksize', str(chunksize)])
+            returncode, output, elapsed = run_stage(name, stage)
+            if returncode != 0:
+                raise RuntimeError(f"Stage {name} failed:\n{output}")
+            stages.append({'script': 'stage', 'function': name, 'calls': 1, 'wall': elapsed, 'self_wall': elapsed})
+    finally:
+        os.chdir(saved_cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    return pd.concat([summarize(load_records(profile, run_id)), pd.DataFrame(stages)], ignore_index=True)
+
+
+def best_of(reports):
+    """Per function, the smallest of each timing and the largest memory growth over the runs; calls and rows are the same in every run."""
+    runs = pd.concat(reports, ignore_index=True)
+    grouped = runs.groupby(['script', 'function'], sort=False)
+    counts = grouped[['calls', 'rows_in', 'rows_out']].first()
+    return counts.join(grouped[TIMING_COLUMNS].min()).join(grouped[MEMORY_COLUMNS].max()).reset_index()
+
+
+def save_results(results, path, meta):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+        for record in results.astype(object).where(results.notna(), None).to_dict('records'):
+            f.write(json.dumps({**meta, **record}) + '\n')
+
+
+def compare(path, commit, baseline, rows, threshold, min_seconds):
+    """
+    Wall time of every function in commit's latest results against baseline's (default: the latest
+    other commit measured on as many rows). Returns the table and whether anything got slower than
+    threshold allows, by at least min_seconds so noise in the fastest functions is not reported.
+    """
+    results = pd.read_json(path, lines=True, dtype={'commit': str})
+    results = results[results['rows'] == rows].sort_values('date')
+    if baseline is None:
+        others = results.loc[results['commit'] != commit, 'commit']
+        if others.empty:
+            return None, False
+        baseline = others.iloc[-1]
+
+    def latest(name):
+        runs = results[results['commit'] == name]
+        runs = runs[runs['date'] == runs['date'].max()]
+        return runs.set_index(['script', 'function'])['wall']
+
+    table = pd.DataFrame({baseline: latest(baseline), commit: latest(commit)}).dropna()
+    table['ratio'] = table[commit] / table[baseline]
+    table['change'] = ''
+    measurable = (table[commit] - table[baseline]).abs() >= min_seconds
+    table.loc[measurable & (table['ratio'] > 1 + threshold), 'change'] = 'slower'
+    table.loc[measurable & (table['ratio'] < 1 / (1 + threshold)), 'change'] = 'faster'
+    return table.reset_index(), (table['change'] == 'slower').any()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time every profiled function of the pipeline on a synthetic StatCan dataset and store the results per commit.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Rows of the food price table (up to 100M)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the dataset")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs of the pipeline, the best time of each function is kept")
+    parser.add_argument('--chunksize', type=int, default=None, help="Stream the food price table in the clean stage")
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSON lines file the results are appended to")
+    parser.add_argument('--baseline', default=None, help="Commit to compare with (default: the last other commit in the results)")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change reported as slower or faster")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="Smallest change in seconds reported as slower or faster")
+    parser.add_argument('--keep', metavar='FOLDER', default=None, help="Generate and run in this folder and keep it")
+    args = parser.parse_args()
+
+    commit = commit_id()
+    folder = args.keep or tempfile.mkdtemp(prefix='grocery_bench_')
+    try:
+        start = time.perf_counter()
+        generate_dataset(os.path.join(folder, 'dataset'), args.rows, args.seed)
+        print(f"Generated {args.rows:,} food price rows in {time.perf_counter() - start:.1f} s")
+        reports = [run_suite(folder, f"{commit}-{int(time.time())}-{i}", args.chunksize) for i in range(args.repeat)]
+    finally:
+        if args.keep is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    results = best_of(reports)
+    meta = {
+        'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows': args.rows, 'seed': args.seed,
+        'repeat': args.repeat, 'chunksize': args.chunksize, 'python': platform.python_version(),
+        'pandas': pd.__version__, 'cpus': os.cpu_count(),
+    }
+    save_results(results, args.results, meta)
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:.3f}'.format):
+        print(f"\n{commit}, {args.rows:,} rows, best of {args.repeat} (saved to {args.results})")
+        print(results.to_string(index=False))
+
+        table, slower = compare(args.results, commit, args.baseline, args.rows, args.threshold, args.min_seconds)
+        if table is not None:
+            print(f"\nWall time against {table.columns[2]} (threshold {args.threshold:.0%})")
+            print(table.to_string(index=False))
+    if table is not None and slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
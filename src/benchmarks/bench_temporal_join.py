@@ -0,0 +1,106 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from temporal_join import join
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import GEOS, TERRITORIES
+
+MONTHS = pd.period_range('2017-01', '2024-08', freq='M')
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def monthly_prices(n_products, seed=0):
+    """A monthly x product x province price table, as MergeMonthlyCovariates reads from the price cube."""
+    rng = np.random.default_rng(seed)
+    geos = GEOS + TERRITORIES
+    n_rows = len(geos) * n_products * len(MONTHS)
+    return pd.DataFrame({
+        'GEO': np.repeat(geos, n_products * len(MONTHS)),
+        'Products': np.tile(np.repeat([f"Product {i:05d}, 1 unit" for i in range(n_products)], len(MONTHS)), len(geos)),
+        'REF_DATE': pd.PeriodIndex(np.tile(MONTHS, len(geos) * n_products)),
+        'Average_Price': rng.uniform(1, 30, n_rows).round(2),
+    })
+
+
+def covariates(seed=0):
+    """Monthly income with a month missing here and there, and quarterly population (first month of each quarter)."""
+    rng = np.random.default_rng(seed)
+    geos = GEOS + TERRITORIES
+    income = pd.DataFrame({'GEO': np.repeat(geos, len(MONTHS)), 'REF_DATE': np.tile(MONTHS, len(geos))})
+    income = income[rng.random(len(income)) > 0.1].reset_index(drop=True)
+    income['Average_Weekly_Income'] = rng.uniform(900, 1400, len(income)).round(2)
+    quarters = MONTHS[MONTHS.month % 3 == 1]
+    population = pd.DataFrame({'GEO': np.repeat(geos, len(quarters)), 'REF_DATE': np.tile(quarters, len(geos))})
+    population['Population'] = rng.uniform(3e4, 1.6e7, len(population)).round()
+    return income, population
+
+
+def exact_merges(prices, income, population):
+    """The previous exact key merges on the month strings and GEO."""
+    keys = ['REF_DATE', 'GEO']
+    prices = prices.assign(REF_DATE=prices['REF_DATE'].astype(str))
+    income = income.assign(REF_DATE=income['REF_DATE'].astype(str))
+    population = population.assign(REF_DATE=population['REF_DATE'].astype(str))
+    return pd.merge(pd.merge(prices, income, on=keys), population, on=keys)
+
+
+def pandas_aligned(prices, income, population):
+    """
+    The same alignment as the engine in plain pandas: merge_asof (on the month numbers, sorted
+    by them) for income and a per-province monthly reindex and interpolation for population.
+    """
+    left = prices.assign(month=prices['REF_DATE'].astype('int64')).reset_index().sort_values('month', kind='stable')
+    right = income.assign(month=income['REF_DATE'].astype('int64')).sort_values('month')
+    aligned = pd.merge_asof(left, right[['month', 'GEO', 'Average_Weekly_Income']], on='month', by='GEO', tolerance=2)
+    monthly = population.pivot(index='REF_DATE', columns='GEO', values='Population').reindex(MONTHS)
+    monthly = monthly.interpolate(limit_area='inside').ffill(limit=3)
+    monthly = monthly.stack().rename('Population').reset_index().rename(columns={'level_0': 'REF_DATE'})
+    aligned = pd.merge(aligned, monthly, on=['REF_DATE', 'GEO'], how='left')
+    return aligned.set_index('index').sort_index().rename_axis(None).drop(columns='month')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time aligning monthly prices with monthly income and quarterly population.")
+    parser.add_argument('--products', type=int, nargs='+', default=[100, 1000, 5000], help="Products per province")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    income, population = covariates()
+    print(f"{'rows':>11} {'join':<34} {'seconds':>9} {'rows kept':>11} {'speedup':>8}")
+    for n_products in args.products:
+        prices = monthly_prices(n_products)
+        engine = lambda: join(prices, [
+            (income, ['Average_Weekly_Income'], 'asof', 2),
+            (population, ['Population'], 'interpolate', 3),
+        ], ['GEO'], 'REF_DATE')
+
+        exact_time, exact = best_time(lambda: exact_merges(prices, income, population), args.repeat)
+        pandas_time, expected = best_time(lambda: pandas_aligned(prices, income, population), args.repeat)
+        engine_time, aligned = best_time(engine, args.repeat)
+        pd.testing.assert_frame_equal(aligned, expected[aligned.columns], check_dtype=False, check_index_type=False)
+
+        kept = aligned[['Average_Weekly_Income', 'Population']].notna().all(axis=1).sum()
+        print(f"{len(prices):>11,} {'pd.merge, exact months':<34} {exact_time:9.3f} {len(exact):>11,}")
+        print(f"{len(prices):>11,} {'merge_asof + interpolate (pandas)':<34} {pandas_time:9.3f} {kept:>11,}")
+        print(f"{len(prices):>11,} {'temporal_join.join':<34} {engine_time:9.3f} {kept:>11,} {pandas_time / engine_time:7.1f}x")
+        del prices, exact, expected, aligned
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from statsmodels.stats.multicomp import pairwise_tukeyhsd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from tukey import TUKEY_COLUMNS, tukey_hsd_by_product
+
+PERIODS = ['Pre-COVID', 'During-COVID', 'Post-COVID', 'Pre-Trump', 'During-Trump']
+
+
+# The per-product loop temporal_analysis.py used before the batched engine, kept here as the reference
+def loop_tukey(df, value_col, group_col, n_groups=None):
+    results = []
+    for product in df['Products'].unique():
+        product_df = df[df['Products'] == product].dropna(subset=[value_col, group_col])
+        n_found = product_df[group_col].nunique()
+        if n_found < 2 or (n_groups is not None and n_found != n_groups):
+            continue
+        tukey = pairwise_tukeyhsd(endog=product_df[value_col], groups=product_df[group_col], alpha=0.05)
+        tukey_results = pd.DataFrame(data=tukey.summary().data[1:], columns=tukey.summary().data[0])
+        tukey_results['Product'] = product
+        results.append(tukey_results)
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=TUKEY_COLUMNS + ['Product'])
+
+
+def synthetic_changes(n_products, n_months, n_periods=3, seed=0, missing=0.0):
+    """
+    Month over month changes for n_products series of n_months each, split into n_periods
+    consecutive windows of random length, with a different mean change per product and period.
+    """
+    rng = np.random.default_rng(seed)
+    cuts = np.sort(rng.choice(np.arange(1, n_months), n_periods - 1, replace=False))
+    period_index = np.searchsorted(cuts, np.arange(n_months), side='right')
+    labels = np.array(PERIODS[:n_periods])[period_index]
+    shifts = rng.normal(0, 0.3, (n_products, n_periods))
+
+    df = pd.DataFrame({
+        'Products': np.repeat([f"Product {i:03d}" for i in range(n_products)], n_months),
+        'Period': np.tile(labels, n_products),
+        'MoM_Increase': (rng.normal(0, 2, (n_products, n_months)) + shifts[:, period_index]).ravel(),
+    })
+    if missing:
+        df.loc[rng.random(len(df)) < missing, 'MoM_Increase'] = np.nan
+    return df
+
+
+def same_results(expected, actual):
+    """Compares two result tables the way they are written to CSV."""
+    if len(expected) != len(actual):
+        return False
+    return (expected.astype(str).to_numpy() == actual[expected.columns].astype(str).to_numpy()).all()
+
+
+def check_parity():
+    """Runs both engines on a set of small cases and stops at the first difference."""
+    cases = [
+        ('three periods', dict(n_products=20, n_months=60, n_periods=3), 3),
+        ('two periods', dict(n_products=20, n_months=40, n_periods=2), None),
+        ('five periods', dict(n_products=10, n_months=200, n_periods=5), None),
+        ('short series', dict(n_products=30, n_months=8, n_periods=3), None),
+        ('missing values', dict(n_products=20, n_months=80, n_periods=3, missing=0.1), 3),
+    ]
+    for seed, (name, params, n_groups) in enumerate(cases):
+        df = synthetic_changes(seed=seed, **params)
+        # Some products miss a period entirely and are skipped when n_groups is set
+        df = df[~((df['Products'] <= 'Product 002') & (df['Period'] == 'Pre-COVID'))]
+        expected = loop_tukey(df, 'MoM_Increase', 'Period', n_groups)
+        actual = tukey_hsd_by_product(df, 'MoM_Increase', 'Period', n_groups=n_groups)
+        if not same_results(expected, actual):
+            raise AssertionError(f"Batched Tukey HSD differs from statsmodels for case '{name}'")
+        print(f"parity ok: {name} ({len(actual)} comparisons)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the batched Tukey HSD engine with the per-product statsmodels loop.")
+    parser.add_argument('--products', type=int, default=110, help="Number of products")
+    parser.add_argument('--months', type=int, default=3000, help="Months per product")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for the parallel run")
+    args = parser.parse_args()
+
+    check_parity()
+
+    df = synthetic_changes(args.products, args.months)
+    start = time.perf_counter()
+    expected = loop_tukey(df, 'MoM_Increase', 'Period', 3)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = tukey_hsd_by_product(df, 'MoM_Increase', 'Period', n_groups=3)
+    batched_time = time.perf_counter() - start
+
+    print(f"\n{args.products} products x {args.months:,} months ({len(df):,} rows)")
+    print(f"{'per-product statsmodels loop':<30} {loop_time:8.3f} s")
+    print(f"{'batched engine':<30} {batched_time:8.3f} s   {loop_time / batched_time:5.1f}x")
+    print("Results identical" if same_results(expected, actual) else "Results differ")
+
+    if args.workers > 1:
+        start = time.perf_counter()
+        parallel = tukey_hsd_by_product(df, 'MoM_Increase', 'Period', n_groups=3, workers=args.workers)
+        parallel_time = time.perf_counter() - start
+        print(f"{f'batched engine, {args.workers} workers':<30} {parallel_time:8.3f} s   {loop_time / parallel_time:5.1f}x")
+        print("Results identical" if same_results(expected, parallel) else "Results differ")
+
+
+if __name__ == "__main__":
+    main()
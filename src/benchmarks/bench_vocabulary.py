@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from regions import PROVINCES
+from storage import load_table
+from vocabulary import decode, encode_frame, extend_vocabulary, frame_labels, load_encoded
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import food_price_frame
+
+# Ways of holding GEO and Products: Python objects, pandas' string dtype, a categorical inferred
+# per table (as read_csv's 'category' gives), and a categorical of the shared vocabulary
+LAYOUTS = ['object', 'str', 'category', 'vocabulary']
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def price_table(n_rows, seed=0):
+    """A split_data shaped table with a Year column, the labels as strings."""
+    df = food_price_frame(n_rows, seed)
+    return pd.DataFrame({
+        'Year': df['REF_DATE'].dt.year,
+        'GEO': df['GEO'].astype(str),
+        'Products': df['Products'].astype(str),
+        'VALUE': df['VALUE'],
+    })
+
+
+def covariate_table(geos):
+    """A yearly income shaped table, (Year, GEO) -> value, with the GEO values in another order."""
+    years = range(2017, 2025)
+    return pd.DataFrame({
+        'Year': [year for year in years for _ in geos],
+        'GEO': [geo for _ in years for geo in reversed(geos)],
+        'Income': 1000.0,
+    })
+
+
+def layout(df, name, vocabulary):
+    """df with its label columns held the way the layout says."""
+    labels = [col for col in ['GEO', 'Products'] if col in df.columns]
+    if name == 'object':
+        return df.astype(dict.fromkeys(labels, object))
+    if name == 'str':
+        return df
+    if name == 'category':
+        return df.astype(dict.fromkeys(labels, 'category'))
+    return encode_frame(df, vocabulary)
+
+
+def operations(prices, covariates):
+    """The label heavy steps of the stages: filter on provinces, yearly groupby and the covariate merge."""
+    return {
+        'isin': lambda: prices[prices['GEO'].isin(PROVINCES)],
+        'groupby': lambda: prices.groupby(['Products', 'GEO', 'Year'])['VALUE'].mean(),
+        'merge': lambda: pd.merge(prices, covariates, on=['Year', 'GEO'], how='inner'),
+    }
+
+
+def comparable(result):
+    """A result with the labels as strings, to check every layout gives the same."""
+    if isinstance(result, pd.Series):
+        result = result.reset_index()
+    return decode(result).astype({col: str for col in ['GEO', 'Products'] if col in result.columns}).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare holding GEO and Products as strings or as categorical codes of the shared vocabulary.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000], help="Row counts to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    parser.add_argument('--csv-rows', type=int, default=1_000_000, help="Rows of the CSV loaded as strings and encoded")
+    args = parser.parse_args()
+
+    print(f"{'rows':>11} {'step':<8} {'layout':<11} {'seconds':>9} {'MB':>9} {'vs object':>10}")
+    for n_rows in args.rows:
+        strings = price_table(n_rows)
+        covariates = covariate_table(sorted(strings['GEO'].unique()))
+        vocabulary = extend_vocabulary({}, frame_labels([strings, covariates]))
+
+        memory, baseline, expected = {}, {}, {}
+        for name in LAYOUTS:
+            prices = layout(strings, name, vocabulary)
+            # A per-table categorical has its own categories, so the merge keys do not match
+            right = layout(covariates, name, vocabulary)
+            memory[name] = prices.memory_usage(deep=True).sum() / 1e6
+            print(f"{n_rows:>11,} {'memory':<8} {name:<11} {'':>9} {memory[name]:9.1f} {memory['object'] / memory[name]:9.1f}x")
+            for step, func in operations(prices, right).items():
+                seconds, result = best_time(func, args.repeat)
+                result = comparable(result)
+                if step not in expected:
+                    baseline[step], expected[step] = seconds, result
+                else:
+                    pd.testing.assert_frame_equal(result, expected[step], check_dtype=False)
+                print(f"{n_rows:>11,} {step:<8} {name:<11} {seconds:9.3f} {'':>9} {baseline[step] / seconds:9.1f}x")
+            del prices, right
+        del strings
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'prices.csv')
+        price_table(args.csv_rows).to_csv(path, index=False)
+        string_time, strings = best_time(lambda: load_table(path), args.repeat)
+        encoded_time, encoded = best_time(lambda: load_encoded(path, vocabulary=vocabulary), args.repeat)
+        pd.testing.assert_frame_equal(comparable(encoded), comparable(strings), check_dtype=False)
+        print(f"\n{args.csv_rows:,} row CSV")
+        print(f"{'load':<28} {'seconds':>9} {'MB':>9}")
+        print(f"{'load_table (strings)':<28} {string_time:9.3f} {strings.memory_usage(deep=True).sum() / 1e6:9.1f}")
+        print(f"{'load_encoded (vocabulary)':<28} {encoded_time:9.3f} {encoded.memory_usage(deep=True).sum() / 1e6:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
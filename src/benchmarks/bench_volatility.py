@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from volatility import EXPANDING_MIN_PERIODS, WINDOWS, window_metrics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import GEOS, TERRITORIES
+
+
+def best_time(func, repeat):
+    """Best wall time (s) of repeat calls, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def price_values(n_products, n_months, seed=0):
+    """A national scale province x product x month price array: random walks with 2% of the months missing."""
+    rng = np.random.default_rng(seed)
+    shape = (len(GEOS) + len(TERRITORIES), n_products, n_months)
+    values = rng.uniform(1, 30, shape[:2])[..., None] * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=-1))
+    values[rng.random(shape) < 0.02] = np.nan
+    return values
+
+
+def pandas_metrics(values, windows, min_periods, apply=False):
+    """
+    The same metrics with pandas, one series per (province, product) in a groupby: its rolling and
+    expanding aggregations, or with apply=True a Python function per window (.rolling().apply).
+    """
+    n_series, n_months = values.shape[0] * values.shape[1], values.shape[2]
+    prices = pd.Series(values.reshape(-1))
+    series = np.repeat(np.arange(n_series), n_months)
+    changes = prices.groupby(series).pct_change(fill_method=None) * 100
+
+    metrics = {}
+    for window in list(windows) + [None]:
+        suffix = f"{window}M" if window else ""
+
+        def windowed(column):
+            grouped = column.groupby(series)
+            if window:
+                return grouped.rolling(window, min_periods=window)
+            return grouped.expanding(min_periods=min_periods)
+
+        def aggregate(column, name):
+            rolled = windowed(column)
+            if apply:
+                func = {'std': np.std, 'mean': np.mean, 'max': np.max}[name]
+                kwargs = {'ddof': 1} if name == 'std' else {}
+                result = rolled.apply(lambda window_values: func(window_values[~np.isnan(window_values)], **kwargs), raw=True)
+            else:
+                result = getattr(rolled, name)()
+            return result.to_numpy()
+
+        deviations = aggregate(prices, 'std')
+        metrics[f'Volatility{suffix}'] = aggregate(changes, 'std')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics[f'ZScore{suffix}'] = np.where(deviations > 1e-9, (prices - aggregate(prices, 'mean')) / deviations, np.nan)
+            metrics[f'Drawdown{suffix}'] = (prices.to_numpy() / aggregate(prices, 'max') - 1) * 100
+    return {name: metric.reshape(values.shape) for name, metric in metrics.items()}
+
+
+def check(metrics, expected):
+    # pandas keeps running sums over the whole column, so on nearly constant windows of millions of
+    # rows its deviations drift by a few parts in a million
+    for name, metric in expected.items():
+        if not np.allclose(metrics[name], metric, rtol=1e-5, atol=1e-8, equal_nan=True):
+            raise AssertionError(f"{name} differs from pandas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the rolling and expanding window metrics against pandas on national scale price series.")
+    parser.add_argument('--products', type=int, nargs='+', default=[1000, 5000], help="Products per province")
+    parser.add_argument('--months', type=int, default=92, help="Months per series (92 in the StatCan table, 2017-01 to 2024-08)")
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS, help="Trailing windows in months")
+    parser.add_argument('--apply-products', type=int, default=20, help="Products per province timed with .rolling().apply")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'series':>9} {'months':>11} {'metrics':<26} {'seconds':>9} {'speedup':>8}")
+    sizes = [(n_products, False) for n_products in args.products] + [(args.apply_products, True)]
+    for n_products, apply in sizes:
+        values = price_values(n_products, args.months)
+        n_series = values.shape[0] * values.shape[1]
+        pandas_name = 'pandas .rolling().apply' if apply else 'pandas groupby().rolling()'
+        pandas_time, expected = best_time(lambda: pandas_metrics(values, args.windows, EXPANDING_MIN_PERIODS, apply), 1 if apply else args.repeat)
+        seconds, metrics = best_time(lambda: window_metrics(values, args.windows, EXPANDING_MIN_PERIODS), args.repeat)
+        check(metrics, expected)
+        print(f"{n_series:>9,} {values.size:>11,} {pandas_name:<26} {pandas_time:9.3f}")
+        print(f"{n_series:>9,} {values.size:>11,} {'window_metrics':<26} {seconds:9.3f} {pandas_time / seconds:7.1f}x")
+        del values, expected, metrics
+
+
+if __name__ == "__main__":
+    main()
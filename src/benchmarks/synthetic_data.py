@@ -0,0 +1,204 @@
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from data_cleaning import FOOD_PRICE_COLUMNS, PRODUCT_CATEGORIES
+
+# Columns of the raw StatCan food price table, in file order
+FOOD_PRICE_HEADER = [
+    "REF_DATE", "GEO", "DGUID", "Products", "UOM", "UOM_ID", "SCALAR_FACTOR", "SCALAR_ID",
+    "VECTOR", "COORDINATE", "VALUE", "STATUS", "SYMBOL", "TERMINATED", "DECIMALS"
+]
+
+GEOS = [
+    "Canada", "Newfoundland and Labrador", "Prince Edward Island", "Nova Scotia", "New Brunswick",
+    "Quebec", "Ontario", "Manitoba", "Saskatchewan", "Alberta", "British Columbia"
+]
+
+# Columns of the StatCan income (average weekly earnings) and population tables, in file order
+INCOME_HEADER = [
+    "REF_DATE", "GEO", "DGUID", "Estimate", "UOM", "UOM_ID", "SCALAR_FACTOR", "SCALAR_ID",
+    "VECTOR", "COORDINATE", "VALUE", "STATUS", "SYMBOL", "TERMINATED", "DECIMALS"
+]
+POPULATION_HEADER = [column for column in INCOME_HEADER if column != "Estimate"]
+
+# The population table also covers the territories
+TERRITORIES = ["Yukon", "Northwest Territories", "Nunavut"]
+
+# Products the cleaning stage keeps, plus uncategorised ones so the table has ~110 products
+PRODUCTS = (
+    [item for items in PRODUCT_CATEGORIES.values() for item in items]
+    + [f"Uncategorised product {i}, 1 unit" for i in range(50)]
+)
+
+MONTHS = pd.period_range('2017-01', '2024-08', freq='M').strftime('%Y-%m').to_numpy()
+
+
+def series_months(n_periods, step=1):
+    """n_periods 'YYYY-MM' strings from 2017-01, step months apart."""
+    return pd.period_range('2017-01', periods=n_periods * step, freq='M')[::step].strftime('%Y-%m').to_numpy()
+
+
+def series_panel(geos, n_rows, n_periods, step):
+    """
+    (GEO, REF_DATE, period number) of a series table sorted by GEO then date, as StatCan writes them: every
+    GEO over n_periods periods, or over as many periods as n_rows needs.
+    """
+    if n_rows is not None:
+        n_periods = max(1, -(-n_rows // len(geos)))
+    months = series_months(n_periods, step)
+    geo_idx = np.repeat(np.arange(len(geos)), n_periods)[:n_rows]
+    period_idx = np.tile(np.arange(n_periods), len(geos))[:n_rows]
+    return np.array(geos, dtype=object)[geo_idx], months[period_idx], geo_idx, period_idx
+
+
+def generate_income(filepath, n_rows=None, seed=0):
+    """
+    Writes a StatCan shaped average weekly earnings CSV (as income.csv): by default one row per GEO
+    and month from 2017-01 to 2024-08, with n_rows the same layout over as many months as needed.
+    """
+    rng = np.random.default_rng(seed)
+    geos, months, geo_idx, period_idx = series_panel(GEOS, n_rows, len(MONTHS), 1)
+    base = rng.uniform(900, 1300, len(GEOS))
+    n = len(geos)
+    table = pd.DataFrame({
+        "REF_DATE": months,
+        "GEO": geos,
+        "DGUID": "2021A000011124",
+        "Estimate": "Average weekly earnings including overtime for all employees",
+        "UOM": "Dollars",
+        "UOM_ID": 81,
+        "SCALAR_FACTOR": "units",
+        "SCALAR_ID": 0,
+        "VECTOR": "v54027306",
+        "COORDINATE": "1.5",
+        "VALUE": np.round(base[geo_idx] * (1.003 ** period_idx) * rng.normal(1, 0.01, n), 2),
+        "STATUS": "A",
+        "SYMBOL": "",
+        "TERMINATED": "",
+        "DECIMALS": 2,
+    }, columns=INCOME_HEADER)
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    table.to_csv(filepath, index=False, quoting=1, encoding='utf-8-sig')
+    return filepath
+
+
+def generate_population(filepath, n_rows=None, seed=0):
+    """
+    Writes a StatCan shaped quarterly population CSV (as population.csv): by default one row per GEO,
+    territories included, and quarter from 2017-01 to 2024-07.
+    """
+    rng = np.random.default_rng(seed)
+    geos, months, geo_idx, period_idx = series_panel(GEOS + TERRITORIES, n_rows, len(MONTHS[::3]), 3)
+    base = rng.uniform(40_000, 15_000_000, len(GEOS) + len(TERRITORIES))
+    table = pd.DataFrame({
+        "REF_DATE": months,
+        "GEO": geos,
+        "DGUID": "2016A000011124",
+        "UOM": "Persons",
+        "UOM_ID": 249,
+        "SCALAR_FACTOR": "units",
+        "SCALAR_ID": 0,
+        "VECTOR": "v1",
+        "COORDINATE": "1",
+        "VALUE": np.round(base[geo_idx] * (1.003 ** period_idx)).astype(np.int64),
+        "STATUS": "",
+        "SYMBOL": "",
+        "TERMINATED": "",
+        "DECIMALS": 0,
+    }, columns=POPULATION_HEADER)
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    table.to_csv(filepath, index=False, quoting=1, encoding='utf-8-sig')
+    return filepath
+
+
+def generate_food_prices(filepath, n_rows, seed=0, block_size=1_000_000):
+    """
+    Writes a StatCan shaped food price CSV with n_rows rows of random (month, province, product) prices.
+    """
+    rng = np.random.default_rng(seed)
+    geos = np.array(GEOS, dtype=object)
+    products = np.array(PRODUCTS, dtype=object)
+    base_prices = rng.uniform(1, 30, size=len(PRODUCTS))
+
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    written = 0
+    while written < n_rows:
+        size = min(block_size, n_rows - written)
+        geo_idx = rng.integers(0, len(GEOS), size)
+        product_idx = rng.integers(0, len(PRODUCTS), size)
+        month_idx = rng.integers(0, len(MONTHS), size)
+
+        block = pd.DataFrame({
+            "REF_DATE": MONTHS[month_idx],
+            "GEO": geos[geo_idx],
+            "DGUID": "2016A000011124",
+            "Products": products[product_idx],
+            "UOM": "Dollars",
+            "UOM_ID": 81,
+            "SCALAR_FACTOR": "units",
+            "SCALAR_ID": 0,
+            "VECTOR": "v1353834271",
+            "COORDINATE": "1.1",
+            "VALUE": np.round(base_prices[product_idx] * rng.lognormal(0, 0.1, size) * (1 + month_idx / 300), 2),
+            "STATUS": "",
+            "SYMBOL": "",
+            "TERMINATED": "",
+            "DECIMALS": 2,
+        }, columns=FOOD_PRICE_HEADER)
+        block.to_csv(filepath, index=False, mode='w' if written == 0 else 'a', header=(written == 0), quoting=1)
+        written += size
+
+    return filepath
+
+
+def food_price_frame(n_rows, seed=0):
+    """The same kind of table as generate_food_prices, in memory and parsed as LoadStatCanTable gives it."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'REF_DATE': pd.PeriodIndex(MONTHS[rng.integers(0, len(MONTHS), n_rows)], freq='M'),
+        'GEO': pd.Categorical.from_codes(rng.integers(0, len(GEOS), n_rows), categories=GEOS),
+        'Products': pd.Categorical.from_codes(rng.integers(0, len(PRODUCTS), n_rows), categories=PRODUCTS),
+        'VALUE': rng.uniform(1, 30, n_rows).round(2).astype('float32'),
+    }, columns=FOOD_PRICE_COLUMNS)
+
+
+def generate_dataset(folder, n_rows, seed=0):
+    """
+    Writes the three input tables laid out as the scripts expect them from the repo root: the food
+    prices (n_rows rows), population and income for data_cleaning.py, and population and income
+    again under data/ for the geo_analysis scripts. Returns the food price table's path.
+    """
+    food_path = generate_food_prices(os.path.join(folder, 'food_prices_sample.csv'), n_rows, seed)
+    for prefix in ['', 'data']:
+        generate_population(os.path.join(folder, prefix, 'population.csv'), seed=seed)
+        generate_income(os.path.join(folder, prefix, 'income.csv'), seed=seed)
+    return food_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic StatCan food price, income and population tables.")
+    parser.add_argument('path', help="Where to write the CSV, or the folder for --dataset")
+    parser.add_argument('--table', choices=['food', 'income', 'population'], default='food', help="Table to write")
+    parser.add_argument('--dataset', action='store_true',
+                        help="Write all three tables into the path folder, laid out as the repo root")
+    parser.add_argument('--rows', type=int, default=None,
+                        help="Rows of the table (default: 10M food prices, one per GEO and period for income and population)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    if args.dataset:
+        generate_dataset(args.path, args.rows or 10_000_000, args.seed)
+    elif args.table == 'food':
+        generate_food_prices(args.path, args.rows or 10_000_000, args.seed)
+    elif args.table == 'income':
+        generate_income(args.path, args.rows, args.seed)
+    else:
+        generate_population(args.path, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
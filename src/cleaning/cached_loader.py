@@ -0,0 +1,155 @@
+import functools
+import hashlib
+import inspect
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+from pipeline import file_hash
+
+# On-disk cache of preprocessed tables, shared by every script and notebook run from the repo root.
+# GROCERY_CACHE_MB bounds its size (least recently used entries are evicted first); 0 turns it off.
+CACHE_DIR = os.environ.get('GROCERY_CACHE_DIR', '.grocery_cache')
+CACHE_MAX_BYTES = int(float(os.environ.get('GROCERY_CACHE_MB', '512')) * 1_000_000)
+
+# Preprocessed tables kept in memory by each process, least recently used dropped first
+MEMORY_ENTRIES = 32
+
+# Part of every key. Bump it to drop all cached tables after a change the keys cannot see, e.g. in
+# a helper a loader calls that is not listed in its depends
+CACHE_VERSION = 1
+
+_memory = OrderedDict()
+_hashes = {}
+
+
+def content_hash(path):
+    """Hash of a file's contents, re-read only when its size or modification time changes."""
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if signature not in _hashes:
+        _hashes[signature] = file_hash(path)
+    return _hashes[signature]
+
+
+def source_of(obj):
+    """Source code of a function or module, or its bytecode when there is no source file (e.g. a notebook cell)."""
+    try:
+        return inspect.getsource(obj).encode()
+    except (OSError, TypeError):
+        return inspect.unwrap(obj).__code__.co_code
+
+
+def loader_digest(func, depends):
+    """
+    Hash of what a loader's result depends on besides its arguments: its source code, the source
+    of the functions and modules in depends, and the repr of any other value in depends (column
+    lists, dtypes), along with CACHE_VERSION and the pandas version the tables are pickled with.
+    """
+    digest = hashlib.sha256(f"{CACHE_VERSION} {pd.__version__}".encode())
+    digest.update(source_of(func))
+    for dependency in depends:
+        if callable(dependency) or inspect.ismodule(dependency):
+            digest.update(source_of(dependency))
+        else:
+            digest.update(repr(dependency).encode())
+    return digest.hexdigest()
+
+
+def cache_key(func, source_digest, path, args, kwargs):
+    """
+    Key of one preprocessed table: the loader's source digest (see loader_digest), the input file's
+    contents and the loader's other arguments, defaults included. Editing the loader, one of its
+    listed dependencies or the file gives a new key.
+    """
+    bound = inspect.signature(func).bind(path, *args, **kwargs)
+    bound.apply_defaults()
+    params = list(bound.arguments.items())[1:]
+
+    digest = hashlib.sha256()
+    digest.update(source_digest.encode())
+    digest.update(content_hash(path).encode())
+    digest.update(repr(params).encode())
+    return f"{func.__name__}-{digest.hexdigest()[:32]}"
+
+
+def remember(key, df):
+    _memory[key] = df
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def read_disk(key):
+    path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    if CACHE_MAX_BYTES <= 0 or not os.path.exists(path):
+        return None
+    # Hits count as uses for the eviction order
+    os.utime(path)
+    return pd.read_pickle(path)
+
+
+def write_disk(key, df):
+    if CACHE_MAX_BYTES <= 0:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    # Written under a temporary name first so a concurrent reader never sees half a file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_pickle(temp_path)
+    os.replace(temp_path, path)
+    evict(CACHE_MAX_BYTES)
+
+
+def evict(max_bytes):
+    """Deletes the least recently used cache files until the cache is at most max_bytes."""
+    entries = []
+    for file_name in os.listdir(CACHE_DIR):
+        if file_name.endswith('.pkl'):
+            stat = os.stat(os.path.join(CACHE_DIR, file_name))
+            entries.append((stat.st_mtime_ns, stat.st_size, file_name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, file_name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(CACHE_DIR, file_name))
+        total -= size
+
+
+def clear_cache():
+    """Empties the in-memory and on-disk caches."""
+    _memory.clear()
+    if os.path.isdir(CACHE_DIR):
+        evict(0)
+
+
+def cached_loader(func=None, *, depends=()):
+    """
+    Caches a loader func(path, *args, **kwargs) that returns a DataFrame, first in this process and
+    then on disk, keyed by cache_key. Every call returns its own copy, so callers can modify it.
+
+    depends lists what the result depends on besides the loader's own code and arguments: the
+    helpers it calls (functions or whole modules) and the constants it reads, e.g.
+    @cached_loader(depends=[LoadStatCanTable, SERIES_COLUMNS]). A change to any of them gives
+    new keys, so a cached table is never one the current code would not build.
+    """
+    if func is None:
+        return functools.partial(cached_loader, depends=depends)
+    source_digest = loader_digest(func, depends)
+
+    @functools.wraps(func)
+    def load(path, *args, **kwargs):
+        key = cache_key(func, source_digest, path, args, kwargs)
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key].copy()
+
+        df = read_disk(key)
+        if df is None:
+            df = func(path, *args, **kwargs)
+            write_disk(key, df)
+        remember(key, df)
+        return df.copy()
+
+    return load
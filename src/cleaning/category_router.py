@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from storage import save_table
+
+# Threads writing the category files. Writing is mostly I/O and compression, so threads are enough.
+WRITE_THREADS = int(os.environ.get('GROCERY_WRITE_THREADS', '8'))
+
+
+def product_key(name):
+    """Products are matched on their name without surrounding spaces, e.g. 'Tofu, 350 grams ' and 'Tofu, 350 grams'."""
+    return str(name).strip()
+
+
+def category_codes(categories):
+    """
+    Code table for a dict of category -> products: the category names in order, and a dict of
+    product key -> position of its category. A product can only belong to one category.
+    """
+    names = list(categories)
+    codes = {}
+    for code, items in enumerate(categories.values()):
+        for item in items:
+            key = product_key(item)
+            if codes.setdefault(key, code) != code:
+                raise ValueError(f"Product {item!r} is in both {names[codes[key]]!r} and {names[code]!r}")
+    return names, codes
+
+
+def route(products, codes):
+    """Category code of every row, -1 where the product is in no category. Each distinct product is looked up once."""
+    if isinstance(products.dtype, pd.CategoricalDtype):
+        row_codes, uniques = products.cat.codes.to_numpy(), products.cat.categories
+    else:
+        row_codes, uniques = pd.factorize(products)
+    unique_codes = np.array([codes.get(product_key(product), -1) for product in uniques] + [-1], dtype=np.int64)
+    # Missing products have row code -1, which picks the trailing -1
+    return unique_codes[row_codes]
+
+
+def category_members(products, categories):
+    """The given product labels grouped by category, matched as route matches them."""
+    names, codes = category_codes(categories)
+    members = {name: [] for name in names}
+    for product in products:
+        code = codes.get(product_key(product), -1)
+        if code >= 0:
+            members[names[code]].append(product)
+    return members
+
+
+def partition(df, row_codes, n_categories):
+    """Splits df into one frame per category code with a single stable sort, keeping the row order in each."""
+    order = np.argsort(row_codes, kind='stable')
+    bounds = np.searchsorted(row_codes[order], np.arange(n_categories + 1))
+    return [df.iloc[order[start:end]] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def write_partitions(frames, paths, mode='w', fmt=None, threads=WRITE_THREADS):
+    """Saves each frame to its path, several files at a time."""
+    threads = max(1, min(threads, len(frames)))
+    if threads == 1:
+        for frame, path in zip(frames, paths):
+            save_table(frame, path, mode, fmt)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # list() re-raises the first error from a write
+        list(pool.map(lambda args: save_table(*args, mode, fmt), zip(frames, paths)))
+
+
+def unmatched_counts(products, row_codes):
+    """Rows per product that matched no category."""
+    missed = products[row_codes < 0]
+    if isinstance(missed.dtype, pd.CategoricalDtype):
+        missed = missed.astype(object)
+    return missed.value_counts(dropna=False)
+
+
+def report_unmatched(counts, limit=10):
+    """Prints how many rows matched no category, with the products behind most of them."""
+    counts = counts.groupby(level=0, dropna=False).sum().sort_values(ascending=False, kind='stable')
+    if counts.empty:
+        return
+    print(f"{int(counts.sum()):,} rows of {len(counts)} products matched no category and were left out:")
+    for product, n_rows in counts.head(limit).items():
+        print(f"  {product!r}: {n_rows:,} rows")
+    if len(counts) > limit:
+        print(f"  ... and {len(counts) - limit} more")
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from periods import label_periods
+
+# Lags in months for the period over period changes
+CHANGE_LAGS = {
+    'MoM_Increase': 1,
+    'QoQ_Increase': 3,
+    'YoY_Increase': 12,
+}
+
+# Windows in months for the rolling changes: the trailing window's average price against the window before it
+ROLLING_WINDOWS = [3, 6, 12]
+
+
+def pct_change(values, lag):
+    """
+    Percent change of every series over lag months along the last axis. NaN where either price is
+    missing, including the first lag months, so a series never borrows another one's prices.
+    """
+    change = np.full(values.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change[..., lag:] = (values[..., lag:] / values[..., :-lag] - 1) * 100
+    return change
+
+
+def rolling_mean(values, window):
+    """Trailing window month mean along the last axis, NaN unless all window months have a price."""
+    present = ~np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    sums = np.pad(np.cumsum(np.where(present, values, 0.0), axis=-1), pad)
+    counts = np.pad(np.cumsum(present, axis=-1), pad)
+
+    means = np.full(values.shape, np.nan)
+    window_sums = sums[..., window:] - sums[..., :-window]
+    full = (counts[..., window:] - counts[..., :-window]) == window
+    means[..., window - 1:] = np.where(full, window_sums / window, np.nan)
+    return means
+
+
+def rolling_change(values, window):
+    """Percent change of the trailing window month mean against the window before it."""
+    return pct_change(rolling_mean(values, window), window)
+
+
+def change_rates(cube, lags=CHANGE_LAGS, windows=ROLLING_WINDOWS):
+    """Computes every change for every series of a price cube. Returns a dict of arrays shaped like the cube."""
+    changes = {name: pct_change(cube['values'], lag) for name, lag in lags.items()}
+    for window in windows:
+        changes[f'Rolling{window}M_Change'] = rolling_change(cube['values'], window)
+    return changes
+
+
+def change_table(cube, changes, schemes=None):
+    """
+    Long table of the cube's prices with their changes, one row per (GEO, Products, month) that has
+    a price, ordered by Products, GEO and REF_DATE. Months are labelled with the period schemes
+    (all of them by default) once, not row by row.
+    """
+    # Products first so each product's rows are contiguous, as the per-product tests expect
+    order = (1, 0, 2)
+    axes = cube['axes']
+    values = cube['values'].transpose(order)
+    product_idx, geo_idx, month_idx = np.nonzero(~np.isnan(values))
+
+    table = pd.DataFrame({
+        'REF_DATE': axes['REF_DATE'][month_idx].to_timestamp(),
+        'GEO': pd.Categorical.from_codes(geo_idx, categories=axes['GEO']),
+        'Products': pd.Categorical.from_codes(product_idx, categories=axes['Products']),
+        'VALUE': values[product_idx, geo_idx, month_idx],
+    })
+    for name, change in changes.items():
+        table[name] = change.transpose(order)[product_idx, geo_idx, month_idx]
+
+    labels = label_periods(pd.Series(axes['REF_DATE']), schemes)
+    for name in labels.columns:
+        table[name] = labels[name].array.take(month_idx)
+    return table
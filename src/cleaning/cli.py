@@ -0,0 +1,108 @@
+import argparse
+import os
+import runpy
+import subprocess
+import sys
+
+# Only the standard library is imported here. A subcommand's script, and the libraries it needs
+# (pandas, matplotlib, seaborn, scipy), are loaded when the subcommand runs, so listing commands or
+# running a data only step never pays for the plotting stack.
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Subcommands: name -> (script under src/, arguments always passed to it, help)
+COMMANDS = {
+    'clean': ('cleaning/data_cleaning.py', [], "Clean the StatCan tables into cleaned_data and split_data"),
+    'split': ('cleaning/data_cleaning.py', ['--split-only'], "Only route the food price table to split_data"),
+    'regional': ('cleaning/reg_comp.py', [], "Yearly item and province summaries"),
+    'categories': ('cleaning/reg_comp_cat.py', [], "Yearly category summaries per province"),
+    'income': ('geo_analysis/income_analysis.py', [], "Correlate income with category prices"),
+    'population': ('geo_analysis/pop_analysis.py', [], "Correlate population with category prices"),
+    'coast': ('geo_analysis/coast_region_analysis.py', [], "Compare category prices across coast regions"),
+    'urban-rural': ('geo_analysis/urban_vs_rural.py', [], "Compare urban and rural provinces"),
+    'temporal': ('cleaning/temporal_analysis.py', [], "Temporal analysis of food price changes"),
+    'volatility': ('cleaning/volatility.py', [], "Rolling volatility, z-scores and drawdowns of the monthly prices"),
+}
+
+# Imports listed by --import-times
+TOP_IMPORTS = 15
+
+
+def run_command(name, args):
+    """Runs a subcommand's script as __main__ with args, like python src/<script> args."""
+    script, fixed_args, _ = COMMANDS[name]
+    path = os.path.join(SRC_DIR, script)
+    sys.path.insert(0, os.path.dirname(path))
+    sys.argv = [path] + fixed_args + list(args)
+    runpy.run_path(path, run_name='__main__')
+
+
+def parse_import_times(lines):
+    """(module, self us, cumulative us) of the top level imports in -X importtime lines, the rest of the lines."""
+    imports, other = [], []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            other.append(line)
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two more spaces per level
+        depth = len(name) - len(name.lstrip(' '))
+        imports.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    if not imports:
+        return [], other
+    top = min(depth for depth, *_ in imports)
+    return [(name, self_us, cumulative_us) for depth, name, self_us, cumulative_us in imports if depth == top], other
+
+
+def report_import_times(argv):
+    """Runs the CLI again under -X importtime and prints the slowest top level imports after it."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__)] + argv,
+                            stderr=subprocess.PIPE, text=True)
+    imports, other = parse_import_times(result.stderr.splitlines())
+    if other:
+        print('\n'.join(other), file=sys.stderr)
+
+    total = sum(cumulative_us for _, _, cumulative_us in imports)
+    print(f"\nImports: {len(imports)} top level, {total / 1e6:.3f} s", file=sys.stderr)
+    print(f"{'module':<40} {'self [s]':>9} {'cumulative [s]':>15}", file=sys.stderr)
+    for name, self_us, cumulative_us in sorted(imports, key=lambda row: -row[2])[:TOP_IMPORTS]:
+        print(f"{name:<40} {self_us / 1e6:9.3f} {cumulative_us / 1e6:15.3f}", file=sys.stderr)
+    return result.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a step of the grocery price analysis. Arguments after the command go to its script.",
+        epilog="commands:\n" + "\n".join(f"  {name:<13} {description}" for name, (_, _, description) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--import-times', action='store_true',
+                        help="Report the slowest imports of the run, measured with python -X importtime")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Record each pipeline function's time, memory and rows to this JSON lines file and report them")
+    parser.add_argument('--profile-stage', metavar='FUNCTION', help="Run this function under cProfile, e.g. TukeyTestPresidency")
+    parser.add_argument('command', choices=COMMANDS, metavar='command', help="Step to run, see below")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="Arguments for the command's script, e.g. --help")
+    args = parser.parse_args()
+
+    # Read by profiling.py when the script imports it, and inherited by its worker processes
+    if args.profile:
+        os.environ['GROCERY_PROFILE'] = args.profile
+    if args.profile_stage:
+        os.environ['GROCERY_PROFILE_STAGE'] = args.profile_stage
+
+    if args.import_times:
+        sys.exit(report_import_times([args.command] + args.args))
+    run_command(args.command, args.args)
+    if args.profile:
+        print_profile(args.profile)
+
+
+def print_profile(path):
+    """Prints the aggregate report of this run's profile records."""
+    from profiling import load_records, run_id, summarize
+
+    print(f"\nProfile of run {run_id()} ({path})")
+    print(summarize(load_records(path, run_id())).to_string(index=False, float_format='{:.3f}'.format))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,252 @@
-
-
+import argparse
+import numpy as np
 import pandas as pd
 import os
-
-# Saves dataframe as a CSV, and creates a folder if not already made
-def SaveToCSV(df, file_name, folder):
-    output_folder = os.path.join('./', folder)
-    os.makedirs(output_folder, exist_ok=True)
-    output_path = os.path.join(output_folder, file_name)
-    df.to_csv(output_path, index=False)
+import tempfile
+import ref_date
+from cached_loader import cached_loader
+from category_router import category_codes, partition, report_unmatched, route, unmatched_counts, write_partitions
+from group_means import grouped_mean
+from periods import label_periods
+from price_cube import build_cube, load_cube, save_cube, to_frame
+from price_index import build_index, save_index
+from profiling import profiled
+from ref_date import parse_ref_date, quarter_of, to_periods, year_of
+from regions import COAST_MAPPING, group_column
+from storage import save_table
+from temporal_join import join
+from vocabulary import encode_frame, extend_vocabulary, frame_labels, load_vocabulary, save_vocabulary
+
+# Only the columns the pipeline uses are read from the StatCan tables
+FOOD_PRICE_COLUMNS = ['REF_DATE', 'GEO', 'Products', 'VALUE']
+FOOD_PRICE_DTYPES = {'REF_DATE': str, 'GEO': 'category', 'Products': 'category', 'VALUE': 'float32'}
+
+SERIES_COLUMNS = ['REF_DATE', 'GEO', 'VALUE']
+SERIES_DTYPES = {'REF_DATE': str, 'GEO': 'category'}
+
+# Products kept for the analysis, grouped into the split_data categories
+PRODUCT_CATEGORIES = {
+    "meats": [
+        "Ground beef, per kilogram",
+        "Pork loin cuts, per kilogram",
+        "Chicken breasts, per kilogram",
+        "Bacon, 500 grams",
+        "Wieners, 400 grams"
+    ],
+    "seafood": [
+        "Salmon, per kilogram",
+        "Shrimp, 300 grams",
+    ],
+    "meat_alts": [
+        "Meatless burgers, 226 grams",
+        "Tofu, 350 grams ",
+        "Eggs, 1 dozen"
+    ],
+    "dairy": [
+        "Milk, 4 litres",
+        "Cream, 1 litre",
+        "Butter, 454 grams",
+        "Margarine, 907 grams",
+        "Block cheese, 500 grams",
+        "Yogurt, 500 grams"
+    ],
+    "fruits": [
+        "Apples, per kilogram",
+        "Oranges, per kilogram",
+        "Bananas, per kilogram",
+        "Pears, per kilogram",
+        "Lemons, unit",
+        "Limes, unit",
+        "Grapes, per kilogram",
+        "Cantaloupe, unit",
+        "Avocado, unit"
+    ],
+    "veggies": [
+        "Potatoes, per kilogram",
+        "Tomatoes, per kilogram",
+        "Cabbage, per kilogram",
+        "Onions, per kilogram",
+        "Celery, unit",
+        "Cucumber, unit",
+        "Iceberg lettuce, unit",
+        "Broccoli, unit",
+        "Peppers, per kilogram",
+        "Squash, per kilogram",
+    ],
+    "grains": [
+        "White bread, 675 grams",
+        "Flatbread and pita, 500 grams ",
+        "Dry or fresh pasta, 500 grams",
+        "Cereal, 400 grams",
+    ],
+    "drinks": [
+        "Apple juice, 2 litres",
+        "Orange juice, 2 litres",
+        "Roasted or ground coffee, 340 grams",
+        "Tea (20 bags)"
+    ],
+    "condiments": [
+        "Ketchup, 1 litre",
+        "Vegetable oil, 3 litres",
+        "Mayonnaise, 890 millilitres ",
+        "Salsa, 418 millilitres",
+        "Pasta sauce, 650 millilitres",
+        "Salad dressing, 475 millilitres"
+    ],
+    "canned": [
+        "Canned soup, 284 millilitres",
+        "Canned beans and lentils, 540 millilitres",
+    ],
+    "nuts": [
+        "Almonds, 200 grams",
+        "Peanuts, 450 grams",
+    ],
+    "baby": [
+        "Baby food, 128 millilitres",
+        "Infant formula, 900 grams "
+    ],
+    "pantry": [
+        "White sugar, 2 kilograms",
+        "Wheat flour, 2.5 kilograms",
+        "Brown rice, 900 grams ",
+        "White rice, 2 kilograms"
+    ]
+}
+
+# Category names and the code of every product's category, for routing rows in SplitProducts
+CATEGORY_NAMES, CATEGORY_CODES = category_codes(PRODUCT_CATEGORIES)
+
+
+# Saves dataframe in the configured storage format (CSV by default), and creates a folder if not
+# already made. mode='a' appends to a CSV without a header
+@profiled
+def SaveToCSV(df, file_name, folder, mode='w', fmt=None):
+    output_path = os.path.join('./', folder, file_name)
+    save_table(df, output_path, mode, fmt)
+
+
+# Converts the 'YYYY-MM' REF_DATE strings to monthly periods and orders the columns
+@profiled
+def ParseRefDate(df, columns):
+    df['REF_DATE'] = to_periods(parse_ref_date(df['REF_DATE']))
+    return df[columns]
+
+
+# Reads a StatCan table with only the needed columns and a monthly period REF_DATE
+@profiled
+def LoadStatCanTable(path, columns, dtypes):
+    return ParseRefDate(pd.read_csv(path, usecols=columns, dtype=dtypes), columns)
+
+
+# Reads a StatCan series table (population, income). The parsed table is cached on the file's
+# contents and on the parsing code and columns, so later runs and notebooks skip the parsing
+@profiled
+@cached_loader(depends=[LoadStatCanTable, ParseRefDate, ref_date, SERIES_COLUMNS, SERIES_DTYPES])
+def LoadSeriesTable(path):
+    return LoadStatCanTable(path, SERIES_COLUMNS, SERIES_DTYPES)
+
+
+# Same as LoadStatCanTable, but yields the table in chunks of at most chunksize rows
+def IterStatCanTable(path, columns, dtypes, chunksize):
+    for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize):
+        yield ParseRefDate(chunk, columns)
+
+
+# The float32 prices as float64, each rounded to the fewest decimals that give back the same
+# float32, i.e. the number written in the table. Sums and means then come out exactly as from
+# prices read as float64, instead of carrying the float32 rounding of every price
+def PriceValues(df):
+    values = df['VALUE'].to_numpy()
+    if values.dtype != np.float32:
+        return df['VALUE'].astype('float64')
+    prices = values.astype('float64')
+    rows = np.flatnonzero(np.isfinite(values))
+    for decimals in range(10):
+        rounded = np.round(prices[rows], decimals)
+        exact = rounded.astype('float32') == values[rows]
+        prices[rows[exact]] = rounded[exact]
+        rows = rows[~exact]
+        if len(rows) == 0:
+            break
+    return pd.Series(prices, index=df.index, name='VALUE')
+
+
+# Mean of the prices per group, in float64 like the prices written in the table.
+# Runs on the GROCERY_AGG_BACKEND backend, partitioned by (GEO, Products)
+def MeanOfValues(df, keys):
+    means = grouped_mean(PriceValues(df), keys, ['GEO', 'Products'])
+    return means.reset_index()
+
+
+# Sorts and saves a table of averages, shared by the in-memory and streaming paths
+def SaveAverages(avg_df, value_name, file_name):
+    avg_df = avg_df.rename(columns={'VALUE': value_name})
+    avg_df = avg_df.sort_values(by=['GEO', 'Year'], ascending=True).reset_index(drop=True)
+    SaveToCSV(avg_df, file_name, "cleaned_data")
+    return avg_df
 
 
 # Generates DF and CSV for yearly average prices by location and product
+@profiled
 def YearlyAvgFood(df):
-    avg_df = df.copy() 
-    avg_df['Year'] = avg_df['REF_DATE'].dt.year
-    avg_df = avg_df.groupby(['Year', 'GEO', 'Products'])['VALUE'].mean().reset_index()
-    avg_df = avg_df.rename(columns={'VALUE': 'Average_Price'})
-    avg_df = avg_df.sort_values(by=['GEO', 'Year'], ascending=True).reset_index(drop=True)
-    SaveToCSV(avg_df, "yearly_avg_prices.csv", "cleaned_data")
-    return avg_df
+    year = year_of(df['REF_DATE'])
+    avg_df = MeanOfValues(df, [year, df['GEO'], df['Products']])
+    return SaveAverages(avg_df, 'Average_Price', "yearly_avg_prices.csv")
 
 
 # Generates DF and CSV for quarterly average prices by location and product
+@profiled
 def QuarterlyAvgFood(df):
-    quarter_df = df.copy()
-    quarter_df['Year'] = quarter_df['REF_DATE'].dt.year
-    quarter_df['Quarter'] = quarter_df['REF_DATE'].dt.quarter
-    avg_df = quarter_df.groupby(['Year', 'Quarter', 'GEO', 'Products'])['VALUE'].mean().reset_index()
-    avg_df = avg_df.rename(columns={'VALUE': 'Average_Price'})
-    avg_df = avg_df.sort_values(by=['GEO', 'Year'], ascending=True).reset_index(drop=True)
-    SaveToCSV(avg_df, "quarterly_avg_prices.csv", "cleaned_data")
-    return avg_df
+    year = year_of(df['REF_DATE'])
+    quarter = quarter_of(df['REF_DATE'])
+    avg_df = MeanOfValues(df, [year, quarter, df['GEO'], df['Products']])
+    return SaveAverages(avg_df, 'Average_Price', "quarterly_avg_prices.csv")
 
 
-# Generates DF and CSV adding a column to specify pre / during / post covid decided by CIHI Timeline
+# Adds a column to specify pre / during / post covid decided by CIHI Timeline
+def AddCovidPeriod(df):
+    return df.assign(COVID_Period=label_periods(df['REF_DATE'], ['COVID_Period'])['COVID_Period'])
+
+
+# Generates DF and CSV with the covid period of each row
+@profiled
 def CovidPeriod(df, name):
-    cov_df = df.copy()
-    lockdown_start = pd.to_datetime('2020-01-01')
-    lockdown_end = pd.to_datetime('2022-05-30')
-
-    def get_period(date):
-        if date < lockdown_start:
-            return 'Pre-COVID'
-        elif lockdown_start <= date <= lockdown_end:
-            return 'During-COVID'
-        else:
-            return 'Post-COVID'
-
-    cov_df['COVID_Period'] = cov_df['REF_DATE'].apply(get_period)
+    cov_df = AddCovidPeriod(df)
     cov_df = cov_df.sort_values(by=['GEO','REF_DATE',], ascending=True).reset_index(drop=True)
     SaveToCSV(cov_df, name, "cleaned_data")
     return cov_df
 
 
 # Assign Coast / Region to each province location
-def Coasts(df, name):
-    coast_df = df[df['GEO'] != 'Canada'].copy()
-
-    coast_mapping = {
-        'British Columbia': 'West Coast',
-        'Alberta': 'Interior',
-        'Saskatchewan': 'Interior',
-        'Manitoba': 'Interior',
-        'Ontario': 'Interior',
-        'Quebec': 'Interior',
-        'Newfoundland and Labrador': 'East Coast',
-        'Nova Scotia': 'East Coast',
-        'New Brunswick': 'East Coast',
-        'Prince Edward Island': 'East Coast',
-    }
+def AddCoast(df):
+    coast_df = df[df['GEO'] != 'Canada']
+    return coast_df.assign(Coast=group_column(coast_df['GEO'], 'coast', default='Unknown'))
 
-    coast_df['Coast'] = coast_df['GEO'].map(coast_mapping).fillna('Unknown')
+
+# Generates DF and CSV with the coast of each province row
+@profiled
+def Coasts(df, name):
+    coast_df = AddCoast(df)
     coast_df = coast_df.sort_values(by=['Coast','GEO', 'REF_DATE'], ascending=False).reset_index(drop=True)
     SaveToCSV(coast_df, name, "cleaned_data")
     return coast_df
 
 
 # Gets current item prices as of August 2024
-def CurrentPrices(df):
-    current_df = df[df['REF_DATE'] == '2024-08'].copy()
-    SaveToCSV(current_df, "current_prices.csv", "cleaned_data")
+@profiled
+def CurrentPrices(df, mode='w'):
+    current_df = df[df['REF_DATE'] == pd.Period('2024-08', freq='M')]
+    SaveToCSV(current_df, "current_prices.csv", "cleaned_data", mode)
     return current_df
 
 
 # Splits item list by quarter
+@profiled
 def QuarterSplit(df, name):
-    pop_df = df.copy()
-    pop_df['REF_DATE'] = pd.to_datetime(pop_df['REF_DATE'])
-
-    pop_df['Year'] = pop_df['REF_DATE'].dt.year
-    pop_df['Quarter'] = pop_df['REF_DATE'].dt.quarter
-    
-    pop_df = pop_df.drop(columns=['REF_DATE'])
+    pop_df = df.drop(columns=['REF_DATE']).assign(
+        Year=year_of(df['REF_DATE']),
+        Quarter=quarter_of(df['REF_DATE']),
+    )
 
     pop_df = pop_df.sort_values(by=['GEO', 'Year'], ascending=True).reset_index(drop=True)
     SaveToCSV(pop_df, name, "cleaned_data")
@@ -101,15 +255,12 @@ def QuarterSplit(df, name):
 
 
 # Generates DF and CSV for quarterly average prices by location and product
+@profiled
 def QuarterlyAvgIncome(df):
-    quarter_df = df.copy()
-    quarter_df['Year'] = quarter_df['REF_DATE'].dt.year
-    quarter_df['Quarter'] = quarter_df['REF_DATE'].dt.quarter
-    avg_df = quarter_df.groupby(['Year', 'Quarter', 'GEO'])['VALUE'].mean().reset_index()
-    avg_df = avg_df.rename(columns={'VALUE': 'Average_Weekly_Income'})
-    avg_df = avg_df.sort_values(by=['GEO', 'Year'], ascending=True).reset_index(drop=True)
-    SaveToCSV(avg_df, "quarterly_avg_income.csv", "cleaned_data")
-    return avg_df
+    year = year_of(df['REF_DATE'])
+    quarter = quarter_of(df['REF_DATE'])
+    avg_df = grouped_mean(df['VALUE'], [year, quarter, df['GEO']], ['GEO']).reset_index()
+    return SaveAverages(avg_df, 'Average_Weekly_Income', "quarterly_avg_income.csv")
 
 
 # Function for creating custom item list CSV
@@ -119,154 +270,319 @@ def FilterIngredients(df, items):
     return filtered_df
 
 
-# Splits ingredient list into groups CSVs after filtering
-def SplitProducts(df):
-    categories = {
-        "meats": [
-            "Ground beef, per kilogram",
-            "Pork loin cuts, per kilogram",
-            "Chicken breasts, per kilogram",
-            "Bacon, 500 grams",
-            "Wieners, 400 grams"
-        ],
-        "seafood": [
-            "Salmon, per kilogram",
-            "Shrimp, 300 grams",
-        ],
-        "meat_alts": [
-            "Meatless burgers, 226 grams",
-            "Tofu, 350 grams ",
-            "Eggs, 1 dozen"
-        ],
-        "dairy": [
-            "Milk, 4 litres",
-            "Cream, 1 litre",
-            "Butter, 454 grams",
-            "Margarine, 907 grams",
-            "Block cheese, 500 grams",
-            "Yogurt, 500 grams"
-        ],
-        "fruits": [
-            "Apples, per kilogram",
-            "Oranges, per kilogram",
-            "Bananas, per kilogram",
-            "Pears, per kilogram",
-            "Lemons, unit",
-            "Limes, unit",
-            "Grapes, per kilogram",
-            "Cantaloupe, unit",
-            "Avocado, unit"
-        ],
-        "veggies": [
-            "Potatoes, per kilogram",
-            "Tomatoes, per kilogram",
-            "Cabbage, per kilogram",
-            "Onions, per kilogram",
-            "Celery, unit",
-            "Cucumber, unit",
-            "Iceberg lettuce, unit",
-            "Broccoli, unit",
-            "Peppers, per kilogram",
-            "Squash, per kilogram",
-        ],
-        "grains": [
-            "White bread, 675 grams",
-            "Flatbread and pita, 500 grams ",
-            "Dry or fresh pasta, 500 grams",
-            "Cereal, 400 grams",
-        ],
-        "drinks": [
-            "Apple juice, 2 litres",
-            "Orange juice, 2 litres",
-            "Roasted or ground coffee, 340 grams",
-            "Tea (20 bags)"
-        ],
-        "condiments": [
-            "Ketchup, 1 litre",
-            "Vegetable oil, 3 litres",
-            "Mayonnaise, 890 millilitres ",
-            "Salsa, 418 millilitres",
-            "Pasta sauce, 650 millilitres",
-            "Salad dressing, 475 millilitres"
-        ],
-        "canned": [
-            "Canned soup, 284 millilitres",
-            "Canned beans and lentils, 540 millilitres",
-        ],
-        "nuts": [
-            "Almonds, 200 grams",
-            "Peanuts, 450 grams",
-        ],
-        "baby": [
-            "Baby food, 128 millilitres",
-            "Infant formula, 900 grams "
-        ],
-        "pantry": [
-            "White sugar, 2 kilograms",
-            "Wheat flour, 2.5 kilograms",
-            "Brown rice, 900 grams ",
-            "White rice, 2 kilograms"
-        ]
-    }
+# Splits ingredient list into groups CSVs after filtering. Every row is routed to its category
+# in one pass and the category files are written concurrently. Rows whose product is in no
+# category are left out and reported, or their counts are added to unmatched to report later.
+@profiled
+def SplitProducts(df, mode='w', unmatched=None):
+    row_codes = route(df['Products'], CATEGORY_CODES)
+    category_dfs = partition(df, row_codes, len(CATEGORY_NAMES))
+    paths = [os.path.join('./', "split_data", f"{category}.csv") for category in CATEGORY_NAMES]
+    write_partitions(category_dfs, paths, mode)
 
-    for category, items in categories.items():
-        category_df = df[df['Products'].isin(items)]
-        SaveToCSV(category_df, f"{category}.csv", "split_data")
+    counts = unmatched_counts(df['Products'], row_codes)
+    if unmatched is None:
+        report_unmatched(counts)
+    else:
+        unmatched.append(counts)
+    return df[row_codes >= 0]
 
-    all_items = [item for sublist in categories.values() for item in sublist]
-    filtered_df = df[df['Products'].isin(all_items)]
-    return filtered_df
-    
 
 # Filter dataset for US presidency terms, around Donald Trumps first term.
 def AddPresidency(df):
-    df['REF_DATE'] = pd.to_datetime(df['REF_DATE'])
-    df['Presidency_Period'] = pd.cut(
-        df['REF_DATE'],
-        bins=[
-            pd.Timestamp("2015-12-31"),
-            pd.Timestamp("2017-01-20"),  
-            pd.Timestamp("2021-01-20"),  
-            pd.Timestamp("2024-12-31")  
-        ],
-        labels=["Pre-Trump", "During-Trump", "Post-Trump"]
-    )
-    
-    return df
-
-raw_food_data = pd.read_csv('food_prices_sample.csv')
-raw_food_data = raw_food_data[['REF_DATE', 'GEO', 'Products', 'VALUE']]
-raw_food_data['REF_DATE'] = pd.to_datetime(raw_food_data['REF_DATE'])
-
-unique_foods = raw_food_data[['Products']].drop_duplicates().reset_index(drop=True)
-SaveToCSV(unique_foods, "all_food_list.csv", "")
-
-raw_food_data = SplitProducts(raw_food_data)
-
-yearly_avg = YearlyAvgFood(raw_food_data)
-quarter_avg = QuarterlyAvgFood(raw_food_data)
-covid_columns = CovidPeriod(raw_food_data, "covid_period_food.csv")
-coasts = Coasts(raw_food_data, "coasts.csv")
-current_prices = CurrentPrices(raw_food_data)
-
-raw_population_data = pd.read_csv('population.csv')
-raw_population_data = raw_population_data[['REF_DATE', 'GEO', 'VALUE']]
-raw_population_data['REF_DATE'] = pd.to_datetime(raw_population_data['REF_DATE'])
-
-quarter_population = QuarterSplit(raw_population_data, "quarter_population.csv")
+    return df.assign(Presidency_Period=label_periods(df['REF_DATE'], ['Presidency_Period'])['Presidency_Period'])
+
+
+# Cleans the food price table in memory. The categorised price table is built once and
+# every output below is derived from it without modifying it. With provinces set, only
+# their rows are kept (the product list still covers the whole table)
+@profiled
+def CleanFoodPrices(food_path, provinces=None):
+    raw_food_data = LoadStatCanTable(food_path, FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES)
+
+    unique_foods = raw_food_data[['Products']].drop_duplicates().reset_index(drop=True)
+    SaveToCSV(unique_foods, "all_food_list.csv", "")
+    if provinces is not None:
+        raw_food_data = raw_food_data[raw_food_data['GEO'].isin(provinces)]
+
+    food_data = SplitProducts(raw_food_data)
+    del raw_food_data
+
+    presidency = AddPresidency(food_data)
+    SaveToCSV(presidency, "presidency.csv", "cleaned_data")
+    month_cols = ['GEO', 'Products', 'REF_DATE']
+    save_cube(build_cube(AddPriceTotals(EmptyTotals(month_cols), PriceKeys(food_data), month_cols), 'sum', 'count'))
+
+    return {
+        'yearly_avg': YearlyAvgFood(food_data),
+        'quarter_avg': QuarterlyAvgFood(food_data),
+        'covid_period': CovidPeriod(food_data, "covid_period_food.csv"),
+        'coasts': Coasts(food_data, "coasts.csv"),
+        'current_prices': CurrentPrices(food_data),
+        'presidency': presidency,
+    }
 
-raw_income_data = pd.read_csv('income.csv')
-raw_income_data = raw_income_data[['REF_DATE', 'GEO', 'VALUE']]
-raw_income_data['REF_DATE'] = pd.to_datetime(raw_income_data['REF_DATE'])
 
-quarter_income = QuarterlyAvgIncome(raw_income_data)
+# Month, Year, Quarter, GEO and Products of every price, and its value as PriceValues gives it
+def PriceKeys(df):
+    return pd.DataFrame({
+        'REF_DATE': df['REF_DATE'].array,
+        'Year': year_of(df['REF_DATE']).to_numpy(),
+        'Quarter': quarter_of(df['REF_DATE']).to_numpy(),
+        'GEO': df['GEO'].array,
+        'Products': df['Products'].array,
+        'VALUE': PriceValues(df).to_numpy(),
+    })
+
+
+# Empty running price totals (see AddPriceTotals) per key_cols group
+def EmptyTotals(key_cols):
+    dtypes = {'REF_DATE': 'period[M]', 'Year': 'int64', 'Quarter': 'int64'}
+    totals = pd.DataFrame({col: pd.Series(dtype=dtypes.get(col, 'str')) for col in key_cols})
+    return totals.assign(sum=0.0, compensation=0.0, count=0.0)
+
+
+# Running totals of the prices per key_cols group, kept as pandas' groupby mean keeps them: the sum,
+# the compensation of its rounding errors (Kahan summation) and the count. Adding the prices of a
+# table chunk by chunk, in row order, gives exactly the means of a groupby over the whole table,
+# which (sum, count) totals merged from the chunks do not. prices come from PriceKeys
+def AddPriceTotals(totals, prices, key_cols):
+    prices = prices.dropna(subset=key_cols)
+
+    # Each distinct key of the prices is looked up once, with plain labels so totals of different
+    # chunks or refreshes line up. Groups not seen before start at zero, after the known ones
+    chunk_groups = prices.groupby(key_cols, sort=False, observed=True).ngroup().to_numpy()
+    first_rows = np.unique(chunk_groups, return_index=True)[1]
+    keys = prices[key_cols].iloc[first_rows]
+    keys = keys.astype({col: 'int64' if col in ['Year', 'Quarter'] else 'str' for col in key_cols if col != 'REF_DATE'})
+    found = pd.MultiIndex.from_frame(totals[key_cols]).get_indexer(pd.MultiIndex.from_frame(keys))
+    if (found < 0).any():
+        added = keys[found < 0].assign(sum=0.0, compensation=0.0, count=0.0)
+        found[found < 0] = len(totals) + np.arange(len(added))
+        totals = pd.concat([totals, added], ignore_index=True)
+
+    sums = totals['sum'].to_numpy(dtype='float64', copy=True)
+    compensation = totals['compensation'].to_numpy(dtype='float64', copy=True)
+    counts = totals['count'].to_numpy(dtype='float64', copy=True)
+    values = prices['VALUE'].to_numpy()
+    present = ~np.isnan(values)
+    groups, values = found[chunk_groups[present]], values[present]
+
+    # The n-th price of every group is added in step n, so each step adds at most one price per group
+    steps = pd.Series(groups).groupby(groups).cumcount().to_numpy()
+    order = np.argsort(steps, kind='stable')
+    bounds = np.searchsorted(steps[order], np.arange(steps.max() + 2 if len(steps) else 1))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        rows_in_step = order[start:end]
+        group = groups[rows_in_step]
+        y = values[rows_in_step] - compensation[group]
+        t = sums[group] + y
+        error = (t - sums[group]) - y
+        # An infinite price leaves a NaN compensation, which pandas resets
+        compensation[group] = np.where(np.isnan(error), 0.0, error)
+        sums[group] = t
+        counts[group] += 1
+
+    totals['sum'], totals['compensation'], totals['count'] = sums, compensation, counts
+    return totals
+
+
+# Turns running price totals into the same averages table YearlyAvgFood / QuarterlyAvgFood build
+def AveragesFromTotals(totals, key_cols, file_name):
+    totals = totals.sort_values(key_cols, kind='stable')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = totals['sum'].to_numpy() / totals['count'].to_numpy()
+    avg_df = totals[key_cols].assign(VALUE=means).reset_index(drop=True)
+    return SaveAverages(avg_df, 'Average_Price', file_name)
+
+
+# Cleans the food price table in chunks of at most chunksize rows so memory stays flat however
+# large the input is. Each chunk is filtered to the given provinces and routed to the split_data
+# files, the monthly, yearly and quarterly means are kept as running totals, and the sorted
+# row level outputs are rebuilt one province at a time from temporary per-province buckets.
+@profiled
+def StreamCleaning(food_path, chunksize=1_000_000, provinces=None):
+    key_cols = ['Year', 'Quarter', 'GEO', 'Products']
+    year_cols = ['Year', 'GEO', 'Products']
+    month_cols = ['GEO', 'Products', 'REF_DATE']
+    products = {}
+    quarter_totals = EmptyTotals(key_cols)
+    year_totals = EmptyTotals(year_cols)
+    month_totals = EmptyTotals(month_cols)
+    unmatched = []
+    buckets = {}
+
+    # Headers first, so outputs with no matching rows still match the in-memory path. Appended
+    # outputs are always CSV
+    for category in PRODUCT_CATEGORIES:
+        SaveToCSV(pd.DataFrame(columns=FOOD_PRICE_COLUMNS), f"{category}.csv", "split_data", fmt='csv')
+    SaveToCSV(pd.DataFrame(columns=FOOD_PRICE_COLUMNS), "current_prices.csv", "cleaned_data", fmt='csv')
+    SaveToCSV(pd.DataFrame(columns=FOOD_PRICE_COLUMNS + ['Presidency_Period']), "presidency.csv", "cleaned_data", fmt='csv')
+    SaveToCSV(pd.DataFrame(columns=FOOD_PRICE_COLUMNS + ['COVID_Period']), "covid_period_food.csv", "cleaned_data", fmt='csv')
+    SaveToCSV(pd.DataFrame(columns=FOOD_PRICE_COLUMNS + ['Coast']), "coasts.csv", "cleaned_data", fmt='csv')
+
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        for chunk in IterStatCanTable(food_path, FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES, chunksize):
+            products.update(dict.fromkeys(chunk['Products'].drop_duplicates()))
+            if provinces is not None:
+                chunk = chunk[chunk['GEO'].isin(provinces)]
+
+            chunk = SplitProducts(chunk, mode='a', unmatched=unmatched)
+            CurrentPrices(chunk, mode='a')
+            SaveToCSV(AddPresidency(chunk), "presidency.csv", "cleaned_data", 'a')
+
+            prices = PriceKeys(chunk)
+            quarter_totals = AddPriceTotals(quarter_totals, prices, key_cols)
+            year_totals = AddPriceTotals(year_totals, prices, year_cols)
+            month_totals = AddPriceTotals(month_totals, prices, month_cols)
+
+            for geo, geo_rows in chunk.groupby('GEO', observed=True):
+                if geo not in buckets:
+                    buckets[geo] = f"{len(buckets)}.csv"
+                    SaveToCSV(geo_rows, buckets[geo], bucket_dir, fmt='csv')
+                else:
+                    SaveToCSV(geo_rows, buckets[geo], bucket_dir, 'a')
+
+        SaveToCSV(pd.DataFrame({'Products': list(products)}), "all_food_list.csv", "")
+        if unmatched:
+            report_unmatched(pd.concat(unmatched))
+
+        # Sorting one province at a time gives the same order as sorting the whole table
+        for geo in sorted(buckets):
+            geo_rows = LoadStatCanTable(os.path.join(bucket_dir, buckets[geo]), FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES)
+            cov_df = AddCovidPeriod(geo_rows).sort_values(by='REF_DATE', kind='stable')
+            SaveToCSV(cov_df, "covid_period_food.csv", "cleaned_data", 'a')
+
+        coast_order = sorted(buckets, key=lambda geo: (COAST_MAPPING.get(geo, 'Unknown'), geo), reverse=True)
+        for geo in coast_order:
+            if geo == 'Canada':
+                continue
+            geo_rows = LoadStatCanTable(os.path.join(bucket_dir, buckets[geo]), FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES)
+            coast_df = AddCoast(geo_rows).sort_values(by='REF_DATE', ascending=False, kind='stable')
+            SaveToCSV(coast_df, "coasts.csv", "cleaned_data", 'a')
+
+    save_cube(build_cube(month_totals, 'sum', 'count'))
+    return {
+        'yearly_avg': AveragesFromTotals(year_totals, year_cols, "yearly_avg_prices.csv"),
+        'quarter_avg': AveragesFromTotals(quarter_totals, key_cols, "quarterly_avg_prices.csv"),
+    }
 
-quarter_prices_and_income = pd.merge(quarter_avg, quarter_income, on=["Year", "Quarter", "GEO"], how="inner")
-SaveToCSV(quarter_prices_and_income, "quarter_prices_and_income.csv", "cleaned_data")
 
-quarter_prices_and_population = pd.merge(quarter_avg, quarter_population, on=["Year", "Quarter", "GEO"], how="inner")
-SaveToCSV(quarter_prices_and_population, "quarter_prices_and_population.csv", "cleaned_data")
+# Runs the full cleaning stage. With chunksize set, the food price table is streamed
+# through StreamCleaning instead of being loaded whole. With provinces set, only their
+# food prices are cleaned.
+@profiled
+def RunCleaning(food_path='food_prices_sample.csv', population_path='population.csv', income_path='income.csv', chunksize=None,
+                provinces=None):
+    if chunksize:
+        outputs = StreamCleaning(food_path, chunksize, provinces)
+    else:
+        outputs = CleanFoodPrices(food_path, provinces)
+    outputs.update(MergeQuarterlyCovariates(outputs['quarter_avg'], population_path, income_path))
+    outputs['monthly_covariates'] = MergeMonthlyCovariates(population_path, income_path)
+    SavePriceIndexes(outputs['yearly_avg'])
+    return outputs
+
+
+# Only routes the food price table to the split_data category files, e.g. to refresh them for
+# reg_comp.py without rebuilding the cleaned tables. With chunksize set, the table is streamed.
+# With provinces set, only their rows are routed.
+@profiled
+def RunSplit(food_path='food_prices_sample.csv', chunksize=None, provinces=None):
+    if not chunksize:
+        food_data = LoadStatCanTable(food_path, FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES)
+        SplitProducts(food_data if provinces is None else food_data[food_data['GEO'].isin(provinces)])
+        return
+
+    for category in PRODUCT_CATEGORIES:
+        SaveToCSV(pd.DataFrame(columns=FOOD_PRICE_COLUMNS), f"{category}.csv", "split_data", fmt='csv')
+    unmatched = []
+    for chunk in IterStatCanTable(food_path, FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES, chunksize):
+        if provinces is not None:
+            chunk = chunk[chunk['GEO'].isin(provinces)]
+        SplitProducts(chunk, mode='a', unmatched=unmatched)
+    if unmatched:
+        report_unmatched(pd.concat(unmatched))
+
+
+# Writes the lookup indexes for point and range price queries: the monthly prices from the price
+# cube, in float32 like the VALUE column they come from, and the float64 yearly averages
+@profiled
+def SavePriceIndexes(yearly_avg):
+    save_index(build_index(to_frame(load_cube()), dtype='float32'), 'monthly')
+    save_index(build_index(yearly_avg, 'Year', 'Average_Price', freq='Y'), 'yearly')
+
+
+# Adds the provinces and products of the cleaned tables, and the category names, to the shared
+# vocabulary the later stages encode GEO, Products and category with
+@profiled
+def SaveVocabulary(tables):
+    labels = frame_labels(tables)
+    labels['category'] = list(PRODUCT_CATEGORIES)
+    vocabulary = extend_vocabulary(load_vocabulary(), labels)
+    save_vocabulary(vocabulary)
+    return vocabulary
+
+
+# Joins the quarterly average prices with quarterly population and income, on GEO codes of the
+# shared vocabulary and quarter keys. Only the quarters with both a price and a covariate are kept
+@profiled
+def MergeQuarterlyCovariates(quarter_avg, population_path, income_path):
+    raw_population_data = LoadSeriesTable(population_path)
+    quarter_population = QuarterSplit(raw_population_data, "quarter_population.csv")
+
+    raw_income_data = LoadSeriesTable(income_path)
+    quarter_income = QuarterlyAvgIncome(raw_income_data)
+
+    vocabulary = SaveVocabulary([quarter_avg, quarter_population, quarter_income])
+    quarter_avg, quarter_population, quarter_income = (
+        encode_frame(df, vocabulary) for df in [quarter_avg, quarter_population, quarter_income])
+
+    quarter = ["Year", "Quarter"]
+    income = (quarter_income, ['Average_Weekly_Income'], 'exact')
+    quarter_prices_and_income = join(quarter_avg, [income], ["GEO"], quarter, how="inner").reset_index(drop=True)
+    SaveToCSV(quarter_prices_and_income, "quarter_prices_and_income.csv", "cleaned_data")
+
+    population = (quarter_population, ['VALUE'], 'exact')
+    quarter_prices_and_population = join(quarter_avg, [population], ["GEO"], quarter, how="inner").reset_index(drop=True)
+    SaveToCSV(quarter_prices_and_population, "quarter_prices_and_population.csv", "cleaned_data")
+
+    return {
+        'quarter_population': quarter_population,
+        'quarter_income': quarter_income,
+        'quarter_prices_and_income': quarter_prices_and_income,
+        'quarter_prices_and_population': quarter_prices_and_population,
+    }
 
-presidency = AddPresidency(raw_food_data)
-SaveToCSV(presidency, "presidency.csv", "cleaned_data")
 
+# Aligns the monthly prices of the price cube with income and population. Income is monthly and is
+# taken as of each month (its last value up to 2 months before); population is quarterly and is
+# interpolated between quarters, so every month of a province gets both without losing prices
+@profiled
+def MergeMonthlyCovariates(population_path, income_path):
+    month_prices = to_frame(load_cube(), 'Average_Price').astype({'Average_Price': 'float32'})
+
+    income = LoadSeriesTable(income_path).rename(columns={'VALUE': 'Average_Weekly_Income'})
+    population = LoadSeriesTable(population_path).rename(columns={'VALUE': 'Population'})
+
+    monthly = join(month_prices, [
+        (income, ['Average_Weekly_Income'], 'asof', 2),
+        (population, ['Population'], 'interpolate', 3),
+    ], ['GEO'], 'REF_DATE')
+    SaveToCSV(monthly, "monthly_prices_and_covariates.csv", "cleaned_data")
+    return monthly
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the StatCan food price, population and income tables.")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Stream the food price table in chunks of this many rows")
+    parser.add_argument('--provinces', nargs='+', default=None, metavar='GEO',
+                        help="Only keep the food prices of these provinces, e.g. --provinces 'Nova Scotia' Ontario")
+    parser.add_argument('--split-only', action='store_true',
+                        help="Only route the food price table to the split_data category files")
+    args = parser.parse_args()
+    if args.split_only:
+        RunSplit(chunksize=args.chunksize, provinces=args.provinces)
+    else:
+        RunCleaning(chunksize=args.chunksize, provinces=args.provinces)
@@ -0,0 +1,157 @@
+import hashlib
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+# Figures are drawn headless with the Agg backend and only written to PNG, so batch runs never
+# block on a window. GROCERY_SHOW_PLOTS=1 also shows every figure, for interactive runs.
+SHOW_PLOTS = os.environ.get('GROCERY_SHOW_PLOTS', '0') == '1'
+if not SHOW_PLOTS:
+    matplotlib.use('Agg', force=True)
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from PIL import Image
+
+from parallel_stats import WORKERS, pool_context
+from profiling import profiled
+
+# Processes drawing figures at the same time
+PLOT_WORKERS = int(os.environ.get('GROCERY_PLOT_WORKERS', str(WORKERS)))
+
+# PNG text chunk holding the hash of the data and code a figure was drawn from
+HASH_KEY = 'Source-Hash'
+
+# Bar charts with more bars than this skip seaborn and are drawn by bar_chart
+LARGE_BAR_CHART = 40
+
+
+def data_hash(data, digest=None):
+    """Hash of a figure's data: frames and series by their values, index, names and dtypes, dicts and lists item by item."""
+    digest = digest or hashlib.sha256()
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+        names = list(data.columns) if isinstance(data, pd.DataFrame) else [data.name]
+        digest.update(repr((names, [str(dtype) for dtype in np.atleast_1d(data.dtypes)])).encode())
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            digest.update(repr(key).encode())
+            data_hash(value, digest)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            data_hash(value, digest)
+    else:
+        digest.update(repr(data).encode())
+    return digest
+
+
+def figure_hash(draw, data, kwargs):
+    """Hash of everything a figure depends on: its data, the draw function's code and arguments, and the plotting library versions."""
+    digest = data_hash(data)
+    try:
+        digest.update(inspect.getsource(draw).encode())
+    except OSError:
+        digest.update(draw.__code__.co_code)
+    digest.update(repr(sorted(kwargs.items())).encode())
+    digest.update(f"{matplotlib.__version__} {sns.__version__}".encode())
+    return digest.hexdigest()
+
+
+def stored_hash(path):
+    """The hash a PNG was drawn from, or None if it does not exist or has none."""
+    try:
+        with Image.open(path) as image:
+            return image.info.get(HASH_KEY)
+    except (OSError, ValueError):
+        return None
+
+
+def draw_figure(draw, data, path, kwargs, source_hash):
+    """Calls draw(data, **kwargs) to draw the current figure and saves it to path with its hash."""
+    draw(data, **kwargs)
+    figure = plt.gcf()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    figure.savefig(path, metadata={HASH_KEY: source_hash})
+    if SHOW_PLOTS:
+        plt.show()
+    plt.close(figure)
+    return path
+
+
+def draw_job(job):
+    return draw_figure(*job)
+
+
+@profiled
+def render_all(figures, workers=None):
+    """
+    Draws figures, given as (draw, data, path) or (draw, data, path, kwargs) tuples where draw is a
+    module-level function drawing data on a new figure. A figure is only drawn again when the hash
+    of its data and code differs from the one stored in its PNG. Out of date figures are drawn in
+    a process pool with more than one worker. Returns whether each figure was drawn.
+    """
+    workers = PLOT_WORKERS if workers is None else workers
+    jobs, drawn = [], []
+    for draw, data, path, *rest in figures:
+        kwargs = rest[0] if rest else {}
+        source_hash = figure_hash(draw, data, kwargs)
+        stale = stored_hash(path) != source_hash
+        if stale:
+            jobs.append((draw, data, path, kwargs, source_hash))
+        else:
+            print(f"Up to date, not redrawn: {path}")
+        drawn.append(stale)
+
+    if workers > 1 and len(jobs) > 1 and not SHOW_PLOTS:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=pool_context()) as pool:
+            list(pool.map(draw_job, jobs))
+    else:
+        for job in jobs:
+            draw_job(job)
+    return drawn
+
+
+def render(draw, data, path, **kwargs):
+    """Draws one figure with render_all, returning whether it was drawn."""
+    return render_all([(draw, data, path, kwargs)], workers=1)[0]
+
+
+def levels(values):
+    """Plot order of a column's values, as seaborn orders them: categories, else order of appearance."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return list(values.cat.categories[np.isin(values.cat.categories, values.dropna().unique())])
+    return list(pd.unique(values.dropna()))
+
+
+def bar_chart(data, x, y, hue, palette=None):
+    """
+    Grouped bars of the mean y per (x, hue) on the current axes, like sns.barplot without error
+    bars, but drawn with a single ax.bar call per hue. Stays fast with hundreds of bars.
+    """
+    ax = plt.gca()
+    x_levels, hue_levels = levels(data[x]), levels(data[hue])
+    means = data.groupby([x, hue], observed=True)[y].mean().unstack(hue).reindex(index=x_levels, columns=hue_levels)
+    # Desaturated as sns.barplot does by default
+    colors = [sns.desaturate(color, 0.75) for color in sns.color_palette(palette, len(hue_levels))]
+    width = 0.8 / len(hue_levels)
+    positions = np.arange(len(x_levels))
+    for i, level in enumerate(hue_levels):
+        ax.bar(positions - 0.4 + width * (i + 0.5), means[level].to_numpy(), width,
+               color=colors[i], label=str(level))
+    ax.set_xticks(positions, [str(level) for level in x_levels])
+    ax.set_xlim(-0.5, len(x_levels) - 0.5)
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    ax.legend(title=hue)
+    return ax
+
+
+def barplot(data, x, y, hue, palette=None):
+    """sns.barplot for small charts, bar_chart for ones with more than LARGE_BAR_CHART bars."""
+    if data.groupby([x, hue], observed=True).ngroups > LARGE_BAR_CHART:
+        return bar_chart(data, x, y, hue, palette)
+    return sns.barplot(data=data, x=x, y=y, hue=hue, palette=palette)
@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from parallel_stats import WORKERS, pool_context
+
+# Backend for the yearly / quarterly grouped means: 'pandas' runs one groupby in the calling
+# thread, 'threads' and 'processes' split the rows into partitions by (GEO, Products) and run
+# the partitions on GROCERY_WORKERS threads or forked processes.
+AGG_BACKEND = os.environ.get('GROCERY_AGG_BACKEND', 'pandas')
+BACKENDS = ('pandas', 'threads', 'processes')
+
+# Inputs of the grouped mean being run, inherited by forked workers so they are not pickled
+_shared = {}
+
+
+def partition_ids(columns, n_parts):
+    """
+    Partition of every row from its values in columns. Equal values always go to the same
+    partition, so every group that includes these columns lies in exactly one partition.
+    """
+    combined = np.zeros(len(columns[0]), dtype=np.int64)
+    n_codes = 1
+    for column in columns:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, size = column.cat.codes.to_numpy(), len(column.cat.categories)
+        else:
+            codes, uniques = pd.factorize(column)
+            size = len(uniques)
+        combined = combined * (size + 1) + (codes.astype(np.int64) + 1)
+        n_codes *= size + 1
+    # A lookup table of partitions is cheaper than a modulo per row while the codes are few
+    if n_codes <= 1 << 20:
+        return (np.arange(n_codes) % n_parts).astype(np.int16)[combined]
+    return (combined % n_parts).astype(np.int16)
+
+
+def partition_mean(values, keys, part_ids, position):
+    """The grouped mean of one partition, over its rows in their original order."""
+    rows = np.flatnonzero(part_ids == position)
+    return values.iloc[rows].groupby([key.iloc[rows] for key in keys], observed=True).mean()
+
+
+def shared_partition_mean(position):
+    return partition_mean(_shared['values'], _shared['keys'], _shared['part_ids'], position)
+
+
+def grouped_mean(values, keys, partition_by, backend=None, workers=None):
+    """
+    values.groupby(keys, observed=True).mean(), computed by the configured backend. keys are
+    Series aligned with values; partition_by names the keys to partition on, e.g. ['GEO', 'Products'].
+
+    Each group falls in a single partition and is averaged by the same pandas groupby over the
+    same rows in the same order, so every backend gives exactly the same means. The partitions
+    are concatenated and sorted by the keys, as groupby sorts them.
+    """
+    backend = backend or AGG_BACKEND
+    workers = WORKERS if workers is None else workers
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown aggregation backend {backend!r}, expected one of {BACKENDS}")
+    if backend == 'pandas' or workers <= 1 or len(values) == 0:
+        return values.groupby(keys, observed=True).mean()
+
+    # One partition per worker: each worker picks its rows out of the partition ids itself
+    part_keys = [key for key in keys if key.name in partition_by]
+    part_ids = partition_ids(part_keys, workers)
+
+    if backend == 'processes' and 'fork' in pool_context().get_start_method():
+        _shared.update(values=values, keys=keys, part_ids=part_ids)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+                partials = list(pool.map(shared_partition_mean, range(workers)))
+        finally:
+            _shared.clear()
+    else:
+        # pandas releases the GIL inside its groupby kernels, so threads also spread the work
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(lambda position: partition_mean(values, keys, part_ids, position), range(workers)))
+
+    return pd.concat(partials).sort_index()
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import pandas as pd
+
+from data_cleaning import (
+    FOOD_PRICE_COLUMNS, FOOD_PRICE_DTYPES, PRODUCT_CATEGORIES, AddCoast, AddCovidPeriod, AddPresidency,
+    AddPriceTotals, CurrentPrices, EmptyTotals, MergeMonthlyCovariates, MergeQuarterlyCovariates, ParseRefDate,
+    PriceKeys, RunCleaning, SavePriceIndexes, SaveToCSV, SplitProducts,
+)
+from reg_comp import AVG_OUTPUT_DIR, CSV_OUTPUT_DIR, PROVINCES
+from pipeline import file_hash, print_report, run_pipeline
+from price_cube import CUBE_FILE, build_cube, load_cube, merge_cubes, save_cube
+from storage import load_table, save_table, stored_path
+
+MANIFEST_FILE = "cleaned_data/refresh_manifest.json"
+STATE_DIR = "cleaned_data/refresh_state"
+AVG_YEAR_PROV_FILE = "output/geo_csv/avg_year_prov.csv"
+
+KEY_COLS = ['Year', 'Quarter', 'GEO', 'Products']
+
+# Running price totals kept between refreshes (see data_cleaning.AddPriceTotals), one table for the
+# groups of each kind of average: quarterly, yearly (and per year for reg_comp.py), over all years
+STATE_KEYS = {
+    'quarter': KEY_COLS,
+    'year': ['Year', 'GEO', 'Products'],
+    'all_years': ['GEO', 'Products'],
+}
+
+# Pipeline stages that read the tables a refresh updates. They are re-run only when their inputs changed.
+DOWNSTREAM_STAGES = ['temporal', 'volatility', 'coast', 'income', 'population', 'urban-rural']
+
+
+def load_manifest():
+    """Loads the refresh manifest, or None before the first refresh."""
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_new_rows(filepath, ingested_periods, chunksize):
+    """Yields the rows of the raw food price table whose REF_DATE has not been ingested yet."""
+    for chunk in pd.read_csv(filepath, usecols=FOOD_PRICE_COLUMNS, dtype=FOOD_PRICE_DTYPES, chunksize=chunksize):
+        chunk = chunk[~chunk['REF_DATE'].isin(ingested_periods)]
+        if not chunk.empty:
+            yield ParseRefDate(chunk, FOOD_PRICE_COLUMNS)
+
+
+def append_row_outputs(chunk):
+    """
+    Appends new rows to the row level outputs of the cleaning stage. The rows go at the end of each
+    file rather than into the order a full rebuild would give. Returns the categorised rows.
+    """
+    food_data = SplitProducts(chunk, mode='a')
+    CurrentPrices(food_data, mode='a')
+    SaveToCSV(AddPresidency(food_data), "presidency.csv", "cleaned_data", 'a')
+    SaveToCSV(AddCovidPeriod(food_data), "covid_period_food.csv", "cleaned_data", 'a')
+    SaveToCSV(AddCoast(food_data), "coasts.csv", "cleaned_data", 'a')
+    return food_data
+
+
+def state_path(name):
+    return os.path.join(STATE_DIR, f"{name}_totals.csv")
+
+
+def state_saved():
+    return all(stored_path(state_path(name)) is not None for name in STATE_KEYS)
+
+
+def load_state():
+    """The running price totals saved by the last refresh, read back to exactly the values saved."""
+    return {name: load_table(state_path(name), exact_floats=True) for name in STATE_KEYS}
+
+
+def save_state(state):
+    for name, totals in state.items():
+        save_table(totals, state_path(name))
+
+
+def group_means(totals, affected, key_cols):
+    """Means of the running price totals for the affected groups only."""
+    totals = totals.merge(affected[key_cols].drop_duplicates(), on=key_cols)
+    return totals[key_cols].assign(mean=totals['sum'] / totals['count'])
+
+
+def splice(filepath, updates, key_cols, sort_cols, rebuild=False):
+    """
+    Replaces the rows of a stored table whose keys appear in updates, then saves it in its usual
+    order. With rebuild the table is replaced by updates.
+    """
+    if rebuild or stored_path(filepath) is None:
+        table = updates
+    else:
+        table = load_table(filepath)
+        stale = table.merge(updates[key_cols], on=key_cols, how='left', indicator=True)['_merge'] == 'both'
+        table = pd.concat([table[~stale.values], updates], ignore_index=True)
+    table = table.sort_values(by=sort_cols, kind='stable').reset_index(drop=True)
+    save_table(table, filepath)
+    return table
+
+
+def update_price_averages(state, affected, rebuild=False):
+    """Updates the affected groups of yearly_avg_prices and quarterly_avg_prices."""
+    categorised = [item for items in PRODUCT_CATEGORIES.values() for item in items]
+    affected = affected[affected['Products'].isin(categorised)]
+
+    for name, file_name in [('year', "yearly_avg_prices.csv"), ('quarter', "quarterly_avg_prices.csv")]:
+        key_cols = STATE_KEYS[name]
+        means = group_means(state[name], affected, key_cols)
+        means['Average_Price'] = means.pop('mean')
+        sort_cols = ['GEO'] + [col for col in key_cols if col != 'GEO']
+        splice(os.path.join("cleaned_data", file_name), means, key_cols, sort_cols, rebuild)
+
+
+def update_item_summaries(state, affected, rebuild=False):
+    """
+    Updates the affected rows of the *_item and *_avg_prov summaries reg_comp.py builds, and returns
+    the categories whose item tables were updated.
+    """
+    renamed = {'GEO': 'province', 'Year': 'year'}
+    yearly = state['year'].rename(columns=renamed)
+    all_years = state['all_years'].rename(columns=renamed)
+    affected = affected[affected['GEO'].isin(PROVINCES)].rename(columns=renamed)
+
+    summaries = {category: items for category, items in PRODUCT_CATEGORIES.items()}
+    summaries['food_prices'] = None
+    updated = []
+    for category, items in summaries.items():
+        category_affected = affected if items is None else affected[affected['Products'].isin(items)]
+        if category_affected.empty and not rebuild:
+            continue
+
+        item_summary = group_means(yearly, category_affected, ['Products', 'province', 'year'])
+        item_summary = item_summary.rename(columns={'mean': 'avg_total_yearly'})
+        splice(os.path.join(CSV_OUTPUT_DIR, f"{category}_item.csv"), item_summary,
+               ['Products', 'province', 'year'], ['Products', 'province', 'year'], rebuild)
+        updated.append(category)
+
+        avg_per_province = group_means(all_years, category_affected, ['Products', 'province'])
+        avg_per_province = avg_per_province.rename(columns={'mean': 'avg_total'})
+        splice(os.path.join(AVG_OUTPUT_DIR, f"{category}_avg_prov.csv"), avg_per_province,
+               ['Products', 'province'], ['Products', 'province'], rebuild)
+
+    return updated, affected[['year', 'province']].drop_duplicates()
+
+
+def update_avg_year_prov(categories, affected, rebuild=False):
+    """Updates the affected (year, province, category) rows of avg_year_prov, as reg_comp_cat.py builds them."""
+    updates = []
+    for category in categories:
+        if category == 'food_prices':
+            continue
+        # Read back the way reg_comp_cat.py reads it, so the means are over the same values
+        item_summary = load_table(os.path.join(CSV_OUTPUT_DIR, f"{category}_item.csv"))
+        item_summary = item_summary if rebuild else item_summary.merge(affected, on=['year', 'province'])
+        grouped = item_summary.groupby(['year', 'province']).agg(avg_value=('avg_total_yearly', 'mean')).reset_index()
+        grouped['category'] = category
+        updates.append(grouped)
+
+    if updates:
+        # Categories missing from the split are kept as they are, even on a rebuild
+        splice(AVG_YEAR_PROV_FILE, pd.concat(updates, ignore_index=True), ['year', 'province', 'category'],
+               ['category', 'year', 'province'])
+
+
+def update_cube(month_totals):
+    """Adds the new months (running totals per GEO, Products and REF_DATE) to the stored price cube."""
+    if month_totals.empty:
+        return
+    cube = build_cube(month_totals, 'sum', 'count')
+    if os.path.exists(CUBE_FILE):
+        cube = merge_cubes(load_cube(), cube)
+    save_cube(cube)
+
+
+def refresh(food_path, population_path, income_path, chunksize=1_000_000, full=False, run_stages=True):
+    """
+    Brings the cleaned tables and summaries up to date with the raw food price table.
+
+    The first run (or full=True) rebuilds everything and records the running price totals, the
+    ingested periods and the input hash in a manifest. Later runs only ingest the REF_DATE periods
+    not seen before, adding them to the totals in table order so the affected groups of the
+    summaries get exactly the means a rebuild gives, and re-run the downstream pipeline stages
+    whose inputs changed.
+    """
+    manifest = load_manifest()
+    food_hash = file_hash(food_path)
+    rebuild = full or manifest is None or not state_saved() or manifest['food_path'] != os.path.abspath(food_path)
+
+    if rebuild:
+        print("Rebuilding all cleaned tables")
+        RunCleaning(food_path, population_path, income_path, chunksize)
+        manifest = {'food_path': os.path.abspath(food_path), 'periods': []}
+        state = {name: EmptyTotals(key_cols) for name, key_cols in STATE_KEYS.items()}
+    elif manifest['food_hash'] == food_hash:
+        print("Food price table unchanged since the last refresh")
+        if run_stages:
+            print_report(run_pipeline(DOWNSTREAM_STAGES))
+        return
+    else:
+        state = load_state()
+
+    ingested = set(manifest['periods'])
+    month_cols = ['GEO', 'Products', 'REF_DATE']
+    new_month_totals = EmptyTotals(month_cols)
+    new_keys = []
+    new_periods = set()
+    known_products = set(load_table('all_food_list.csv')['Products'])
+    new_products = {}
+    for chunk in read_new_rows(food_path, ingested, chunksize):
+        if not rebuild:
+            food_data = append_row_outputs(chunk)
+            new_month_totals = AddPriceTotals(new_month_totals, PriceKeys(food_data), month_cols)
+        prices = PriceKeys(chunk)
+        for name, key_cols in STATE_KEYS.items():
+            state[name] = AddPriceTotals(state[name], prices, key_cols)
+        new_keys.append(prices[KEY_COLS].dropna().drop_duplicates().astype({'Year': 'int64', 'Quarter': 'int64', 'GEO': str, 'Products': str}))
+        new_periods.update(chunk['REF_DATE'].astype(str).unique())
+        new_products.update(dict.fromkeys(p for p in chunk['Products'].unique() if p not in known_products))
+
+    if new_keys:
+        affected = pd.concat(new_keys, ignore_index=True).drop_duplicates()
+        save_state(state)
+        print(f"Ingested {len(new_periods)} new period(s): {', '.join(sorted(new_periods))}")
+
+        if not rebuild:
+            update_price_averages(state, affected)
+            update_cube(new_month_totals)
+            MergeQuarterlyCovariates(load_table("cleaned_data/quarterly_avg_prices.csv"), population_path, income_path)
+            MergeMonthlyCovariates(population_path, income_path)
+            SavePriceIndexes(load_table("cleaned_data/yearly_avg_prices.csv"))
+            if new_products:
+                SaveToCSV(pd.DataFrame({'Products': list(new_products)}), "all_food_list.csv", "", 'a')
+
+        categories, affected = update_item_summaries(state, affected, rebuild)
+        update_avg_year_prov(categories, affected, rebuild)
+    else:
+        print("No new periods to ingest")
+
+    manifest['food_hash'] = food_hash
+    manifest['periods'] = sorted(ingested | new_periods)
+    save_manifest(manifest)
+    if run_stages:
+        print_report(run_pipeline(DOWNSTREAM_STAGES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally refresh the cleaned tables and summaries.")
+    parser.add_argument('--food', default='food_prices_sample.csv', help="Raw StatCan food price table")
+    parser.add_argument('--population', default='population.csv', help="Raw StatCan population table")
+    parser.add_argument('--income', default='income.csv', help="Raw StatCan income table")
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help="Rows read at a time")
+    parser.add_argument('--full', action='store_true', help="Rebuild everything instead of refreshing")
+    parser.add_argument('--no-downstream', action='store_true', help="Do not re-run the analysis scripts")
+    args = parser.parse_args()
+    refresh(args.food, args.population, args.income, args.chunksize, args.full, not args.no_downstream)
+
+
+if __name__ == "__main__":
+    main()
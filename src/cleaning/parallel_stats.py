@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Worker processes for the per-group statistical tests. 1 runs them in the calling process.
+# Scripts take --workers; this sets the default for all of them, e.g. when run from pipeline.py.
+WORKERS = int(os.environ.get('GROCERY_WORKERS', '1'))
+
+# Chunks per worker, so one slow chunk does not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+
+def add_workers_argument(parser):
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="Processes for the per-group statistical tests (default: $GROCERY_WORKERS or 1)")
+
+
+def split_groups(df, key, columns):
+    """
+    Splits the given columns of df into one tuple of NumPy arrays per value of key, in order of first
+    appearance. Workers are then sent these arrays rather than the frame.
+    """
+    positions = df.groupby(key, sort=False).indices
+    arrays = [df[col].to_numpy() for col in columns]
+    return [(group, *(values[rows] for values in arrays)) for group, rows in positions.items()]
+
+
+def partition(items, n_chunks):
+    """Splits items into at most n_chunks contiguous chunks of near equal length."""
+    n_chunks = max(1, min(n_chunks, len(items)))
+    bounds = np.linspace(0, len(items), n_chunks + 1).astype(int)
+    return [items[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def run_chunk(func, chunk):
+    return [func(*args) for args in chunk]
+
+
+def pool_context():
+    """
+    Forked workers, where available, so scripts that run at import time (temporal_analysis.py)
+    are not re-run in every worker and functions defined in a script can be sent to workers.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def parallel_map(func, items, workers=None):
+    """
+    Calls func(*args) for every args tuple in items and returns the results in the order of items.
+
+    With more than one worker the items are cut into contiguous chunks and run in a process pool;
+    each worker is only sent its own chunk. func must be a module-level function.
+    """
+    items = list(items)
+    workers = WORKERS if workers is None else workers
+    if workers <= 1 or len(items) < 2:
+        return run_chunk(func, items)
+
+    chunks = partition(items, workers * CHUNKS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=pool_context()) as pool:
+        # map yields in submission order, so the merged results do not depend on which worker finishes first
+        results = pool.map(run_chunk, [func] * len(chunks), chunks)
+        return [result for chunk_results in results for result in chunk_results]
+
+
+def run_grouped_test(df, key, columns, func, workers=None):
+    """
+    Runs func(group, *arrays) for each value of key, with arrays being that group's columns, and
+    returns the results in order of first appearance of the groups.
+    """
+    return parallel_map(func, split_groups(df, key, columns), workers)
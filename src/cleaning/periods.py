@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# Named period schemes. Each has sorted edges (None for an open end) and one label per interval
+# between consecutive edges. Intervals are closed on the left, [edge, next edge), or on the right,
+# (edge, next edge], with right=True. Dates outside every interval get no label.
+PERIOD_SCHEMES = {
+    # CIHI COVID-19 timeline: lockdowns from 2020-01-01 through 2022-05-30
+    'COVID_Period': {
+        'edges': [None, '2020-01-01', '2022-05-31', None],
+        'labels': ['Pre-COVID', 'During-COVID', 'Post-COVID'],
+        'right': False,
+    },
+    # US presidency terms around Donald Trump's first term
+    'Presidency_Period': {
+        'edges': ['2015-12-31', '2017-01-20', '2021-01-20', '2024-12-31'],
+        'labels': ['Pre-Trump', 'During-Trump', 'Post-Trump'],
+        'right': True,
+    },
+}
+
+_OPEN_START = np.iinfo(np.int64).min
+_OPEN_END = np.iinfo(np.int64).max
+
+
+def register_scheme(name, edges, labels, right=False):
+    """Adds (or replaces) a named period scheme, e.g. for our own event windows."""
+    if len(edges) != len(labels) + 1:
+        raise ValueError("A period scheme needs exactly one more edge than labels")
+    bounded = [pd.Timestamp(edge) for edge in edges if edge is not None]
+    if bounded != sorted(bounded):
+        raise ValueError("Period scheme edges must be sorted")
+    PERIOD_SCHEMES[name] = {'edges': list(edges), 'labels': list(labels), 'right': right}
+
+
+def date_values(dates):
+    """Dates (datetime64 or monthly Period) as int64 nanoseconds."""
+    if isinstance(dates.dtype, pd.PeriodDtype):
+        if dates.dtype == pd.PeriodDtype('M'):
+            # Monthly period ordinals count months from 1970-01, the same as datetime64[M]
+            ordinals = dates.array.asi8
+            values = ordinals.view('datetime64[M]').astype('datetime64[ns]').view('int64')
+            return np.where(ordinals == _OPEN_START, _OPEN_START, values)
+        dates = dates.dt.to_timestamp()
+    return pd.to_datetime(dates).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def edge_values(edges):
+    """Scheme edges as int64 nanoseconds, with open ends at the int64 limits."""
+    return np.array([
+        (_OPEN_START if i == 0 else _OPEN_END) if edge is None else pd.Timestamp(edge).value
+        for i, edge in enumerate(edges)
+    ], dtype='int64')
+
+
+def label_values(values, scheme):
+    """Categorical labels for int64 date values, found by binary search over the scheme's edges."""
+    edges = edge_values(scheme['edges'])
+    # Number of edges before each date; with left-closed intervals an edge equal to the date counts
+    position = np.searchsorted(edges, values, side='left' if scheme['right'] else 'right')
+    codes = position - 1
+    # NaT is stored as the int64 minimum, which would otherwise fall in an open first interval
+    outside = (codes < 0) | (codes >= len(scheme['labels'])) | (values == _OPEN_START)
+    codes = np.where(outside, -1, codes)
+    return pd.Categorical.from_codes(codes, categories=scheme['labels'], ordered=True)
+
+
+def label_periods(dates, schemes=None):
+    """
+    Labels dates with every named scheme in one pass and returns a DataFrame with one categorical
+    column per scheme, aligned with dates. The dates are converted once and shared by all schemes.
+    """
+    schemes = list(PERIOD_SCHEMES) if schemes is None else schemes
+    values = date_values(dates)
+    return pd.DataFrame({name: label_values(values, PERIOD_SCHEMES[name]) for name in schemes}, index=dates.index)
@@ -0,0 +1,268 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from storage import stored_path
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATE_FILE = "output/pipeline_state.json"
+
+# Every stage with the script that runs it and the files or folders it reads and writes.
+# A stage depends on every stage that writes one of its inputs. Tables are named by their .csv
+# path and found in whichever format they were stored in (see storage.py).
+STAGES = {
+    'clean': {
+        'script': 'cleaning/data_cleaning.py',
+        'inputs': ['food_prices_sample.csv', 'population.csv', 'income.csv'],
+        'outputs': ['cleaned_data', 'split_data', 'all_food_list.csv'],
+    },
+    'temporal': {
+        'script': 'cleaning/temporal_analysis.py',
+        'inputs': ['split_data', 'cleaned_data/covid_period_food.csv'],
+        'outputs': ['tukey_covid.csv', 'tukey_pres.csv', 'output/temporal_png/yoy_price_increase.png'],
+    },
+    'volatility': {
+        'script': 'cleaning/volatility.py',
+        'inputs': ['cleaned_data/price_cube.npz'],
+        'outputs': ['output/temporal_csv/price_volatility.csv'],
+    },
+    'regional': {
+        'script': 'cleaning/reg_comp.py',
+        'inputs': ['split_data'],
+        'outputs': ['output/geo_csv/years', 'output/geo_csv/avg'],
+    },
+    'categories': {
+        'script': 'cleaning/reg_comp_cat.py',
+        'inputs': ['output/geo_csv/years'],
+        'outputs': ['output/geo_csv/avg_year_prov.csv'],
+    },
+    'coast': {
+        'script': 'geo_analysis/coast_region_analysis.py',
+        'inputs': ['output/geo_csv/avg_year_prov.csv'],
+        'outputs': [
+            'output/geo_csv/regions', 'output/geo_csv/pairwise_region_comparison_results.csv',
+            'output/geo_csv/extended_region_comparison_results.csv',
+            'output/geo_png/line_Regions.png', 'output/geo_png/heatmap_differences_regions.png',
+        ],
+    },
+    'income': {
+        'script': 'geo_analysis/income_analysis.py',
+        'inputs': ['output/geo_csv/avg_year_prov.csv', 'data/income.csv'],
+        'outputs': ['output/geo_csv/income', 'output/geo_png/income_vs_price.png'],
+    },
+    'population': {
+        'script': 'geo_analysis/pop_analysis.py',
+        'inputs': ['output/geo_csv/avg_year_prov.csv', 'data/population.csv'],
+        'outputs': ['output/geo_csv/population', 'output/geo_png/population_vs_price.png'],
+    },
+    'urban-rural': {
+        'script': 'geo_analysis/urban_vs_rural.py',
+        'inputs': ['output/geo_csv/years/food_prices_item.csv', 'output/geo_csv/avg_year_prov.csv'],
+        'outputs': [
+            'output/geo_csv/urban_rural', 'output/geo_png/urban_vs_rural_prices.png',
+            'output/geo_png/yearly_trends_by_region_and_category.png',
+        ],
+    },
+}
+
+
+def file_hash(filepath):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stored(path):
+    """The file or folder holding a declared input or output, or None if there is none."""
+    if os.path.isdir(path):
+        return path
+    if path.endswith('.csv'):
+        return stored_path(path)
+    return path if os.path.exists(path) else None
+
+
+def expand(paths):
+    """
+    Lists the files under the given files and folders. A path with nothing stored under it is
+    listed as is, so it can be told apart from one that exists.
+    """
+    files = []
+    for path in paths:
+        source = stored(path)
+        if source is None:
+            files.append(path)
+        elif os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files.append(source)
+    return sorted(files)
+
+
+def fingerprint(paths, check='hash'):
+    """
+    Maps each input file to its content hash, or to its size and mtime with check='mtime'.
+    Missing inputs map to None.
+    """
+    signature = (lambda path: [os.path.getsize(path), os.path.getmtime(path)]) if check == 'mtime' else file_hash
+    return {path: signature(path) if os.path.exists(path) else None for path in expand(paths)}
+
+
+def covers(output, path):
+    """True if path is the output itself or inside it."""
+    return path == output or path.startswith(output.rstrip('/') + '/')
+
+
+def stage_dependencies(stages):
+    """Maps each stage to the stages that write one of its inputs."""
+    return {
+        name: {
+            other for other, other_stage in stages.items() if other != name and any(
+                covers(output, path) or covers(path, output)
+                for output in other_stage['outputs'] for path in stage['inputs']
+            )
+        }
+        for name, stage in stages.items()
+    }
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def run_stage(name, stage):
+    """Runs a stage's script in its own process and returns its exit code, output and wall time."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, stage['script'])] + stage.get('args', []),
+        capture_output=True, text=True,
+    )
+    return result.returncode, result.stdout + result.stderr, time.perf_counter() - start
+
+
+def run_pipeline(only=None, workers=4, check='hash', force=False, stages=STAGES):
+    """
+    Runs the stages in dependency order, with independent stages in parallel worker processes.
+
+    A stage is skipped when its inputs match the fingerprint recorded the last time it succeeded and
+    all its outputs exist. With only, just those stages are considered; their upstream stages are
+    assumed up to date. Returns a report of (stage, status, seconds) in completion order.
+    """
+    selected = {name: stage for name, stage in stages.items() if only is None or name in only}
+    dependencies = {name: deps & set(selected) for name, deps in stage_dependencies(selected).items()}
+    state = load_state()
+    report = []
+    done = set()
+    failed = set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(done) + len(failed) < len(selected):
+            settled = len(done) + len(failed)
+            for name, stage in selected.items():
+                if name in done or name in failed or name in running.values():
+                    continue
+                if dependencies[name] & failed:
+                    print(f"[{name}] blocked by a failed upstream stage")
+                    failed.add(name)
+                    report.append((name, 'blocked', 0.0))
+                    continue
+                if not dependencies[name] <= done:
+                    continue
+
+                inputs = fingerprint(stage['inputs'], check)
+                # A missing input never counts as unchanged, so the stage runs and reports it
+                inputs_exist = None not in inputs.values()
+                outputs_exist = all(stored(output) is not None for output in stage['outputs'])
+                if not force and inputs_exist and outputs_exist and state.get(name, {}).get('inputs') == inputs:
+                    print(f"[{name}] inputs unchanged, skipped")
+                    done.add(name)
+                    report.append((name, 'skipped', 0.0))
+                    continue
+
+                print(f"[{name}] running {stage['script']}")
+                running[pool.submit(run_stage, name, stage)] = name
+
+            if not running:
+                if len(done) + len(failed) == settled:
+                    raise RuntimeError(f"Stages depend on each other: {sorted(set(selected) - done - failed)}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, output, elapsed = future.result()
+                if returncode == 0:
+                    # Fingerprint taken after the run, so a stage's own rewrite of a shared folder counts
+                    state[name] = {'inputs': fingerprint(selected[name]['inputs'], check), 'seconds': elapsed}
+                    save_state(state)
+                    done.add(name)
+                    report.append((name, 'ran', elapsed))
+                    print(f"[{name}] finished in {elapsed:.2f} s")
+                else:
+                    failed.add(name)
+                    report.append((name, 'failed', elapsed))
+                    print(f"[{name}] failed with exit code {returncode}:\n{output}")
+
+    return report
+
+
+def print_report(report, wall_seconds=None):
+    print("\nStage timings")
+    for name, status, elapsed in report:
+        print(f"  {name:<12} {status:<8} {elapsed:8.2f} s")
+    print(f"  {'all stages':<21} {sum(elapsed for _, _, elapsed in report):8.2f} s")
+    if wall_seconds is not None:
+        print(f"  {'wall time':<21} {wall_seconds:8.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analysis stages in dependency order.")
+    parser.add_argument('stages', nargs='*', help=f"Stages to run (default: all): {', '.join(STAGES)}")
+    parser.add_argument('--workers', type=int, default=4, help="Stages run at the same time")
+    parser.add_argument('--check', choices=['hash', 'mtime'], default='hash',
+                        help="Detect changed inputs by content hash or by size and mtime")
+    parser.add_argument('--force', action='store_true', help="Run stages even if their inputs are unchanged")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Record each stage's pipeline functions to this JSON lines file and report them (see profiling.py)")
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    if args.profile:
+        # Inherited by every stage process, so all their records share this run id
+        os.environ['GROCERY_PROFILE'] = args.profile
+        os.environ['GROCERY_PROFILE_RUN'] = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+    start = time.perf_counter()
+    report = run_pipeline(args.stages or None, args.workers, args.check, args.force)
+    print_report(report, time.perf_counter() - start)
+    if args.profile and os.path.exists(args.profile):
+        from profiling import load_records, summarize
+        print(f"\nProfile ({args.profile})")
+        print(summarize(load_records(args.profile, os.environ['GROCERY_PROFILE_RUN'])).to_string(index=False, float_format='{:.3f}'.format))
+    if any(status in ('failed', 'blocked') for _, status, _ in report):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
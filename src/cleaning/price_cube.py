@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+from ref_date import month_ordinals, to_periods
+from regions import resolve
+
+# Price cube written by the cleaning stage: province x product x month, categorised products only
+CUBE_FILE = "cleaned_data/price_cube.npz"
+
+# A cube is a dict with 'axes', an ordered dict of axis name -> labels (a pandas Index, with a
+# monthly PeriodIndex for REF_DATE), and 'values', an array with one dimension per axis and NaN
+# where there is no price. Axis positions are the integer codes of the labels.
+
+
+def month_periods(ref_date):
+    """REF_DATE as monthly periods, from 'YYYY-MM' or 'YYYY-MM-DD' strings, dates or periods."""
+    if isinstance(ref_date.dtype, pd.PeriodDtype):
+        return pd.PeriodIndex(ref_date)
+    return to_periods(month_ordinals(ref_date))
+
+
+def build_cube(df, value_col='VALUE', count_col=None, dtype='float64'):
+    """
+    Builds a dense GEO x Products x month cube from a long table, with NaN where a series has no
+    price. The month axis covers every month from the first to the last, so a lag of n steps along
+    it is always n calendar months. Duplicate rows are averaged.
+
+    With count_col, value_col holds sums of count_col prices (e.g. totals merged from chunks).
+    """
+    if len(df) == 0:
+        return {
+            'axes': {
+                'GEO': pd.Index([], dtype=object, name='GEO'),
+                'Products': pd.Index([], dtype=object, name='Products'),
+                'REF_DATE': pd.PeriodIndex([], freq='M', name='REF_DATE'),
+            },
+            'values': np.empty((0, 0, 0), dtype=dtype),
+        }
+
+    geo_codes, geo = pd.factorize(df['GEO'], sort=True)
+    product_codes, products = pd.factorize(df['Products'], sort=True)
+    periods = month_periods(df['REF_DATE'])
+    ordinals = periods.asi8
+    first = ordinals.min()
+    months = pd.period_range(periods.min(), periods.max(), freq='M')
+
+    shape = (len(geo), len(products), len(months))
+    cells = np.ravel_multi_index((geo_codes, product_codes, ordinals - first), shape)
+    values = df[value_col].to_numpy(dtype='float64')
+    counts = np.ones(len(df)) if count_col is None else df[count_col].to_numpy(dtype='float64')
+    present = ~np.isnan(values)
+    sums = np.bincount(cells[present], weights=values[present], minlength=np.prod(shape))
+    counts = np.bincount(cells[present], weights=counts[present], minlength=np.prod(shape))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cube = np.where(counts > 0, sums / counts, np.nan).reshape(shape).astype(dtype)
+
+    return {
+        'axes': {
+            'GEO': pd.Index(np.asarray(geo, dtype=object), name='GEO'),
+            'Products': pd.Index(np.asarray(products, dtype=object), name='Products'),
+            'REF_DATE': pd.PeriodIndex(months, name='REF_DATE'),
+        },
+        'values': cube,
+    }
+
+
+def merge_cubes(old, new):
+    """
+    Combines two cubes with the same axes over the union of their labels, e.g. to add newly
+    ingested months to a stored cube. Prices in new replace those in old.
+    """
+    axes = {}
+    for name, labels in old['axes'].items():
+        new_labels = new['axes'][name]
+        if isinstance(labels, pd.PeriodIndex):
+            months = labels.append(new_labels)
+            union = pd.period_range(months.min(), months.max(), freq=labels.freq) if len(months) else months
+        else:
+            union = labels.union(new_labels)
+        axes[name] = union.rename(name)
+
+    values = np.full(tuple(len(labels) for labels in axes.values()), np.nan, dtype=old['values'].dtype)
+    for cube in (old, new):
+        positions = np.ix_(*(axes[name].get_indexer(labels) for name, labels in cube['axes'].items()))
+        values[positions] = np.where(np.isnan(cube['values']), values[positions], cube['values'])
+    return {'axes': axes, 'values': values}
+
+
+def mask(cube):
+    """True where the cube has a price."""
+    return ~np.isnan(cube['values'])
+
+
+def save_cube(cube, path=CUBE_FILE):
+    """Saves a cube as an uncompressed .npz: the values, and each axis as labels or month ordinals."""
+    arrays = {'values': cube['values'], 'axis_names': np.array(list(cube['axes']))}
+    for name, labels in cube['axes'].items():
+        if isinstance(labels, pd.PeriodIndex):
+            arrays[f'periods_{name}'] = labels.asi8
+            arrays[f'freq_{name}'] = np.array(labels.freqstr)
+        else:
+            arrays[f'labels_{name}'] = labels.to_numpy().astype(str)
+    np.savez(path, **arrays)
+
+
+def load_cube(path=CUBE_FILE):
+    with np.load(path, allow_pickle=False) as data:
+        axes = {}
+        for name in data['axis_names']:
+            name = str(name)
+            if f'periods_{name}' in data:
+                ordinals = data[f'periods_{name}']
+                axes[name] = pd.PeriodIndex.from_ordinals(ordinals, freq=str(data[f'freq_{name}']), name=name)
+            else:
+                axes[name] = pd.Index(data[f'labels_{name}'].astype(object), name=name)
+        return {'axes': axes, 'values': data['values']}
+
+
+def axis_positions(labels, selection):
+    """Positions of the selected labels: one label, a list of labels, or a slice of labels (inclusive)."""
+    if isinstance(selection, slice):
+        if isinstance(labels, pd.PeriodIndex):
+            # Months are contiguous, so their positions follow from the ordinals
+            first = labels.asi8[0]
+            start = 0 if selection.start is None else pd.Period(selection.start, freq=labels.freq).ordinal - first
+            stop = len(labels) if selection.stop is None else pd.Period(selection.stop, freq=labels.freq).ordinal - first + 1
+            return slice(max(start, 0), max(min(stop, len(labels)), 0))
+        return labels.slice_indexer(selection.start, selection.stop)
+    if isinstance(selection, (list, tuple, np.ndarray, pd.Index)):
+        positions = labels.get_indexer(selection)
+        return positions[positions >= 0]
+    return labels.get_loc(selection)
+
+
+def select(cube, **selections):
+    """
+    Slices a cube by axis labels, e.g. select(cube, GEO='Nova Scotia', REF_DATE=slice('2020-01', '2022-05')).
+    A single label drops its axis; lists (labels not in the cube are skipped) and slices keep it.
+    Slices and single labels give views of the values, not copies.
+    """
+    index = []
+    axes = {}
+    for name, labels in cube['axes'].items():
+        if name not in selections:
+            index.append(slice(None))
+            axes[name] = labels
+            continue
+        positions = axis_positions(labels, selections[name])
+        index.append(positions)
+        if not np.isscalar(positions):
+            axes[name] = labels[positions]
+
+    # Lists of positions are applied one axis at a time, since NumPy pairs up several index arrays
+    values = cube['values']
+    for dim, positions in reversed(list(enumerate(index))):
+        if isinstance(positions, np.ndarray):
+            values = np.take(values, positions, axis=dim)
+            index[dim] = slice(None)
+    return {'axes': axes, 'values': values[tuple(index)]}
+
+
+def group_members(labels, groups):
+    """
+    Group labels and a (labels x groups) membership matrix. groups is 'year', 'quarter' or 'all',
+    a dict of group -> labels (e.g. PRODUCT_CATEGORIES), a dict of label -> group (e.g. COAST_MAPPING)
+    or the name of a grouping registered in regions.py (e.g. 'coast').
+    Labels may belong to several groups; labels in no group are left out.
+    """
+    if groups == 'year':
+        codes, names = pd.factorize(labels.year, sort=True)
+        return pd.Index(names, name='year'), np.eye(len(names))[codes]
+    if groups == 'quarter':
+        codes, names = pd.factorize(labels.asfreq('Q'), sort=True)
+        return pd.PeriodIndex(names, name='quarter'), np.eye(len(names))[codes]
+    if groups == 'all':
+        return None, np.ones((len(labels), 1))
+    if isinstance(groups, str):
+        groups = resolve(groups)
+
+    if all(isinstance(group, str) for group in groups.values()):
+        members = {}
+        for label, group in groups.items():
+            members.setdefault(group, []).append(label)
+        groups = members
+    names = list(groups)
+    matrix = np.zeros((len(labels), len(names)))
+    for column, members in enumerate(groups.values()):
+        positions = labels.get_indexer(list(members))
+        matrix[positions[positions >= 0], column] = 1.0
+    return pd.Index(names), matrix
+
+
+def rollup(cube, axis, groups, name=None):
+    """
+    Averages a cube along one axis within groups of its labels (see group_members), ignoring
+    missing prices. Returns a cube with that axis replaced by the groups, or dropped for 'all'.
+    Rolling up one axis after another gives means of means, as the grouped CSV summaries do.
+    """
+    names, matrix = group_members(cube['axes'][axis], groups)
+    dim = list(cube['axes']).index(axis)
+    values = np.moveaxis(cube['values'], dim, -1)
+    present = ~np.isnan(values)
+    sums = np.where(present, values, 0.0) @ matrix
+    counts = present.astype('float64') @ matrix
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan).astype(cube['values'].dtype)
+
+    if names is None:
+        axes = {key: labels for key, labels in cube['axes'].items() if key != axis}
+        return {'axes': axes, 'values': means[..., 0]}
+    new_axis = name or names.name or axis
+    axes = {
+        new_axis if key == axis else key: names.rename(new_axis) if key == axis else labels
+        for key, labels in cube['axes'].items()
+    }
+    return {'axes': axes, 'values': np.moveaxis(means, -1, dim)}
+
+
+def to_frame(cube, value_name='VALUE', dropna=True):
+    """Long table of a cube, one column per axis in axis order, without empty cells unless dropna=False."""
+    values = cube['values']
+    if dropna:
+        positions = np.nonzero(~np.isnan(values))
+    else:
+        positions = np.unravel_index(np.arange(values.size), values.shape)
+    columns = {name: labels[idx] for (name, labels), idx in zip(cube['axes'].items(), positions)}
+    columns[value_name] = values[positions]
+    return pd.DataFrame(columns)
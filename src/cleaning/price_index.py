@@ -0,0 +1,119 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ref_date import month_ordinals, to_periods
+
+# Lookup indexes written by the cleaning stage: 'monthly' holds the categorised monthly prices
+# (as in covid_period_food.csv) and 'yearly' the yearly averages (yearly_avg_prices.csv)
+INDEX_DIR = "cleaned_data/price_index"
+
+# An index is a folder with the prices sorted by (GEO, Products, period): keys.npy holds one int64
+# key per price, values.npy the prices, and meta.json the GEO and Products labels, the frequency
+# and the first period. The key of a price is
+#     (geo code * number of products + product code) * span + (period ordinal - first ordinal)
+# so each series is a contiguous run of keys in period order. Both arrays are memory-mapped when
+# the index is opened, and a lookup is a binary search that only reads the pages it touches.
+
+
+def build_index(df, period_col='REF_DATE', value_col='VALUE', freq='M', dtype=None):
+    """
+    Builds an index from a long table with GEO and Products columns, a period column (monthly
+    periods, dates or 'YYYY-MM' strings for freq='M'; years for freq='Y') and a value column.
+    The values are stored in dtype, by default the value column's own, so lookups give back
+    exactly the values of the table.
+    """
+    if freq == 'Y':
+        periods = pd.PeriodIndex(pd.to_datetime(df[period_col].astype(int).astype(str), format='%Y'), freq='Y')
+    elif isinstance(df[period_col].dtype, pd.PeriodDtype):
+        periods = pd.PeriodIndex(df[period_col]).asfreq(freq)
+    else:
+        periods = to_periods(month_ordinals(df[period_col])).asfreq(freq)
+
+    geo_codes, geo = pd.factorize(df['GEO'].astype(str), sort=True)
+    product_codes, products = pd.factorize(df['Products'].astype(str), sort=True)
+    ordinals = periods.asi8
+    first = int(ordinals.min()) if len(ordinals) else 0
+    span = int(ordinals.max()) - first + 1 if len(ordinals) else 1
+
+    keys = (geo_codes.astype(np.int64) * len(products) + product_codes) * span + (ordinals - first)
+    order = np.argsort(keys, kind='stable')
+    return {
+        'geo': list(geo),
+        'products': list(products),
+        'freq': freq,
+        'first': first,
+        'span': span,
+        'keys': keys[order],
+        'values': df[value_col].to_numpy(dtype=dtype or df[value_col].dtype)[order],
+    }
+
+
+def save_index(index, name, folder=INDEX_DIR):
+    path = os.path.join(folder, name)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'keys.npy'), index['keys'])
+    np.save(os.path.join(path, 'values.npy'), index['values'])
+    meta = {key: index[key] for key in ['geo', 'products', 'freq', 'first', 'span']}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def open_index(name, folder=INDEX_DIR):
+    """Opens a saved index with its keys and values memory-mapped rather than read."""
+    path = os.path.join(folder, name)
+    with open(os.path.join(path, 'meta.json')) as f:
+        index = json.load(f)
+    index['keys'] = np.load(os.path.join(path, 'keys.npy'), mmap_mode='r')
+    index['values'] = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    index['geo_codes'] = {geo: code for code, geo in enumerate(index['geo'])}
+    index['product_codes'] = {product: code for code, product in enumerate(index['products'])}
+    return index
+
+
+def series_base(index, geo, product):
+    """Key of the first period of a (GEO, Products) series, or None if the index does not have it."""
+    geo_code = index['geo_codes'].get(geo)
+    product_code = index['product_codes'].get(product)
+    if geo_code is None or product_code is None:
+        return None
+    return (geo_code * len(index['products']) + product_code) * index['span']
+
+
+def period_offset(index, period):
+    """Position of a period ('2020-01', a Period, a date, or a year for yearly indexes) within a series."""
+    return pd.Period(str(period), freq=index['freq']).ordinal - index['first']
+
+
+def lookup(index, geo, product, period):
+    """Price of one product in one province for one period, in the stored dtype, NaN if there is none."""
+    base = series_base(index, geo, product)
+    offset = period_offset(index, period)
+    if base is None or not 0 <= offset < index['span']:
+        return np.nan
+    key = base + offset
+    position = np.searchsorted(index['keys'], key)
+    if position < len(index['keys']) and index['keys'][position] == key:
+        return index['values'][position]
+    return np.nan
+
+
+def lookup_range(index, geo, product, start=None, end=None):
+    """
+    Prices of one product in one province from start to end (inclusive, either open ended), as a
+    Series indexed by period. Periods without a price are left out.
+    """
+    base = series_base(index, geo, product)
+    freq = index['freq']
+    if base is None:
+        return pd.Series([], index=pd.PeriodIndex([], freq=freq, name='REF_DATE'), dtype=index['values'].dtype, name='VALUE')
+    first = 0 if start is None else min(max(period_offset(index, start), 0), index['span'])
+    last = index['span'] - 1 if end is None else min(max(period_offset(index, end), -1), index['span'] - 1)
+
+    keys = index['keys']
+    lo = np.searchsorted(keys, base + first, 'left')
+    hi = np.searchsorted(keys, base + last, 'right')
+    periods = pd.PeriodIndex.from_ordinals(np.asarray(keys[lo:hi]) - base + index['first'], freq=freq, name='REF_DATE')
+    return pd.Series(np.array(index['values'][lo:hi]), index=periods, name='VALUE')
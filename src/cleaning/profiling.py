@@ -0,0 +1,171 @@
+import argparse
+import cProfile
+import functools
+import inspect
+import json
+import os
+import resource
+import sys
+import time
+
+import pandas as pd
+
+# Per-stage profiling of the pipeline functions, off by default. GROCERY_PROFILE names a JSON lines
+# file each call of a @profiled function appends a record to: wall time, CPU time of the process
+# and of the workers it waited for, peak RSS growth and rows in and out. GROCERY_PROFILE_STAGE names
+# one function to run under cProfile; its stats are written next to the records (or to
+# output/profile) as <function>-<pid>-<call>.prof.
+PROFILE_FILE = os.environ.get('GROCERY_PROFILE', '')
+PROFILE_STAGE = os.environ.get('GROCERY_PROFILE_STAGE', '')
+PROFILE_DIR = os.path.dirname(PROFILE_FILE) or 'output/profile'
+
+# Wall time of the @profiled calls running in this process, innermost last, to get each call's self time
+_stack = []
+_profile_calls = {}
+
+
+def count_rows(value):
+    """Rows of a DataFrame or Series, summed over the ones in a list, tuple or dict; None for anything else."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        rows = [len(item) for item in value if isinstance(item, (pd.DataFrame, pd.Series))]
+        return sum(rows) if rows else None
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def children_cpu():
+    """CPU time of the finished child processes, e.g. the workers of a pool that was shut down."""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def run_id():
+    """
+    Id shared by the records of one run. Made when the first record starts and kept in
+    GROCERY_PROFILE_RUN, so the worker and stage processes started after it inherit it.
+    """
+    return os.environ.setdefault('GROCERY_PROFILE_RUN', f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+
+
+def write_record(record):
+    os.makedirs(os.path.dirname(PROFILE_FILE) or '.', exist_ok=True)
+    # One short append per record, so processes writing to the same file do not interleave lines
+    with open(PROFILE_FILE, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def run_cprofile(func, name, args, kwargs):
+    """Calls func under cProfile and dumps its stats, loadable with pstats or snakeviz."""
+    _profile_calls[name] = _profile_calls.get(name, 0) + 1
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{os.getpid()}-{_profile_calls[name]}.prof")
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+        print(f"cProfile stats of {name} saved to {path}", file=sys.stderr)
+
+
+def profiled(func):
+    """
+    Records each call of a pipeline function when profiling is on (see GROCERY_PROFILE and
+    GROCERY_PROFILE_STAGE above). Otherwise func is returned as is, so it costs nothing.
+    """
+    name = func.__name__
+    if not PROFILE_FILE and name != PROFILE_STAGE:
+        return func
+    # Scripts run as __main__, so they are named by their file
+    script = os.path.splitext(os.path.basename(inspect.unwrap(func).__code__.co_filename))[0]
+
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        if not PROFILE_FILE:
+            return run_cprofile(func, name, args, kwargs)
+
+        record = {
+            'run': run_id(), 'pid': os.getpid(), 'script': script, 'function': name, 'depth': len(_stack),
+            'start': time.time(),
+            'rows_in': count_rows(list(args) + list(kwargs.values())),
+        }
+        rss_before = peak_rss_mb()
+        cpu_start, children_start = time.process_time(), children_cpu()
+        wall_start = time.perf_counter()
+        _stack.append(0.0)
+        error = None
+        try:
+            if name == PROFILE_STAGE:
+                result = run_cprofile(func, name, args, kwargs)
+            else:
+                result = func(*args, **kwargs)
+            return result
+        except BaseException as exc:
+            error, result = type(exc).__name__, None
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            children = _stack.pop()
+            if _stack:
+                _stack[-1] += wall
+            peak = peak_rss_mb()
+            record.update({
+                'wall': wall, 'self_wall': wall - children, 'cpu': time.process_time() - cpu_start,
+                'children_cpu': children_cpu() - children_start,
+                'peak_rss_mb': peak, 'peak_rss_delta_mb': peak - rss_before,
+                'rows_out': count_rows(result), 'error': error,
+            })
+            write_record(record)
+
+    return call
+
+
+def load_records(path, run=None):
+    """The records of a profile file as a DataFrame, only those of one run if given ('last' for the latest)."""
+    records = pd.read_json(path, lines=True, dtype={'run': str})
+    if run == 'last':
+        run = records['run'].iloc[-1]
+    if run is not None:
+        records = records[records['run'] == run]
+    return records
+
+
+def summarize(records):
+    """
+    Aggregate report: per script and function, the calls, total and self wall time, CPU time (of the
+    process and of its workers), the largest peak RSS growth and the rows in and out, slowest self
+    time first.
+    """
+    report = records.groupby(['script', 'function'], sort=False).agg(
+        calls=('wall', 'size'),
+        wall=('wall', 'sum'),
+        self_wall=('self_wall', 'sum'),
+        cpu=('cpu', 'sum'),
+        children_cpu=('children_cpu', 'sum'),
+        peak_rss_delta_mb=('peak_rss_delta_mb', 'max'),
+        rows_in=('rows_in', lambda rows: rows.sum(min_count=1)),
+        rows_out=('rows_out', lambda rows: rows.sum(min_count=1)),
+    ).astype({'rows_in': 'Int64', 'rows_out': 'Int64'})
+    report['cpu_share'] = (report['cpu'] + report['children_cpu']) / report['wall']
+    return report.sort_values('self_wall', ascending=False).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the aggregate report of a GROCERY_PROFILE records file.")
+    parser.add_argument('path', nargs='?', default=PROFILE_FILE or 'output/profile/profile.jsonl', help="JSON lines records file")
+    parser.add_argument('--run', default=None, help="Only this run id, or 'last' (default: all runs)")
+    args = parser.parse_args()
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:.3f}'.format):
+        print(summarize(load_records(args.path, args.run)).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
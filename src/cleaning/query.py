@@ -0,0 +1,249 @@
+import os
+
+import pandas as pd
+
+from regions import group_column, resolve
+from storage import stored_path
+
+# Rows read at a time when scanning a CSV, so only the rows passing the pushed down predicates are kept
+CSV_CHUNK_ROWS = 1_000_000
+
+# A query is a plan of nested dicts, each with an 'op' and its input, built with the functions
+# below and only run by collect:
+#     scan(path) -> where(plan, *predicates) -> derive / select / aggregate / join -> collect(plan)
+# Predicates are (column, op, value) tuples with op one of ==, !=, <, <=, >, >=, in, not in, or
+# iin for in ignoring case (the column's strings and the values are compared lowercased).
+# Before running, optimize pushes the predicates and the columns each step needs down to the
+# scans: Parquet and Feather tables then only read those columns and skip row groups that cannot
+# match, and CSV tables are read with usecols and filtered chunk by chunk.
+
+PREDICATE_OPS = {
+    '==': lambda values, value: values == value,
+    '!=': lambda values, value: values != value,
+    '<': lambda values, value: values < value,
+    '<=': lambda values, value: values <= value,
+    '>': lambda values, value: values > value,
+    '>=': lambda values, value: values >= value,
+    'in': lambda values, value: values.isin(value),
+    'not in': lambda values, value: ~values.isin(value),
+    'iin': lambda values, value: values.str.lower().isin([item.lower() for item in value]),
+}
+
+
+def scan(path):
+    """Plan reading the table named by path (a .csv name, stored in any format, see storage.py)."""
+    return {'op': 'scan', 'path': path, 'columns': None, 'predicates': []}
+
+
+def where(plan, *predicates):
+    for column, op, _ in predicates:
+        if op not in PREDICATE_OPS:
+            raise ValueError(f"Unknown predicate operator {op!r} for column {column!r}")
+    return {'op': 'where', 'input': plan, 'predicates': list(predicates)}
+
+
+def select(plan, columns):
+    return {'op': 'select', 'input': plan, 'columns': list(columns)}
+
+
+def derive(plan, column, source, mapping):
+    """
+    Adds column by mapping the values of source through a dict, or a grouping registered in
+    regions.py by name, e.g. provinces to regions. Values not in the mapping get NaN.
+    """
+    return {'op': 'derive', 'input': plan, 'column': column, 'source': source, 'mapping': resolve(mapping)}
+
+
+def aggregate(plan, keys, **aggs):
+    """Groups by keys with named aggregations, e.g. aggregate(plan, ['year'], avg_value=('avg_value', 'mean'))."""
+    return {'op': 'aggregate', 'input': plan, 'keys': list(keys), 'aggs': aggs}
+
+
+def join(plan, other, on, how='inner'):
+    return {'op': 'join', 'input': plan, 'other': other, 'on': list(on), 'how': how}
+
+
+def source_columns(path):
+    """Column names of a stored table, read from its header or schema only."""
+    source = stored_path(path)
+    if source is None:
+        raise FileNotFoundError(f"No stored table for {path}")
+    if source.endswith('.csv'):
+        return list(pd.read_csv(source, nrows=0).columns)
+    import pyarrow.dataset as ds
+    return list(ds.dataset(source, format=scan_format(source)).schema.names)
+
+
+def scan_format(source):
+    return 'parquet' if source.endswith('.parquet') else 'feather'
+
+
+def output_columns(plan):
+    """Columns a plan gives, in order, without running it."""
+    op = plan['op']
+    if op == 'scan':
+        columns = source_columns(plan['path'])
+        return columns if plan['columns'] is None else [col for col in columns if col in plan['columns']]
+    if op == 'where':
+        return output_columns(plan['input'])
+    if op == 'select':
+        return plan['columns']
+    if op == 'derive':
+        return [col for col in output_columns(plan['input']) if col != plan['column']] + [plan['column']]
+    if op == 'aggregate':
+        return plan['keys'] + list(plan['aggs'])
+    left = output_columns(plan['input'])
+    right = [col for col in output_columns(plan['other']) if col not in plan['on']]
+    return left + [col for col in right if col not in left]
+
+
+def optimize(plan, predicates=(), required=None):
+    """
+    Rewrites a plan with predicates moved as close to the scans as they can go and each scan
+    reading only the columns needed above it (required=None keeps every column). Predicates that
+    cannot go lower, e.g. on a derived or aggregated column, stay in a where above that step.
+    """
+    op = plan['op']
+    predicates = list(predicates)
+    if op == 'scan':
+        columns = plan['columns'] if required is None else sorted(required)
+        return {**plan, 'columns': columns, 'predicates': plan['predicates'] + predicates}
+    if op == 'where':
+        return optimize(plan['input'], predicates + plan['predicates'], with_predicate_columns(required, predicates + plan['predicates']))
+    if op == 'select':
+        return {**plan, 'input': optimize(plan['input'], predicates, with_predicate_columns(plan['columns'], predicates))}
+
+    if op == 'derive':
+        kept = [pred for pred in predicates if pred[0] == plan['column']]
+        pushed = [pred for pred in predicates if pred[0] != plan['column']]
+        below = None if required is None else (set(required) - {plan['column']}) | {plan['source']}
+        return keep_where({**plan, 'input': optimize(plan['input'], pushed, with_predicate_columns(below, pushed))}, kept)
+
+    if op == 'aggregate':
+        # A predicate on a group key selects whole groups, so it can run before the grouping
+        kept = [pred for pred in predicates if pred[0] not in plan['keys']]
+        pushed = [pred for pred in predicates if pred[0] in plan['keys']]
+        below = set(plan['keys']) | {source for source, _ in plan['aggs'].values()}
+        return keep_where({**plan, 'input': optimize(plan['input'], pushed, below)}, kept)
+
+    # Join: a predicate only goes into a side the join keeps every row of (left for how='left',
+    # right for 'right', both for 'inner', neither for 'outer'). Filtering the other side first
+    # would turn rows the predicate drops into unmatched rows with NaN columns. Predicates on the
+    # join keys go to every such side, others to the side that has the column.
+    left_columns = set(output_columns(plan['input']))
+    right_columns = set(output_columns(plan['other']))
+    on = set(plan['on'])
+    push_left = plan['how'] in ('inner', 'left')
+    push_right = plan['how'] in ('inner', 'right')
+    left_preds = [pred for pred in predicates if push_left and (pred[0] in on or pred[0] in left_columns)]
+    right_preds = [pred for pred in predicates
+                   if push_right and (pred[0] in on or (pred[0] in right_columns and pred[0] not in left_columns))]
+    kept = [pred for pred in predicates if pred not in left_preds and pred not in right_preds]
+    left_required = None if required is None else (set(required) & left_columns) | on
+    right_required = None if required is None else (set(required) & right_columns) | on
+    return keep_where({
+        **plan,
+        'input': optimize(plan['input'], left_preds, with_predicate_columns(left_required, left_preds)),
+        'other': optimize(plan['other'], right_preds, with_predicate_columns(right_required, right_preds)),
+    }, kept)
+
+
+def with_predicate_columns(required, predicates):
+    if required is None:
+        return None
+    return set(required) | {column for column, _, _ in predicates}
+
+
+def keep_where(plan, predicates):
+    return {'op': 'where', 'input': plan, 'predicates': predicates} if predicates else plan
+
+
+def predicate_mask(df, predicates):
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in predicates:
+        mask &= PREDICATE_OPS[op](df[column], value)
+    return mask
+
+
+def arrow_filter(predicates):
+    """The predicates as a pyarrow dataset expression, so Parquet row groups can be skipped."""
+    import pyarrow.dataset as ds
+    expression = None
+    for column, op, value in predicates:
+        field = ds.field(column)
+        if op == 'in':
+            term = field.isin(list(value))
+        elif op == 'not in':
+            term = ~field.isin(list(value))
+        elif op == 'iin':
+            import pyarrow.compute as pc
+            term = pc.utf8_lower(field).isin([item.lower() for item in value])
+        else:
+            term = PREDICATE_OPS[op](field, value)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def run_scan(plan):
+    source = stored_path(plan['path'])
+    if source is None:
+        raise FileNotFoundError(f"No stored table for {plan['path']}")
+    columns = plan['columns']
+    predicates = plan['predicates']
+
+    if source.endswith('.csv'):
+        chunks = pd.read_csv(source, usecols=columns, chunksize=CSV_CHUNK_ROWS)
+        parts = [chunk[predicate_mask(chunk, predicates)] if predicates else chunk for chunk in chunks]
+        df = pd.concat(parts, ignore_index=True)
+    else:
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(source, format=scan_format(source))
+        if columns is not None:
+            columns = [col for col in dataset.schema.names if col in columns]
+        df = dataset.to_table(columns=columns, filter=arrow_filter(predicates) if predicates else None).to_pandas()
+    return df
+
+
+def run(plan):
+    op = plan['op']
+    if op == 'scan':
+        return run_scan(plan)
+    df = run(plan['input'])
+    if op == 'where':
+        return df[predicate_mask(df, plan['predicates'])].reset_index(drop=True)
+    if op == 'select':
+        return df[plan['columns']]
+    if op == 'derive':
+        return df.assign(**{plan['column']: group_column(df[plan['source']], plan['mapping'])})
+    if op == 'aggregate':
+        return df.groupby(plan['keys']).agg(**plan['aggs']).reset_index()
+    return pd.merge(df, run(plan['other']), on=plan['on'], how=plan['how'])
+
+
+def collect(plan, columns=None):
+    """Optimizes and runs a plan, returning a DataFrame. columns keeps only those, in that order."""
+    if columns is not None:
+        plan = select(plan, columns)
+    return run(optimize(plan))
+
+
+def explain(plan, indent=0):
+    """The optimized plan as indented text, one step per line, to check what reaches the scans."""
+    if indent == 0:
+        plan = optimize(plan)
+    pad = '  ' * indent
+    op = plan['op']
+    if op == 'scan':
+        path = plan['path'] if stored_path(plan['path']) is None else os.path.basename(stored_path(plan['path']))
+        return f"{pad}scan {path} columns={plan['columns']} predicates={plan['predicates']}"
+    details = {
+        'where': lambda: plan['predicates'],
+        'select': lambda: plan['columns'],
+        'derive': lambda: f"{plan['column']} from {plan['source']}",
+        'aggregate': lambda: f"by {plan['keys']} {list(plan['aggs'])}",
+        'join': lambda: f"{plan['how']} on {plan['on']}",
+    }[op]()
+    lines = [f"{pad}{op} {details}", explain(plan['input'], indent + 1)]
+    if op == 'join':
+        lines.append(explain(plan['other'], indent + 1))
+    return '\n'.join(lines)
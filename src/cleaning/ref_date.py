@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# StatCan tables date their rows with 'YYYY-MM' REF_DATE strings (the cleaned tables with
+# 'YYYY-MM-DD', the first of the month). Months are kept as ordinals, the number of months since
+# 1970-01, which is also how pandas numbers monthly periods, so an ordinal array turns into a
+# PeriodIndex for free. Year and quarter are integer arithmetic on the ordinals.
+
+EPOCH_YEAR = 1970
+
+# Ordinal of a missing or unparseable REF_DATE
+MISSING = np.iinfo(np.int32).min
+
+# Byte offsets of the digits in 'YYYY-MM', and of the separators
+_DIGITS = [0, 1, 2, 3, 5, 6]
+_ZERO, _DASH, _SPACE = ord('0'), ord('-'), ord(' ')
+
+
+def parse_ref_date(values):
+    """
+    Month ordinals (int32) of 'YYYY-MM' strings, or longer dates starting with 'YYYY-MM-' or
+    'YYYY-MM ' (the day and time are ignored). Only the first 8 bytes of each string are read, as a
+    fixed-width byte array, so the parse is a handful of vectorised integer operations.
+    Anything else is handed to pd.to_datetime; missing or invalid dates are MISSING.
+    """
+    chars, missing = string_bytes(values)
+    if chars is None:
+        return _parse_slow(np.asarray(values, dtype=object))
+
+    digits = chars[:, _DIGITS].astype(np.int32) - _ZERO
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    ordinals = (year - EPOCH_YEAR) * 12 + (month - 1)
+
+    end = chars[:, 7]
+    valid = (
+        ((digits >= 0) & (digits <= 9)).all(axis=1)
+        & (chars[:, 4] == _DASH)
+        & ((end == 0) | (end == _DASH) | (end == _SPACE))
+        & (month >= 1) & (month <= 12)
+    )
+    ordinals[missing] = MISSING
+    others = ~valid & ~missing
+    if others.any():
+        ordinals[others] = _parse_slow(np.asarray(values, dtype=object)[others])
+    return ordinals
+
+
+def string_bytes(values):
+    """
+    The first 8 bytes of every string as an (n, 8) uint8 array, zero padded, and the mask of
+    missing values. Arrow-backed strings (pandas' default str dtype) are read straight from the
+    Arrow buffers, without making a Python string per row. (None, None) for non-ASCII text.
+    """
+    dtype = getattr(values, 'dtype', None)
+    if isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow':
+        return _arrow_bytes(values)
+
+    values = np.asarray(values, dtype=object)
+    missing = pd.isna(values)
+    try:
+        raw = np.where(missing, '', values).astype('S8')
+    except (UnicodeEncodeError, TypeError):
+        return None, None
+    return raw.view(np.uint8).reshape(len(raw), 8), missing
+
+
+def _arrow_bytes(values):
+    import pyarrow as pa
+
+    array = pa.array(values)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    n = len(array)
+    offset_type = np.int64 if pa.types.is_large_string(array.type) else np.int32
+    _, offsets, data = array.buffers()
+    offsets = np.frombuffer(offsets, dtype=offset_type)[array.offset:array.offset + n + 1]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(1, dtype=np.uint8)
+    lengths = np.diff(offsets)
+    missing = array.is_null().to_numpy(zero_copy_only=False)
+
+    chars = np.zeros((n, 8), dtype=np.uint8)
+    if n and (lengths == lengths[0]).all() and lengths[0] >= 7:
+        # Every string has the same length, e.g. all 'YYYY-MM': the data buffer is a 2-d array
+        width = int(lengths[0])
+        rows = data[offsets[0]:offsets[0] + n * width].reshape(n, width)
+        chars[:, :min(width, 8)] = rows[:, :8]
+    elif n:
+        columns = np.arange(8)
+        inside = columns < lengths[:, None]
+        positions = np.minimum(offsets[:-1, None] + columns, len(data) - 1)
+        chars[inside] = data[positions][inside]
+    if (chars >= 128).any():
+        return None, None
+    return chars, missing
+
+
+def _parse_slow(values):
+    dates = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', format='mixed')
+    return datetime_ordinals(dates.to_numpy(dtype='datetime64[ns]'))
+
+
+def datetime_ordinals(dates):
+    """Month ordinals (int32) of a datetime64 array, MISSING for NaT."""
+    months = np.asarray(dates).astype('datetime64[M]')
+    ordinals = months.view(np.int64).astype(np.int32)
+    ordinals[np.isnat(months)] = MISSING
+    return ordinals
+
+
+def month_ordinals(ref_date):
+    """Month ordinals (int32) of REF_DATE values: strings, dates, monthly periods or ordinals."""
+    dtype = getattr(ref_date, 'dtype', None)
+    if isinstance(dtype, pd.PeriodDtype):
+        ordinals = pd.PeriodIndex(ref_date).asfreq('M').asi8
+        return np.where(ordinals == pd.NaT.value, MISSING, ordinals).astype(np.int32)
+    if dtype is not None and dtype.kind == 'M':
+        return datetime_ordinals(pd.Series(ref_date).dt.tz_localize(None).to_numpy())
+    if dtype is not None and dtype.kind in 'iu':
+        return np.asarray(ref_date, dtype=np.int32)
+    return parse_ref_date(ref_date)
+
+
+def _like(ref_date, values, name):
+    # A Series keeps the input's index, so it can be assigned or grouped on next to it
+    if isinstance(ref_date, pd.Series):
+        return pd.Series(values, index=ref_date.index, name=name)
+    return values
+
+
+def _field(ordinals, values, dtype):
+    missing = ordinals == MISSING
+    if missing.any():
+        # Like pandas' .dt fields, missing dates give NaN in a float column
+        return np.where(missing, np.nan, values)
+    return values.astype(dtype)
+
+
+def year_of(ref_date, name='Year'):
+    """Calendar year (int16) of every REF_DATE."""
+    ordinals = month_ordinals(ref_date)
+    return _like(ref_date, _field(ordinals, ordinals // 12 + EPOCH_YEAR, np.int16), name)
+
+
+def quarter_of(ref_date, name='Quarter'):
+    """Quarter (1-4, int8) of every REF_DATE."""
+    ordinals = month_ordinals(ref_date)
+    return _like(ref_date, _field(ordinals, ordinals % 12 // 3 + 1, np.int8), name)
+
+
+def month_of(ref_date, name='Month'):
+    """Month of the year (1-12, int8) of every REF_DATE."""
+    ordinals = month_ordinals(ref_date)
+    return _like(ref_date, _field(ordinals, ordinals % 12 + 1, np.int8), name)
+
+
+def to_periods(ordinals, name=None):
+    """Monthly PeriodIndex of month ordinals, NaT where MISSING."""
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    ordinals = np.where(ordinals == MISSING, pd.NaT.value, ordinals)
+    return pd.PeriodIndex.from_ordinals(ordinals, freq='M', name=name)
+
+
+def to_timestamps(ordinals, name=None):
+    """DatetimeIndex of the first day of every month ordinal, NaT where MISSING. Only for output."""
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    months = np.where(ordinals == MISSING, np.datetime64('NaT', 'M'), ordinals.astype('datetime64[M]'))
+    return pd.DatetimeIndex(months.astype('datetime64[ns]'), name=name)
@@ -1,14 +1,15 @@
+import argparse
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# List of provinces with data
-PROVINCES = [
-    "British Columbia", "Alberta", "Manitoba", "Quebec", "Ontario",
-    "Saskatchewan", "Prince Edward Island", "Newfoundland and Labrador",
-    "New Brunswick", "Nova Scotia"
-]
+from category_router import category_members
+from data_cleaning import PRODUCT_CATEGORIES
+from group_means import grouped_mean
+from price_cube import CUBE_FILE, load_cube, rollup, select, to_frame
+from profiling import profiled
+from ref_date import year_of
+from regions import PROVINCES
+from storage import save_table
+from vocabulary import decode, encode_frame, load_encoded, load_vocabulary
 
 CATEGORIES = [
     "baby",
@@ -38,42 +39,60 @@ os.makedirs(CSV_OUTPUT_DIR, exist_ok=True)
 os.makedirs(PNG_OUTPUT_DIR, exist_ok=True)
 os.makedirs(AVG_OUTPUT_DIR, exist_ok=True)
 
-def load_and_filter_data(filepath, usecols, provinces):
-    """Load the dataset and filter by the given provinces."""
-    # Load only the necessary columns
-    data = pd.read_csv(filepath, usecols=usecols, low_memory=True)
+@profiled
+def load_and_filter_data(filepath, usecols, provinces, chunksize=None):
+    """Load the dataset and filter by the given provinces.
+
+    With chunksize set the file is read in chunks and each chunk is filtered as it is read,
+    so only the rows for the given provinces are ever held in memory.
+
+    GEO and Products are encoded with the shared vocabulary, so the filter and the groupbys
+    run on integer codes and the chunks concatenate without re-hashing the labels.
+    """
+    vocabulary = load_vocabulary()
+    if chunksize:
+        # Load and filter one chunk at a time
+        chunks = pd.read_csv(filepath, usecols=usecols, chunksize=chunksize, dtype={'GEO': 'category', 'Products': 'category'})
+        data = pd.concat([encode_frame(chunk[chunk['GEO'].isin(provinces)], vocabulary) for chunk in chunks], ignore_index=True)
+    else:
+        # Load only the necessary columns
+        data = load_encoded(filepath, usecols, vocabulary)
 
-    # Filter by the specified provinces
-    data = data[data['GEO'].isin(provinces)].copy()
+        # Filter by the specified provinces
+        data = data[data['GEO'].isin(provinces)].copy()
 
     # Rename columns
     data.rename(columns={'GEO': 'province', 'REF_DATE': 'date', 'VALUE': 'value'}, inplace=True)
     
-    # Convert date to datetime and extract year
-    data['date'] = pd.to_datetime(data['date'], errors='coerce')
-    data['year'] = data['date'].dt.year
+    # Extract the year from the 'YYYY-MM' dates, NaN where a date is invalid
+    data['year'] = year_of(data['date'], name='year')
     
     return data
 
+@profiled
 def compute_item_statistics(data):
     """mean val product listed yearly"""
-    item_summary = data.groupby(['Products', 'province', 'year'])['value'].mean().reset_index()
+    keys = [data['Products'], data['province'], data['year']]
+    item_summary = grouped_mean(data['value'], keys, ['Products', 'province']).reset_index()
     item_summary.rename(columns={'value': 'avg_total_yearly'}, inplace=True)
     return item_summary
 
+@profiled
 def compute_average_2017_2024_per_province(data):
     """Mean value of product 2017 to 2024"""
-    avg_2017_2024_per_province = ( data.groupby(['Products', 'province'])['value'].mean().reset_index() )
+    keys = [data['Products'], data['province']]
+    avg_2017_2024_per_province = grouped_mean(data['value'], keys, ['Products', 'province']).reset_index()
     avg_2017_2024_per_province.rename(columns={'value': 'avg_total'}, inplace=True)
     return avg_2017_2024_per_province
 
-def process_files(filepaths, columns_to_load, provinces, csv_output_dir, avg_output_dir):
+@profiled
+def process_files(filepaths, columns_to_load, provinces, csv_output_dir, avg_output_dir, chunksize=None):
 
     for data_filepath in filepaths:
         print(f"Processing file: {data_filepath}")
 
         # Load and filter the data
-        data = load_and_filter_data(data_filepath, columns_to_load, provinces)
+        data = load_and_filter_data(data_filepath, columns_to_load, provinces, chunksize)
 
         # Compute statistics for each item
         item_summary = compute_item_statistics(data)
@@ -87,14 +106,50 @@ def process_files(filepaths, columns_to_load, provinces, csv_output_dir, avg_out
         item_summary_filepath = os.path.join(csv_output_dir, f'{base_name}_item.csv')
         avg_province_filepath = os.path.join(avg_output_dir, f'{base_name}_avg_prov.csv')
 
-        item_summary.to_csv(item_summary_filepath, index=False)
-        avg_2017_2024_per_province.to_csv(avg_province_filepath, index=False)
+        save_table(decode(item_summary), item_summary_filepath)
+        save_table(decode(avg_2017_2024_per_province), avg_province_filepath)
 
         print(f"File '{data_filepath}' processing complete.")
 
     print(f"Analysis complete for all files. Results saved to '{csv_output_dir}' and '{avg_output_dir}'.")
 
+def cube_summary(cube, value_name):
+    """A province level summary cube as the long table compute_item_statistics and friends give."""
+    summary = to_frame(cube, value_name).rename(columns={'GEO': 'province'})
+    key_cols = [col for col in ['Products', 'province', 'year'] if col in summary.columns]
+    return summary[key_cols + [value_name]].sort_values(key_cols).reset_index(drop=True)
+
+@profiled
+def process_cube(cube_path, categories, provinces, csv_output_dir, avg_output_dir):
+    """
+    Builds the same summaries as process_files from the price cube written by data_cleaning.py, rolled up
+    along the month axis once for all categories instead of re-reading and grouping each split_data file.
+    """
+    cube = select(load_cube(cube_path), GEO=provinces)
+    yearly = rollup(cube, 'REF_DATE', 'year')
+    whole_period = rollup(cube, 'REF_DATE', 'all')
+
+    for category, items in category_members(cube['axes']['Products'], categories).items():
+        item_summary = cube_summary(select(yearly, Products=items), 'avg_total_yearly')
+        avg_2017_2024_per_province = cube_summary(select(whole_period, Products=items), 'avg_total')
+
+        save_table(item_summary, os.path.join(csv_output_dir, f'{category}_item.csv'))
+        save_table(avg_2017_2024_per_province, os.path.join(avg_output_dir, f'{category}_avg_prov.csv'))
+        print(f"Category '{category}' processing complete.")
+
+    print(f"Analysis complete for all categories. Results saved to '{csv_output_dir}' and '{avg_output_dir}'.")
+
 def main():
+    parser = argparse.ArgumentParser(description="Summarise prices per product, province and year.")
+    parser.add_argument('--cube', nargs='?', const=CUBE_FILE, default=None,
+                        help=f"Roll up the price cube (default {CUBE_FILE}) instead of reading split_data")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Read each split_data file in chunks of this many rows, keeping only the provinces' rows")
+    args = parser.parse_args()
+
+    if args.cube:
+        process_cube(args.cube, PRODUCT_CATEGORIES, PROVINCES, CSV_OUTPUT_DIR, AVG_OUTPUT_DIR)
+        return
 
     # List of filepaths to the datasets
     filepaths = [
@@ -118,7 +173,7 @@ def main():
 
     # Columns to load from the dataset
     columns_to_load = ['GEO', 'REF_DATE', 'VALUE', 'Products']
-    process_files(filepaths, columns_to_load, PROVINCES, CSV_OUTPUT_DIR, AVG_OUTPUT_DIR)
+    process_files(filepaths, columns_to_load, PROVINCES, CSV_OUTPUT_DIR, AVG_OUTPUT_DIR, args.chunksize)
 
 
 
@@ -1,15 +1,12 @@
+import argparse
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-
-# List of provinces with data
-PROVINCES = [
-    "British Columbia", "Alberta", "Manitoba", "Quebec", "Ontario",
-    "Saskatchewan", "Prince Edward Island", "Newfoundland and Labrador",
-    "New Brunswick", "Nova Scotia"
-]
+from category_router import category_members
+from data_cleaning import PRODUCT_CATEGORIES
+from price_cube import CUBE_FILE, load_cube, rollup, select, to_frame
+from profiling import profiled
+from regions import PROVINCES
+from storage import load_table, save_table
 
 CATEGORIES = [
     "baby",
@@ -33,6 +30,7 @@ CATEGORIES = [
 # Create directories for organized output
 
 
+@profiled
 def calculate_avg_per_year_per_province(filepaths, output_file):
     """
     Calculates the average value per year for each province per category and saves the result to a CSV file.
@@ -45,7 +43,7 @@ def calculate_avg_per_year_per_province(filepaths, output_file):
         category = os.path.basename(filepath).replace('_item.csv', '')
 
         # Load the data
-        data = pd.read_csv(filepath)
+        data = load_table(filepath)
 
         # Group by year and province and calculate the average
         grouped = data.groupby(['year', 'province']).agg(avg_value=('avg_total_yearly', 'mean')).reset_index()
@@ -60,11 +58,33 @@ def calculate_avg_per_year_per_province(filepaths, output_file):
     final_df = pd.concat(all_results, ignore_index=True)
 
     # Save the final DataFrame to a CSV file
-    final_df.to_csv(output_file, index=False)
+    save_table(final_df, output_file)
+
+    print(f"Resulting CSV file has been saved to: {output_file}")
+
+@profiled
+def calculate_avg_per_year_per_province_from_cube(cube_path, categories, provinces, output_file):
+    """
+    Same table as calculate_avg_per_year_per_province, from the price cube: the monthly prices are rolled
+    up to yearly means per product, then to the mean over each category's products.
+    """
+    yearly = rollup(select(load_cube(cube_path), GEO=provinces), 'REF_DATE', 'year')
+    by_category = rollup(yearly, 'Products', category_members(yearly['axes']['Products'], categories), 'category')
+
+    final_df = to_frame(by_category, 'avg_value').rename(columns={'GEO': 'province'})
+    final_df['order'] = final_df['category'].map({category: i for i, category in enumerate(categories)})
+    final_df = final_df.sort_values(['order', 'year', 'province']).reset_index(drop=True)
+    final_df = final_df[['year', 'province', 'avg_value', 'category']]
+
+    save_table(final_df, output_file)
 
     print(f"Resulting CSV file has been saved to: {output_file}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Average the yearly product prices per province and category.")
+    parser.add_argument('--cube', nargs='?', const=CUBE_FILE, default=None,
+                        help=f"Roll up the price cube (default {CUBE_FILE}) instead of reading the *_item tables")
+    args = parser.parse_args()
 
     filepaths = [
     'output/geo_csv/years/baby_item.csv',
@@ -86,7 +106,10 @@ def main():
     ]
      # Specify the output file path
     output_file = 'output/geo_csv/avg_year_prov.csv'
-    calculate_avg_per_year_per_province(filepaths, output_file)
+    if args.cube:
+        calculate_avg_per_year_per_province_from_cube(args.cube, PRODUCT_CATEGORIES, PROVINCES, output_file)
+    else:
+        calculate_avg_per_year_per_province(filepaths, output_file)
 
 
 if __name__ == "__main__":
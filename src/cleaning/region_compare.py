@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from scipy.special import chdtrc
+
+# Comparisons of a value across regions (the coasts, urban / rural, ...) on long tables with a
+# region column, e.g. output/geo_csv/regions/avg_value_reg.csv. The regions are given as a list,
+# in the order of the output columns, so any number of regions and any province mapping work.
+
+
+def region_label(region):
+    """Short name of a region in column names: 'East Coast' -> 'east', 'Urban' -> 'urban'."""
+    return region.split()[0].lower()
+
+
+def region_labels(regions):
+    """
+    Labels of regions for column names, see region_label. Raises ValueError when two regions get
+    the same label (e.g. 'North Shore' and 'North Coast'), since their columns would overwrite each other.
+    """
+    labels = [region_label(region) for region in regions]
+    for position, label in enumerate(labels):
+        if label in labels[:position]:
+            clashing = [region for region, other in zip(regions, labels) if other == label]
+            raise ValueError(f"Regions {clashing} share the column label {label!r}; pass labels explicitly")
+    return labels
+
+
+def nested_order(data, keys):
+    """
+    Ids of every row's key combination, and the order nested loops over the keys' unique values
+    (each in order of first appearance) would visit the combinations in.
+    """
+    prefix_ids = [data.groupby(list(keys[:depth + 1]), sort=False, dropna=False).ngroup().to_numpy()
+                  for depth in range(len(keys))]
+    combo_ids = prefix_ids[-1]
+    _, first_rows = np.unique(combo_ids, return_index=True)
+    order = np.lexsort([ids[first_rows] for ids in reversed(prefix_ids)])
+    return combo_ids, first_rows, order
+
+
+def region_matrix(data, regions, keys=('year', 'category'), value='avg_value', region_col='region'):
+    """
+    Pivots data to one row per keys combination and one value column per region, keeping the
+    combinations where every region has exactly one value. Rows are in the order nested loops
+    over the keys would find them.
+    """
+    keys = list(keys)
+    combo_ids, first_rows, order = nested_order(data, keys)
+    region_codes = pd.Categorical(data[region_col], categories=regions).codes
+    in_regions = region_codes >= 0
+
+    n_combos, n_regions = len(first_rows), len(regions)
+    cells = combo_ids[in_regions] * n_regions + region_codes[in_regions]
+    counts = np.bincount(cells, minlength=n_combos * n_regions).reshape(n_combos, n_regions)
+    values = np.full(n_combos * n_regions, np.nan)
+    values[cells] = data[value].to_numpy()[in_regions]
+    values = values.reshape(n_combos, n_regions)
+
+    kept = order[(counts[order] == 1).all(axis=1)]
+    matrix = data[keys].iloc[first_rows[kept]].reset_index(drop=True)
+    for position, region in enumerate(regions):
+        matrix[region] = values[kept, position]
+    return matrix
+
+
+def pairwise_differences(matrix, regions, keys=('year', 'category'), labels=None):
+    """
+    Absolute differences between every pair of regions of a region_matrix, all pairs in one
+    broadcast, as columns diff_<a>_<b> in the order of regions. labels defaults to region_labels.
+    """
+    labels = labels or region_labels(regions)
+    first, second = np.triu_indices(len(regions), k=1)
+    values = matrix[list(regions)].to_numpy()
+    differences = np.abs(values[:, first] - values[:, second])
+
+    results = matrix[list(keys)].copy()
+    for column, (a, b) in enumerate(zip(first, second)):
+        results[f"diff_{labels[a]}_{labels[b]}"] = differences[:, column]
+    return results
+
+
+def kruskal_by_group(data, group_col, regions, value='avg_value', region_col='region'):
+    """
+    Kruskal-Wallis test of value across regions for every value of group_col, e.g. per category
+    over all its years, computed for all groups at once from the ranks within each group.
+    Groups where a region has no values are left out; groups are in order of first appearance.
+
+    Gives the same statistics as scipy.stats.kruskal group by group: the rank sums are sums of
+    half-integers, which are exact, and the rest follows scipy's formula in the same order.
+    """
+    group_ids, groups = pd.factorize(data[group_col], use_na_sentinel=False)
+    region_codes = pd.Categorical(data[region_col], categories=regions).codes
+    rows = region_codes >= 0
+    group_ids, region_codes = group_ids[rows], region_codes[rows].astype(np.int64)
+    values = pd.Series(data[value].to_numpy(dtype=np.float64)[rows])
+
+    n_groups, n_regions = len(groups), len(regions)
+    cells = group_ids * n_regions + region_codes
+    sizes = np.bincount(cells, minlength=n_groups * n_regions).reshape(n_groups, n_regions)
+    ranks = values.groupby(group_ids).rank(method='average').to_numpy()
+    rank_sums = np.bincount(cells, weights=ranks, minlength=n_groups * n_regions).reshape(n_groups, n_regions)
+
+    # Tie correction from the size of every run of equal values in a group
+    ties = values.groupby([group_ids, values.to_numpy()]).size()
+    tie_groups = ties.index.get_level_values(0).to_numpy()
+    tie_sizes = ties.to_numpy().astype(np.float64)
+    tie_sums = np.bincount(tie_groups, weights=tie_sizes ** 3 - tie_sizes, minlength=n_groups)
+    has_nan = np.bincount(group_ids, weights=values.isna().to_numpy(), minlength=n_groups) > 0
+
+    kept = np.flatnonzero((sizes > 0).all(axis=1))
+    sizes, rank_sums, tie_sums = sizes[kept], rank_sums[kept], tie_sums[kept]
+    total = sizes.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ssbn = 0
+        for position in range(n_regions):
+            ssbn = ssbn + rank_sums[:, position] ** 2 / sizes[:, position]
+        stats = 12.0 / (total * (total + 1)) * ssbn - 3 * (total + 1)
+        stats /= 1 - tie_sums / (total ** 3 - total)
+    # scipy's default nan_policy: a NaN in a group gives a NaN result
+    stats[has_nan[kept]] = np.nan
+
+    return pd.DataFrame({
+        group_col: groups[kept],
+        'kruskal_stat': stats,
+        'kruskal_p': chdtrc(n_regions - 1, stats),
+    })
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+# Provinces with data
+PROVINCES = [
+    "British Columbia", "Alberta", "Manitoba", "Quebec", "Ontario",
+    "Saskatchewan", "Prince Edward Island", "Newfoundland and Labrador",
+    "New Brunswick", "Nova Scotia"
+]
+
+COAST_MAPPING = {
+    'British Columbia': 'West Coast',
+    'Alberta': 'Interior',
+    'Saskatchewan': 'Interior',
+    'Manitoba': 'Interior',
+    'Ontario': 'Interior',
+    'Quebec': 'Interior',
+    'Newfoundland and Labrador': 'East Coast',
+    'Nova Scotia': 'East Coast',
+    'New Brunswick': 'East Coast',
+    'Prince Edward Island': 'East Coast',
+}
+
+URBAN_RURAL_MAPPING = {
+    'Ontario': 'Urban',
+    'Quebec': 'Urban',
+    'Alberta': 'Urban',
+    'British Columbia': 'Urban',
+    'New Brunswick': 'Urban',
+    'Nova Scotia': 'Urban',
+    'Manitoba': 'Rural',
+    'Saskatchewan': 'Rural',
+    'Prince Edward Island': 'Rural',
+    'Newfoundland and Labrador': 'Rural',
+}
+
+CANADA_REGION_MAPPING = {
+    'Newfoundland and Labrador': 'Atlantic',
+    'Prince Edward Island': 'Atlantic',
+    'Nova Scotia': 'Atlantic',
+    'New Brunswick': 'Atlantic',
+    'Quebec': 'Central',
+    'Ontario': 'Central',
+    'Manitoba': 'Prairies',
+    'Saskatchewan': 'Prairies',
+    'Alberta': 'Prairies',
+    'British Columbia': 'West Coast',
+}
+
+# Registered groupings of GEO values: name -> {GEO: group}. A GEO value is in at most one group
+# of a grouping; values in none (e.g. 'Canada') get the default asked for, or no group.
+GROUPINGS = {}
+
+
+def register_grouping(name, mapping):
+    """Registers a grouping of GEO values under name, e.g. census metropolitan areas -> province."""
+    GROUPINGS[name] = dict(mapping)
+
+
+register_grouping('coast', COAST_MAPPING)
+register_grouping('urban_rural', URBAN_RURAL_MAPPING)
+register_grouping('canada_region', CANADA_REGION_MAPPING)
+
+
+def resolve(grouping):
+    """The {GEO: group} dict of a registered grouping's name, or of a dict given directly."""
+    if isinstance(grouping, str):
+        if grouping not in GROUPINGS:
+            raise KeyError(f"No grouping registered as {grouping!r}, expected one of {list(GROUPINGS)}")
+        return GROUPINGS[grouping]
+    return dict(grouping)
+
+
+def group_names(grouping, default=None):
+    """Names of the groups, sorted, so the group codes order like the group names do."""
+    names = set(resolve(grouping).values())
+    if default is not None:
+        names.add(default)
+    return sorted(names)
+
+
+def geo_codes(geo):
+    """Integer code of every row of a GEO column, and the distinct GEO values the codes index."""
+    if isinstance(geo.dtype, pd.CategoricalDtype):
+        return geo.cat.codes.to_numpy(), geo.cat.categories
+    return pd.factorize(geo)
+
+
+def lookup_table(labels, grouping, names, default=None):
+    """Group code of every label (-1 for none), with one extra -1 at the end for missing labels."""
+    mapping = resolve(grouping)
+    positions = {name: code for code, name in enumerate(names)}
+    missing = positions.get(default, -1)
+    table = [positions[mapping[label]] if label in mapping else missing for label in labels]
+    return np.array(table + [-1], dtype=np.int8 if len(names) < 128 else np.int32)
+
+
+def group_codes(geo, grouping, default=None):
+    """
+    Group code of every row of geo (-1 for none) and the group names. The grouping is looked up
+    once per distinct GEO value; rows then take their code from that lookup table.
+    """
+    codes, labels = geo_codes(geo)
+    names = group_names(grouping, default)
+    return lookup_table(labels, grouping, names, default)[codes], names
+
+
+def group_column(geo, grouping, default=None):
+    """The group of every row of geo as a categorical Series (NaN for none), aligned with geo."""
+    codes, names = group_codes(geo, grouping, default)
+    return pd.Series(pd.Categorical.from_codes(codes, names), index=geo.index, name=geo.name)
+
+
+def group_frame(geo, groupings=None, defaults=None):
+    """
+    One categorical column per grouping (all registered ones by default), named after it. geo is
+    factorized once for all of them, so each extra grouping only costs a lookup table and a take.
+    """
+    codes, labels = geo_codes(geo)
+    defaults = defaults or {}
+    columns = {}
+    for name in groupings or list(GROUPINGS):
+        names = group_names(name, defaults.get(name))
+        table = lookup_table(labels, name, names, defaults.get(name))
+        columns[name] = pd.Categorical.from_codes(table[codes], names)
+    return pd.DataFrame(columns, index=geo.index)
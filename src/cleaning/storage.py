@@ -0,0 +1,129 @@
+import os
+import pandas as pd
+
+# Storage format for tables passed between stages: 'csv', 'parquet' or 'feather'.
+# Parquet and Feather keep dtypes (categoricals, dates, float32) so the next stage
+# does not have to re-parse them. Both need pyarrow.
+STORAGE_FORMAT = os.environ.get('GROCERY_STORAGE_FORMAT', 'csv')
+
+# Also write a CSV copy of every columnar table
+EXPORT_CSV = os.environ.get('GROCERY_EXPORT_CSV', '') == '1'
+
+# Columnar formats come first so they win over a CSV copy written at the same time
+EXTENSIONS = {
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'csv': '.csv',
+}
+
+
+def table_path(path, fmt):
+    """Returns path with its extension replaced by the one for fmt."""
+    return os.path.splitext(path)[0] + EXTENSIONS[fmt]
+
+
+def stored_path(path):
+    """
+    Returns the file holding the table named by path in any format, or None if there is none.
+    If more than one format exists the most recently written one is used.
+    """
+    candidates = [table_path(path, fmt) for fmt in EXTENSIONS]
+    candidates = [candidate for candidate in candidates if os.path.exists(candidate)]
+    if not candidates:
+        return None
+    return max(candidates, key=os.path.getmtime)
+
+
+def list_tables(folder):
+    """Lists the tables stored in a folder, as .csv paths whatever format they are stored in."""
+    names = set()
+    for file_name in os.listdir(folder):
+        base, ext = os.path.splitext(file_name)
+        if ext in EXTENSIONS.values():
+            names.add(base)
+    return [os.path.join(folder, f"{name}.csv") for name in sorted(names)]
+
+
+def save_table(df, path, mode='w', fmt=None):
+    """
+    Saves a table under path (a .csv name) in the configured storage format.
+
+    mode='a' appends to a CSV without writing the header. Appending is done in CSV since the
+    columnar formats cannot be appended to; if the table is already stored in a columnar format
+    it is rewritten with the new rows instead.
+    """
+    fmt = fmt or STORAGE_FORMAT
+    if mode == 'a':
+        source = stored_path(path)
+        if source is not None and not source.endswith('.csv'):
+            df = pd.concat([load_table(path), df], ignore_index=True)
+            mode = 'w'
+            fmt = os.path.splitext(source)[1].lstrip('.')
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    # Monthly periods are written as dates so every format reads back the same way
+    period_cols = [col for col in df.columns if isinstance(df[col].dtype, pd.PeriodDtype)]
+    if period_cols:
+        df = df.assign(**{col: df[col].dt.to_timestamp() for col in period_cols})
+
+    if fmt == 'csv' or mode == 'a':
+        df.to_csv(table_path(path, 'csv'), index=False, mode=mode, header=(mode == 'w'))
+        return
+
+    df = df.reset_index(drop=True)
+    if fmt == 'parquet':
+        df.to_parquet(table_path(path, 'parquet'), index=False)
+    elif fmt == 'feather':
+        df.to_feather(table_path(path, 'feather'))
+    else:
+        raise ValueError(f"Unknown storage format: {fmt}")
+
+    if EXPORT_CSV:
+        write_csv_copy(df, table_path(path, fmt))
+
+
+def load_table(path, columns=None, memory_map=True, dtypes=None, exact_floats=False):
+    """
+    Loads the table named by path from whichever format it was stored in.
+    Columnar files are memory-mapped and only the requested columns are read.
+    dtypes ({column: dtype}) are given to the CSV parser, or applied after reading a columnar file.
+    With exact_floats a CSV's floats are parsed back to exactly the values written, which pandas'
+    faster default parser does not always give for long decimals (e.g. saved running totals).
+    """
+    source = stored_path(path)
+    if source is None:
+        raise FileNotFoundError(f"No stored table for {path}")
+
+    if source.endswith('.csv'):
+        return pd.read_csv(source, usecols=columns, dtype=dtypes, float_precision='round_trip' if exact_floats else None)
+
+    if source.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(source, columns=columns, memory_map=memory_map)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(source, columns=columns, memory_map=memory_map)
+    df = table.to_pandas()
+    if dtypes:
+        df = df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+    return df
+
+
+def write_csv_copy(df, source):
+    """Writes df as a CSV next to its columnar source, dated the same so the source stays preferred."""
+    csv_path = table_path(source, 'csv')
+    df.to_csv(csv_path, index=False)
+    stat = os.stat(source)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return csv_path
+
+
+def export_csv(folder):
+    """Writes a CSV copy of every columnar table in a folder, as a final export step."""
+    for path in list_tables(folder):
+        source = stored_path(path)
+        if not source.endswith('.csv'):
+            write_csv_copy(load_table(path), source)
+            print(f"Exported {source} to {path}")
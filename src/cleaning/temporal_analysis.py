@@ -1,11 +1,23 @@
+import argparse
 import os
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from statsmodels.stats.multicomp import pairwise_tukeyhsd
+from change_rates import change_rates, change_table
+from figures import render
+from parallel_stats import add_workers_argument
+from price_cube import build_cube
+from profiling import profiled
+from ref_date import year_of
+from storage import list_tables, load_table
+from tukey import tukey_hsd_by_product
+from vocabulary import load_encoded
+
+# YoY price graph drawn by PlotYoYIncrease
+YOY_PNG = "output/temporal_png/yoy_price_increase.png"
 
 
 #Save dataframe to CSV
+@profiled
 def SaveToCSV(df, file_name, folder):
     output_folder = os.path.join('./', folder)
     os.makedirs(output_folder, exist_ok=True)
@@ -14,20 +26,20 @@ def SaveToCSV(df, file_name, folder):
 
 
 #Add the YoY price increase of each ingredient as a column (all files)
+@profiled
 def YoYPriceIncrease(folder_name):
     folder_path = os.path.join(os.getcwd(), folder_name)
-    filepaths = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith('.csv')]
+    filepaths = list_tables(folder_path)
     category_results = {}
 
     for filepath in filepaths:
         category_name = os.path.splitext(os.path.basename(filepath))[0] 
-        df = pd.read_csv(filepath)
+        df = load_table(filepath)
         
         if df.empty:
             continue 
         
-        df['REF_DATE'] = pd.to_datetime(df['REF_DATE'])
-        df['Year'] = df['REF_DATE'].dt.year
+        df['Year'] = year_of(df['REF_DATE'])
         
         yearly_avg = df.groupby('Year')['VALUE'].mean().reset_index()
         
@@ -47,9 +59,8 @@ def YoYPriceIncrease(folder_name):
 
 
 
-# Plot the average YoY increases of food prices over time across all Provinces.
-def PlotYoYIncrease(yoy_results):
-                                
+# Draws the average YoY increases of food prices over time across all Provinces.
+def DrawYoYIncrease(yoy_results):
     plt.figure(figsize=(12, 8))
     sns.set(style="whitegrid")
     colors = sns.color_palette("tab20", len(yoy_results)) 
@@ -61,129 +72,88 @@ def PlotYoYIncrease(yoy_results):
     plt.ylabel('YoY Price Increase (%)', fontsize=14)
     plt.title('Year-over-Year Price Increase by Category', fontsize=16)
     plt.legend(title="Food Categories", bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=12)
-    plt.show()
+    plt.tight_layout()
+
+
+# Saves the YoY graph as a PNG, redrawn only when the YoY results change
+@profiled
+def PlotYoYIncrease(yoy_results):
+    if render(DrawYoYIncrease, yoy_results, YOY_PNG):
+        print(f"YoY price graph saved to {YOY_PNG}")
+
 
+#Compute the price changes of each ingredient in each province once, on a dense GEO x Products x month cube.
+@profiled
+def PriceChanges(df):
+    cube = build_cube(df)
+    return change_table(cube, change_rates(cube))
 
-#Add the YoY price increase of each ingredient as a column (Single files)
-def CalculateYoYIncrease(df):
-    df.loc[:, 'REF_DATE'] = pd.to_datetime(df['REF_DATE'])
-    df = df.sort_values(by=['Products', 'REF_DATE'])
-    df['YoY_Increase'] = df.groupby('Products')['VALUE'].pct_change() * 100
-    df = df.dropna(subset=['YoY_Increase'])
-    return df
+
+#Keep the rows with a YoY price increase (same province and ingredient, 12 months earlier)
+def CalculateYoYIncrease(changes):
+    return changes.dropna(subset=['YoY_Increase'])
 
 
 #Calculate the average price increase for Covid period
-def AveragePriceIncreasePeriod(df):
-    df_with_yoy = CalculateYoYIncrease(df)
-    avg_increase = df_with_yoy.groupby('COVID_Period')['YoY_Increase'].mean().reset_index()
+@profiled
+def AveragePriceIncreasePeriod(changes):
+    df_with_yoy = CalculateYoYIncrease(changes)
+    avg_increase = df_with_yoy.groupby('COVID_Period', observed=True)['YoY_Increase'].mean().reset_index()
     return avg_increase
 
 
-#Tukey Test for Covid themed comparison.
-def TukeyTest(df):
-    df_with_yoy = CalculateYoYIncrease(df)
-    tukey = pairwise_tukeyhsd(endog=df_with_yoy['YoY_Increase'], 
-                              groups=df_with_yoy['COVID_Period'], 
-                              alpha=0.05)
-    
-    tukey_results = pd.DataFrame(data=tukey.summary().data[1:], columns=tukey.summary().data[0])
-    return tukey_results
-
-
-#Add MoM price increase for each food item.
-def CalculateMoMIncreaseByPeriod(df):
-    df['REF_DATE'] = pd.to_datetime(df['REF_DATE'])
-    df = df.sort_values(by=['Products', 'REF_DATE'])
-    df['MoM_Increase'] = df.groupby('Products')['VALUE'].pct_change() * 100
-    df = df.dropna(subset=['MoM_Increase'])
-    return df
-
-
-#Conduct pairwise t-tests for each product across all 3 covid periods
-def TukeyTestPerProductCovid(df, product):
-    product_df = df[df['Products'] == product]
-    if product_df['COVID_Period'].nunique() != 3:
-        return None
-    tukey = pairwise_tukeyhsd(
-        endog=product_df['MoM_Increase'],
-        groups=product_df['COVID_Period'],
-        alpha=0.05
-    )
-    tukey_results = pd.DataFrame(data=tukey.summary(), columns=['group1', 'group2', 'meandiff', 'p-adj', 'lower', 'upper', 'reject'])
-    return tukey_results
-
-
-#Conduct a pairwise t-test for each grouping of ingredients.
-def TukeyTestAllProductsCovid(df):
-    products = df['Products'].unique()
-    all_results = []
-    
-    for product in products:
-        tukey_results = TukeyTestPerProductCovid(df, product)
-        
-        if tukey_results is not None:
-            tukey_results['Product'] = product
-            all_results.append(tukey_results)
-   
-    if all_results:
-        final_results = pd.concat(all_results, ignore_index=True)
-        return final_results
-    else:
-        return pd.DataFrame()
-
-
-#Calculate the MoM price increase per ingredient.
-def CalculateMOMIncrease(df):
-    df = df.sort_values(by=['Products', 'REF_DATE'])
-    df['MoM_Increase'] = df.groupby('Products')['VALUE'].pct_change() * 100
-    return df.dropna(subset=['MoM_Increase'])
-
-
-#Conduct a pairwise t-test for each ingredient across three presidential periods.
-def TukeyTestPresidency(df):
-    products = df['Products'].unique()
-    results = []
-    
-    for product in products:
-        product_df = df[df['Products'] == product]
-        
-        if product_df['Presidency_Period'].nunique() != 3:
-            continue
-        
-        tukey = pairwise_tukeyhsd(
-            endog=product_df['MoM_Increase'],
-            groups=product_df['Presidency_Period'],
-            alpha=0.05
-        )
-
-        tukey_results = pd.DataFrame(data=tukey.summary().data[1:], columns=tukey.summary().data[0])
-        tukey_results['Product'] = product
-        results.append(tukey_results)
-    
-    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+#Tukey Test for Covid themed comparison. Same table as statsmodels' pairwise_tukeyhsd summary, from
+#tukey.py with every row in one group, so statsmodels is never imported.
+@profiled
+def TukeyTest(changes):
+    df_with_yoy = CalculateYoYIncrease(changes).assign(All=0)
+    tukey_results = tukey_hsd_by_product(df_with_yoy, 'YoY_Increase', 'COVID_Period', product_col='All', workers=1)
+    return tukey_results.drop(columns='Product')
+
+
+#Keep the rows with a MoM price increase (same province and ingredient, previous month)
+def CalculateMoMIncrease(changes):
+    return changes.dropna(subset=['MoM_Increase'])
+
+
+#Conduct a pairwise t-test for each grouping of ingredients across all 3 covid periods, batched over products.
+@profiled
+def TukeyTestAllProductsCovid(df, workers=None):
+    return tukey_hsd_by_product(df, 'MoM_Increase', 'COVID_Period', n_groups=3, workers=workers)
+
+
+#Conduct a pairwise t-test for each ingredient across three presidential periods, batched over products.
+@profiled
+def TukeyTestPresidency(df, workers=None):
+    return tukey_hsd_by_product(df, 'MoM_Increase', 'Presidency_Period', n_groups=3, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temporal analysis of food price changes.")
+    add_workers_argument(parser)
+    args = parser.parse_args()
 
+    yoy = YoYPriceIncrease("split_data")
+    PlotYoYIncrease(yoy)
 
-yoy = YoYPriceIncrease("split_data")
-PlotYoYIncrease(yoy)
+    file_path = os.path.join("cleaned_data", "covid_period_food.csv")
+    changes = PriceChanges(load_encoded(file_path, columns=['REF_DATE', 'GEO', 'Products', 'VALUE']))
 
-file_path = os.path.join("cleaned_data", "covid_period_food.csv")
-df = pd.read_csv(file_path)
+    avg_increase = AveragePriceIncreasePeriod(changes)
+    print(avg_increase)
 
-avg_increase = AveragePriceIncreasePeriod(df)
-print(avg_increase)
+    tukey_results = TukeyTest(changes)
+    print(tukey_results)
 
-tukey_results = TukeyTest(df)
-print(tukey_results)
+    df_mom = CalculateMoMIncrease(changes)
+    final_results = TukeyTestAllProductsCovid(df_mom, args.workers)
+    SaveToCSV(final_results, "tukey_covid.csv", "")
 
-df_mom = CalculateMoMIncreaseByPeriod(df)
-final_results = TukeyTestAllProductsCovid(df_mom)
-SaveToCSV(final_results, "tukey_covid.csv", "")
+    # The months carry both the COVID and the presidency periods, so the same changes are reused
+    tukey_results = TukeyTestPresidency(df_mom, args.workers)
 
-file_path = os.path.join("cleaned_data", "presidency.csv")
-df = pd.read_csv(file_path)
+    SaveToCSV(tukey_results, "tukey_pres.csv", "")
 
-df_mom = CalculateMOMIncrease(df)
-tukey_results = TukeyTestPresidency(df_mom)
 
-SaveToCSV(tukey_results, "tukey_pres.csv", "")
+if __name__ == "__main__":
+    main()
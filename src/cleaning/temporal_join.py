@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+from ref_date import EPOCH_YEAR, MISSING, month_ordinals
+
+# Aligns series of different frequencies on sorted integer time keys: the monthly prices with
+# monthly income and quarterly population, or yearly summaries with yearly averages. Each
+# covariate table holds at most one row per (group, time); every row of the left table gets at
+# most one value from it, so a join never multiplies rows, and several covariates are joined in
+# one pass over the left table's keys.
+#
+# Methods, for a left row at time t in a group:
+#   'exact'        the covariate's value at t
+#   'asof'         its last value at or before t (a forward fill)
+#   'nearest'      its value closest to t, the earlier one on ties
+#   'interpolate'  linear in time between its values around t; after its last value, that value
+# tolerance limits how far (in time keys) from t the values used may be.
+METHODS = ('exact', 'asof', 'nearest', 'interpolate')
+
+# The left rows are aligned through a table of every (group, time) key when there are at most this
+# many keys, so each key is looked up once and the rows take their values from it with a gather
+DENSE_KEYS = 1 << 22
+
+# Periods per year of the second column when time is given as [year column, period column]
+PERIODS_PER_YEAR = {'Quarter': 4, 'quarter': 4, 'Month': 12, 'month': 12}
+
+
+def time_keys(df, time):
+    """
+    Integer time keys (int64, MISSING where unknown) of df. time is a column of months (strings,
+    dates, periods) or integers (e.g. years, used as they are), or [year column, quarter or month
+    column], numbered as consecutive quarters or months.
+    """
+    if isinstance(time, str):
+        return month_ordinals(df[time]).astype(np.int64)
+    year_col, period_col = time
+    periods = PERIODS_PER_YEAR[period_col]
+    keys = (df[year_col].to_numpy(dtype=np.float64) - EPOCH_YEAR) * periods + df[period_col].to_numpy(dtype=np.float64) - 1
+    return np.where(np.isnan(keys), MISSING, keys).astype(np.int64)
+
+
+def column_codes(left, right):
+    """
+    Codes of a key column on both sides, numbering right's distinct values; a left value missing on
+    the right gets -1. Categoricals of the same dtype (e.g. the shared vocabulary) use their codes,
+    otherwise each distinct left value is looked up once.
+    """
+    if isinstance(left.dtype, pd.CategoricalDtype) and left.dtype == right.dtype:
+        return left.cat.codes.to_numpy(np.int64), right.cat.codes.to_numpy(np.int64), len(left.cat.categories)
+    right_codes, uniques = pd.factorize(right)
+    if isinstance(left.dtype, pd.CategoricalDtype):
+        left_codes, left_uniques = left.cat.codes.to_numpy(), left.cat.categories
+    else:
+        left_codes, left_uniques = pd.factorize(left)
+    # Missing left values have code -1, which picks the trailing -1
+    lookup = np.append(pd.Index(uniques).get_indexer(left_uniques), -1)
+    return lookup[left_codes].astype(np.int64), right_codes.astype(np.int64), len(uniques)
+
+
+def group_codes(left, right, by):
+    """One code per row for the by columns combined, on both sides; -1 for a left group not on the right."""
+    left_codes = np.zeros(len(left), dtype=np.int64)
+    right_codes = np.zeros(len(right), dtype=np.int64)
+    for col in by:
+        left_col, right_col, size = column_codes(left[col], right[col])
+        left_codes = np.where((left_codes < 0) | (left_col < 0), -1, left_codes * size + left_col)
+        right_codes = np.where((right_codes < 0) | (right_col < 0), -1, right_codes * size + right_col)
+    return left_codes, right_codes
+
+
+def sorted_series(right_groups, right_times):
+    """Order of the right rows by (group, time) with their composite keys, rows without a group or time left out."""
+    rows = np.flatnonzero((right_groups >= 0) & (right_times != MISSING))
+    order = rows[np.lexsort((right_times[rows], right_groups[rows]))]
+    groups, times = right_groups[order], right_times[order]
+    duplicated = (groups[1:] == groups[:-1]) & (times[1:] == times[:-1])
+    if duplicated.any():
+        raise ValueError("The covariate has more than one row for a group and time")
+    return order, groups, times
+
+
+def neighbours(query_groups, query_times, groups, times, first, width):
+    """
+    For every (group, time) queried, the positions in the sorted right series of the last value at or
+    before the time and of the first value at or after it, in the same group; -1 where there is none.
+    Times are from first on and less than first + width.
+    """
+    valid = (query_groups >= 0) & (query_times != MISSING)
+    right_keys = groups * width + (times - first)
+    query_keys = np.where(valid, query_groups * width + (query_times - first), -1)
+
+    before = np.searchsorted(right_keys, query_keys, side='right') - 1
+    after = np.searchsorted(right_keys, query_keys, side='left')
+    before_ok = valid & (before >= 0)
+    before_ok[before_ok] = groups[before[before_ok]] == query_groups[before_ok]
+    after_ok = valid & (after < len(right_keys))
+    after_ok[after_ok] = groups[after[after_ok]] == query_groups[after_ok]
+    return np.where(before_ok, before, -1), np.where(after_ok, after, -1)
+
+
+def within(positions, times, left_times, tolerance):
+    """positions with -1 where the value is further than tolerance from the left row's time."""
+    if tolerance is None:
+        return positions
+    found = positions >= 0
+    far = np.zeros(len(positions), dtype=bool)
+    far[found] = np.abs(times[positions[found]] - left_times[found]) > tolerance
+    return np.where(far, -1, positions)
+
+
+def take(values, positions):
+    """values at positions, NaN where the position is -1 (as float64 unless values are floats)."""
+    taken = values[np.maximum(positions, 0)]
+    if (positions < 0).any():
+        taken = taken.astype(taken.dtype if taken.dtype.kind == 'f' else np.float64)
+        taken[positions < 0] = np.nan
+    return taken
+
+
+def aligned_values(right, columns, order, times, before, after, query_times, method, tolerance):
+    """The values of right's columns at the queried times, from their neighbours in the sorted series."""
+    if method == 'exact':
+        exact = np.zeros(len(before), dtype=bool)
+        exact[before >= 0] = times[before[before >= 0]] == query_times[before >= 0]
+        before = np.where(exact, before, -1)
+    elif method == 'nearest':
+        before, after = within(before, times, query_times, tolerance), within(after, times, query_times, tolerance)
+        after_closer = (after >= 0) & ((before < 0) | (times[after] - query_times < query_times - times[before]))
+        before = np.where(after_closer, after, before)
+    else:
+        before = within(before, times, query_times, tolerance)
+        after = within(after, times, query_times, tolerance)
+
+    aligned = {}
+    for col in columns:
+        values = right[col].to_numpy()[order]
+        value = take(values, before)
+        if method == 'interpolate':
+            between = (before >= 0) & (after >= 0) & (after != before)
+            start, end = times[before[between]], times[after[between]]
+            weight = (query_times[between] - start) / (end - start)
+            value = value.astype(np.float64)
+            value[between] = value[between] + weight * (take(values, after[between]) - value[between])
+        aligned[col] = value
+    return aligned
+
+
+def align(left, right, columns, by, time, method='asof', tolerance=None):
+    """
+    The values of right's columns for every row of left, by group (the by columns, on both tables)
+    and time (see time_keys), as a DataFrame with left's index and NaN where there is no value.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+    left_groups, right_groups = group_codes(left, right, by)
+    left_times, right_times = time_keys(left, time), time_keys(right, time)
+    # Rows with none of the values are not points of the series, so 'asof' looks past them
+    right_groups[right[columns].isna().all(axis=1).to_numpy()] = -1
+    order, groups, times = sorted_series(right_groups, right_times)
+    valid = (left_groups >= 0) & (left_times != MISSING)
+    if len(order) == 0 or not valid.any():
+        return pd.DataFrame({col: np.full(len(left), np.nan) for col in columns}, index=left.index)
+
+    first = min(times[0], left_times[valid].min())
+    width = max(times.max(), left_times[valid].max()) - first + 1
+    n_groups = max(groups[-1], left_groups.max()) + 1
+    if n_groups * width <= DENSE_KEYS:
+        query_groups = np.repeat(np.arange(n_groups), width)
+        query_times = np.tile(np.arange(first, first + width), n_groups)
+        rows = np.where(valid, left_groups * width + (left_times - first), -1)
+    else:
+        query_groups, query_times, rows = left_groups, left_times, None
+
+    before, after = neighbours(query_groups, query_times, groups, times, first, width)
+    aligned = aligned_values(right, columns, order, times, before, after, query_times, method, tolerance)
+    if rows is not None:
+        aligned = {col: take(values, rows) for col, values in aligned.items()}
+    return pd.DataFrame(aligned, index=left.index)
+
+
+def join(left, covariates, by, time, how='left'):
+    """
+    left with the columns of every covariate aligned to it. covariates is a list of (table, columns,
+    method) or (table, columns, method, tolerance); how='inner' keeps only the rows with a value
+    from every covariate. Rows keep their order.
+    """
+    if how not in ('left', 'inner'):
+        raise ValueError(f"Unknown how {how!r}, expected 'left' or 'inner'")
+    joined = [left]
+    for covariate in covariates:
+        table, columns, method, *tolerance = covariate
+        joined.append(align(left, table, columns, by, time, method, *tolerance))
+    result = pd.concat(joined, axis=1)
+    if how == 'inner':
+        added = [col for frame in joined[1:] for col in frame.columns]
+        result = result[result[added].notna().all(axis=1)]
+    return result
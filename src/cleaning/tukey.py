@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import studentized_range
+
+from parallel_stats import CHUNKS_PER_WORKER, WORKERS, parallel_map, partition
+
+TUKEY_COLUMNS = ['group1', 'group2', 'meandiff', 'p-adj', 'lower', 'upper', 'reject']
+
+
+def group_stats(df, value_col, group_col, product_col):
+    """Count, mean and within-group sum of squares of each (product, group), groups sorted within each product."""
+    data = df[[product_col, group_col, value_col]].dropna()
+    grouped = data.groupby([product_col, group_col], sort=False, observed=True)[value_col]
+    stats = grouped.agg(['count', 'mean', 'var']).reset_index()
+    stats['ss'] = (stats.pop('var') * (stats['count'] - 1)).fillna(0.0)
+
+    # Products keep their order of first appearance, groups are sorted like np.unique in statsmodels
+    stats['product_order'] = pd.factorize(stats[product_col])[0]
+    stats[group_col] = stats[group_col].astype(str)
+    return stats.sort_values(['product_order', group_col], kind='stable').reset_index(drop=True)
+
+
+def tukey_block(means, counts, ss, alpha):
+    """
+    Tukey HSD for a block of products that all have k groups. Takes (products, k) arrays and
+    returns (products, pairs) arrays of mean differences, p-values, interval bounds and rejections.
+    """
+    k = means.shape[1]
+    idx1, idx2 = np.triu_indices(k, 1)
+    df_total = counts.sum(axis=1) - k
+    mse = ss.sum(axis=1) / df_total
+
+    meandiffs = means[:, idx2] - means[:, idx1]
+    std_pairs = np.sqrt(mse[:, None] * 0.5 * (1.0 / counts[:, idx1] + 1.0 / counts[:, idx2]))
+    st_range = np.abs(meandiffs) / std_pairs
+
+    # The critical value only depends on the degrees of freedom, which most products share
+    unique_df, df_index = np.unique(df_total, return_inverse=True)
+    q_crit = studentized_range.ppf(1 - alpha, k, unique_df)[df_index][:, None]
+    pvalues = studentized_range.sf(st_range, k, np.broadcast_to(df_total[:, None], st_range.shape))
+
+    crit_int = std_pairs * q_crit
+    return meandiffs, pvalues, meandiffs - crit_int, meandiffs + crit_int, st_range > q_crit
+
+
+def parallel_tukey_block(means, counts, ss, alpha, workers):
+    """tukey_block with the products split across worker processes, results concatenated in order."""
+    workers = WORKERS if workers is None else workers
+    if workers <= 1:
+        return tukey_block(means, counts, ss, alpha)
+    slices = partition(range(len(means)), workers * CHUNKS_PER_WORKER)
+    results = parallel_map(tukey_block, [(means[rows], counts[rows], ss[rows], alpha) for rows in slices], workers)
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def tukey_hsd_by_product(df, value_col, group_col, product_col='Products', alpha=0.05, n_groups=None, workers=None):
+    """
+    Tukey HSD of value_col between the groups in group_col, for every product at once.
+
+    Gives the same rows and rounding as statsmodels' pairwise_tukeyhsd summary run on each product
+    separately, with a Product column. Products with fewer than two groups, or a number of groups
+    other than n_groups when it is given, are left out. Rows with a missing value or group are ignored.
+    The p-values dominate the run time; with workers the products are split across processes.
+    """
+    stats = group_stats(df, value_col, group_col, product_col)
+    products = stats[product_col].to_numpy()
+    starts = np.flatnonzero(np.r_[True, products[1:] != products[:-1]])
+    sizes = np.diff(np.r_[starts, len(stats)])
+
+    blocks = []
+    for k in np.unique(sizes):
+        if k < 2 or (n_groups is not None and k != n_groups):
+            continue
+        # Each product's k groups are consecutive rows, so the block reshapes to (products, k)
+        rows = (starts[sizes == k][:, None] + np.arange(k)).ravel()
+        block = stats.iloc[rows]
+        shape = (-1, k)
+        meandiffs, pvalues, lower, upper, reject = parallel_tukey_block(
+            block['mean'].to_numpy(dtype=float).reshape(shape),
+            block['count'].to_numpy(dtype=float).reshape(shape),
+            block['ss'].to_numpy(dtype=float).reshape(shape),
+            alpha, workers,
+        )
+
+        labels = block[group_col].to_numpy().reshape(shape)
+        idx1, idx2 = np.triu_indices(k, 1)
+        blocks.append(pd.DataFrame({
+            'group1': labels[:, idx1].ravel(),
+            'group2': labels[:, idx2].ravel(),
+            'meandiff': np.round(meandiffs, 4).ravel(),
+            'p-adj': np.round(pvalues, 4).ravel(),
+            'lower': np.round(lower, 4).ravel(),
+            'upper': np.round(upper, 4).ravel(),
+            'reject': reject.ravel(),
+            'Product': np.repeat(products[starts[sizes == k]], len(idx1)),
+            'order': np.repeat(block['product_order'].to_numpy()[::k], len(idx1)),
+        }))
+
+    if not blocks:
+        return pd.DataFrame(columns=TUKEY_COLUMNS + ['Product'])
+    results = pd.concat(blocks, ignore_index=True).sort_values('order', kind='stable')
+    return results.drop(columns='order').reset_index(drop=True)
@@ -0,0 +1,113 @@
+import json
+import os
+
+import pandas as pd
+
+from storage import load_table
+
+# Shared vocabulary of the label columns: the provinces (GEO), products and categories seen by the
+# cleaning stage, each kept sorted so a categorical's codes order like its labels do and sorted or
+# grouped outputs come out in the same order as with plain strings. Tables encoded with it share one
+# categorical dtype per column, so filters, groupbys and merges run on small integer codes, and
+# tables loaded by different stages can be merged or concatenated without re-hashing the labels.
+VOCABULARY_FILE = 'cleaned_data/vocabulary.json'
+
+# Column name -> vocabulary it takes its labels from; later stages rename GEO to province
+COLUMN_VOCABULARY = {
+    'GEO': 'GEO',
+    'province': 'GEO',
+    'Products': 'Products',
+    'category': 'category',
+}
+
+# Vocabularies read so far, by (path, modification time), so every stage reads the file once
+_loaded = {}
+
+
+def load_vocabulary(path=VOCABULARY_FILE):
+    """The saved vocabulary as {name: CategoricalDtype}, or {} if the cleaning stage has not written one."""
+    if not os.path.exists(path):
+        return {}
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    if key not in _loaded:
+        with open(path) as f:
+            _loaded[key] = {name: pd.CategoricalDtype(labels) for name, labels in json.load(f).items()}
+    return _loaded[key]
+
+
+def save_vocabulary(vocabulary, path=VOCABULARY_FILE):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({name: list(dtype.categories) for name, dtype in vocabulary.items()}, f, indent=1)
+
+
+def labels_of(values):
+    """The distinct labels of a column (its categories if it is categorical), without missing values."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.categories
+    return pd.Index(values.dropna().unique())
+
+
+def frame_labels(frames):
+    """{vocabulary name: distinct labels} of the vocabulary columns in a list of tables."""
+    labels = {}
+    for df in frames:
+        for col, name in COLUMN_VOCABULARY.items():
+            if col in df.columns:
+                labels.setdefault(name, set()).update(labels_of(df[col]))
+    return labels
+
+
+def extend_vocabulary(vocabulary, labels):
+    """
+    The vocabulary with {name: labels} added, each name's labels sorted again. Labels are only
+    ever added, so tables encoded before stay valid.
+    """
+    extended = dict(vocabulary)
+    for name, values in labels.items():
+        known = vocabulary[name].categories if name in vocabulary else []
+        extended[name] = pd.CategoricalDtype(sorted(set(known).union(str(label) for label in values)))
+    return extended
+
+
+def encode(values, name, vocabulary):
+    """
+    values as a categorical with the vocabulary's dtype for name. Labels missing from the vocabulary
+    are added to this column's categories, in sorted order, so no value is ever lost.
+    """
+    dtype = vocabulary.get(name)
+    labels = labels_of(values)
+    if dtype is None or not labels.isin(dtype.categories).all():
+        dtype = extend_vocabulary({name: dtype} if dtype is not None else {}, {name: labels})[name]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Only the categories are looked up; the row codes are remapped with a take
+        return values.cat.set_categories(dtype.categories)
+    return values.astype(dtype)
+
+
+def encode_frame(df, vocabulary=None):
+    """df with every vocabulary column (see COLUMN_VOCABULARY) encoded."""
+    vocabulary = load_vocabulary() if vocabulary is None else vocabulary
+    columns = {col: encode(df[col], name, vocabulary) for col, name in COLUMN_VOCABULARY.items() if col in df.columns}
+    return df.assign(**columns)
+
+
+def decode(df):
+    """df with its categorical vocabulary columns back as strings, for outputs and figures."""
+    columns = {
+        col: df[col].astype(str).where(df[col].notna())
+        for col in COLUMN_VOCABULARY
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**columns) if columns else df
+
+
+def load_encoded(path, columns=None, vocabulary=None):
+    """
+    Loads a stored table with its vocabulary columns encoded. A CSV's labels are parsed straight into
+    a categorical, so each distinct label is hashed once per file, and then mapped onto the vocabulary.
+    """
+    dtypes = dict.fromkeys(COLUMN_VOCABULARY, 'category')
+    return encode_frame(load_table(path, columns=columns, dtypes=dtypes), vocabulary)
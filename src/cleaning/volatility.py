@@ -0,0 +1,156 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from change_rates import pct_change
+from price_cube import CUBE_FILE, load_cube
+from profiling import profiled
+from storage import save_table
+
+# Window analytics of every monthly price series (province x product) of the price cube, for
+# monitoring: the volatility of the month over month changes, the z-score of the price and its
+# drawdown from the peak, over trailing windows of months and over every month so far (expanding).
+# Each is computed for all series at once along the cube's month axis: means and standard
+# deviations from cumulative sums, peaks from a running maximum that doubles its span each step.
+VOLATILITY_FILE = "output/temporal_csv/price_volatility.csv"
+
+# Trailing windows in months. A windowed value needs a price (or change) in every month of its
+# window, like change_rates.rolling_mean
+WINDOWS = [3, 6, 12]
+
+# Months with a price (or change) an expanding value needs
+EXPANDING_MIN_PERIODS = 3
+
+# Variances this small relative to the mean square are rounding error of a constant window
+_RELATIVE_VARIANCE_FLOOR = 1e-10
+
+
+def shift(values, months):
+    """values moved months later along the last axis, NaN in the first months."""
+    shifted = np.full(values.shape, np.nan)
+    shifted[..., months:] = values[..., :-months]
+    return shifted
+
+
+def window_totals(values, window):
+    """
+    Count, sum and sum of squares of the values present in the trailing window ending at every month
+    along the last axis (window=None for every month so far), from cumulative sums.
+    """
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    totals = [np.cumsum(present, axis=-1), np.cumsum(filled, axis=-1), np.cumsum(filled * filled, axis=-1)]
+    if window is None:
+        return totals
+    for total in totals:
+        total[..., window:] = total[..., window:] - total[..., :-window]
+    return totals
+
+
+def window_moments(values, window, min_periods):
+    """
+    Mean and sample standard deviation of the trailing windows, NaN where a window has fewer than
+    min_periods values (or fewer than 2 for the deviation). Each series is centred on its own mean
+    first so the sums of squares do not lose the small differences between prices.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        present = ~np.isnan(values)
+        counts = np.maximum(present.sum(axis=-1, keepdims=True), 1)
+        offset = np.where(present, values, 0.0).sum(axis=-1, keepdims=True) / counts
+        counts, sums, squares = window_totals(values - offset, window)
+
+        enough = counts >= max(min_periods, 1)
+        means = sums / counts
+        variance = (squares - sums * means) / (counts - 1)
+        variance[variance <= _RELATIVE_VARIANCE_FLOOR * squares / counts] = 0.0
+        deviations = np.sqrt(variance)
+    return np.where(enough, means + offset, np.nan), np.where(enough & (counts >= 2), deviations, np.nan)
+
+
+def trailing_max(values, window):
+    """Largest value present in the trailing window ending at every month (window=None for every month so far)."""
+    if window is None:
+        return np.fmax.accumulate(values, axis=-1)
+    peaks, span = values, 1
+    # peaks holds the maximum of the trailing span months; two overlapping spans cover the window
+    while span * 2 <= window:
+        peaks = np.fmax(peaks, shift(peaks, span))
+        span *= 2
+    return np.fmax(peaks, shift(peaks, window - span)) if window > span else peaks
+
+
+def volatility(values, window, min_periods):
+    """Standard deviation of the month over month percent changes in the trailing window."""
+    return window_moments(pct_change(values, 1), window, min_periods)[1]
+
+
+def zscore(values, window, min_periods):
+    """Deviations of the price from its trailing window mean, NaN where the window's prices are all equal."""
+    means, deviations = window_moments(values, window, min_periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(deviations > 0, (values - means) / deviations, np.nan)
+
+
+def drawdown(values, window, min_periods):
+    """Percent of the price below the highest price of the trailing window (0 at a peak)."""
+    counts = window_totals(values, window)[0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        below = (values / trailing_max(values, window) - 1) * 100
+    return np.where(counts >= min_periods, below, np.nan)
+
+
+@profiled
+def window_metrics(values, windows=WINDOWS, min_periods=EXPANDING_MIN_PERIODS):
+    """
+    Every metric of every series, as a dict of arrays shaped like values: <metric><window>M for the
+    trailing windows and <metric> for the expanding one.
+    """
+    metrics = {}
+    for window in list(windows) + [None]:
+        needed = window or min_periods
+        suffix = f"{window}M" if window else ""
+        metrics[f'Volatility{suffix}'] = volatility(values, window, needed)
+        metrics[f'ZScore{suffix}'] = zscore(values, window, needed)
+        metrics[f'Drawdown{suffix}'] = drawdown(values, window, needed)
+    return metrics
+
+
+@profiled
+def metrics_table(cube, metrics):
+    """
+    Long table of the cube's prices with their metrics, one row per (GEO, Products, month) that has
+    a price, in cube order. GEO and Products are categoricals and the values float32, to keep the
+    table small at national scale.
+    """
+    axes = cube['axes']
+    geo_idx, product_idx, month_idx = np.nonzero(~np.isnan(cube['values']))
+    table = pd.DataFrame({
+        'GEO': pd.Categorical.from_codes(geo_idx, categories=axes['GEO']),
+        'Products': pd.Categorical.from_codes(product_idx, categories=axes['Products']),
+        'REF_DATE': axes['REF_DATE'][month_idx],
+        'VALUE': cube['values'][geo_idx, product_idx, month_idx].astype('float32'),
+    })
+    for name, values in metrics.items():
+        table[name] = values[geo_idx, product_idx, month_idx].astype('float32')
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling and expanding volatility, z-scores and drawdowns of every price series.")
+    parser.add_argument('--cube', default=CUBE_FILE, help="Price cube written by data_cleaning.py")
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS, help="Trailing windows in months")
+    parser.add_argument('--min-periods', type=int, default=EXPANDING_MIN_PERIODS,
+                        help="Months an expanding value needs")
+    parser.add_argument('--output', default=VOLATILITY_FILE, help="Table the metrics are saved to")
+    args = parser.parse_args()
+
+    cube = load_cube(args.cube)
+    table = metrics_table(cube, window_metrics(cube['values'], args.windows, args.min_periods))
+    save_table(table, args.output)
+    n_series = int((~np.isnan(cube['values'])).any(axis=-1).sum())
+    print(f"Window metrics of {n_series} series ({len(table)} months) saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
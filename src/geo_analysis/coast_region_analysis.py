@@ -1,81 +1,53 @@
-import pandas as pd
+import argparse
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
-import numpy as np
-from scipy.stats import f_oneway, kruskal
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from figures import render_all
+from profiling import profiled
+from query import aggregate, collect, derive, scan, where
+from region_compare import kruskal_by_group, pairwise_differences, region_matrix
+from storage import load_table, save_table
 
+# Regions compared, in the order of the comparison columns
+REGIONS = ['East Coast', 'West Coast', 'Interior']
+
+
+@profiled
 def cal_avg_per_region(input_file):
     """
     Calculates the average value per category per year for all provinces in each region and saves the result to a CSV file.
     """
-    province_categories = {
-        'British Columbia': 'West Coast',
-        'Alberta': 'Interior',
-        'Saskatchewan': 'Interior',
-        'Manitoba': 'Interior',
-        'Ontario': 'Interior',
-        'Quebec': 'Interior',
-        'Newfoundland and Labrador': 'East Coast',
-        'Nova Scotia': 'East Coast',
-        'New Brunswick': 'East Coast',
-        'Prince Edward Island': 'East Coast',
-    }
-
-    # Load the data
-    data = pd.read_csv(input_file)
-    data['region'] = data['province'].map(province_categories)
-
-
-      # Filter for the required categories
+    # Only the required categories and columns are read from the table
     valid_categories = ['fruits', 'veggies', 'meat', 'dairy']
-    data = data[data['category'].str.lower().isin(valid_categories)]
+    plan = where(scan(input_file), ('category', 'iin', valid_categories))
+    plan = derive(plan, 'region', 'province', 'coast')
 
     # Group by region, year, and category, then calculate the average
-    grouped = data.groupby(['region', 'year', 'category']).agg(
-        avg_value=('avg_value', 'mean')
-    ).reset_index()
+    grouped = collect(aggregate(plan, ['region', 'year', 'category'], avg_value=('avg_value', 'mean')))
 
     # Save the aggregated results to a new CSV file
     output_file = 'output/geo_csv/regions/avg_value_reg.csv'
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    grouped.to_csv(output_file, index=False)
+    save_table(grouped, output_file)
 
     print(f"Aggregated data saved to: {output_file}")
     return output_file
 
 
-def pairwise_region_comparison(input_file):
+@profiled
+def pairwise_region_comparison(input_file, regions=REGIONS):
     """
     Compares average values across regions for each category and year using pairwise differences.
     """
-    data = pd.read_csv(input_file)
-    results_list = []
-
-    for year in data['year'].unique():
-        year_data = data[data['year'] == year]
-        for category in year_data['category'].unique():
-            category_data = year_data[year_data['category'] == category]
-
-            east = category_data[category_data['region'] == 'East Coast']['avg_value'].values
-            west = category_data[category_data['region'] == 'West Coast']['avg_value'].values
-            interior = category_data[category_data['region'] == 'Interior']['avg_value'].values
-
-            if len(east) == 1 and len(west) == 1 and len(interior) == 1:
-                diff_east_west = abs(east[0] - west[0])
-                diff_east_interior = abs(east[0] - interior[0])
-                diff_west_interior = abs(west[0] - interior[0])
-
-                results_list.append({
-                    'year': year,
-                    'category': category,
-                    'diff_east_west': diff_east_west,
-                    'diff_east_interior': diff_east_interior,
-                    'diff_west_interior': diff_west_interior
-                })
-
-    results_df = pd.DataFrame(results_list)
+    data = load_table(input_file)
+
+    # One row per (year, category) with a column per region, then every pair of regions at once
+    matrix = region_matrix(data, regions)
+    results_df = pairwise_differences(matrix, regions)
+
     output_file = 'output/geo_csv/pairwise_region_comparison_results.csv'
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     results_df.to_csv(output_file, index=False)
@@ -84,28 +56,14 @@ def pairwise_region_comparison(input_file):
     return results_df
 
 
-def extended_region_comparison(input_file):
+@profiled
+def extended_region_comparison(input_file, regions=REGIONS):
     """
-    Performs pairwise region comparison with Kruskal-Wallis test.
+    Performs pairwise region comparison with Kruskal-Wallis test, for all categories at once.
     """
-    data = pd.read_csv(input_file)
-    results_list = []
-
-    for category in data['category'].unique():
-        category_data = data[data['category'] == category]
-        east = category_data[category_data['region'] == 'East Coast']['avg_value']
-        west = category_data[category_data['region'] == 'West Coast']['avg_value']
-        interior = category_data[category_data['region'] == 'Interior']['avg_value']
-
-        if not (east.empty or west.empty or interior.empty):
-            kruskal_stat, kruskal_p = kruskal(east, west, interior)
-            results_list.append({
-                'category': category,
-                'kruskal_stat': kruskal_stat,
-                'kruskal_p': kruskal_p,
-            })
-
-    results_df = pd.DataFrame(results_list)
+    data = load_table(input_file)
+    results_df = kruskal_by_group(data, 'category', regions)
+
     output_file = 'output/geo_csv/extended_region_comparison_results.csv'
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     results_df.to_csv(output_file, index=False)
@@ -113,20 +71,10 @@ def extended_region_comparison(input_file):
     print(f"Extended region comparison results saved to: {output_file}")
     return results_df
 
-def visualize_differences(input_file):
+def plot_region_trends(data):
     """
-    Generates create line plot & heat map
+    Line plot: trends of values over the years for each region and category
     """
-    output_dir = 'output/geo_png'
-
-
-    # Load the processed data
-    data = pd.read_csv(input_file)
-
-    # Convert year to string for better plotting
-    data['year'] = data['year'].astype(str)
-
-    # Line Plot: Trends of values over the years for each region and category
     plt.figure(figsize=(15, 10))
     sns.lineplot(
         data=data,
@@ -143,12 +91,12 @@ def visualize_differences(input_file):
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    line_plot_path = os.path.join(output_dir, 'line_Regions.png')
-    plt.savefig(line_plot_path)
-    plt.close()
-    print(f"Line plot saved to: {line_plot_path}")
 
-    # Heatmap: Differences in average values over time by province and category
+
+def plot_region_heatmap(data):
+    """
+    Heatmap: differences in average values over time by province and category
+    """
     pivot_data = data.pivot_table(
         values='avg_value',
         index=['region', 'category'],
@@ -168,13 +116,35 @@ def visualize_differences(input_file):
     plt.xlabel('Year')
     plt.ylabel('Region and Category')
     plt.tight_layout()
+
+
+@profiled
+def visualize_differences(input_file):
+    """
+    Generates create line plot & heat map, drawn side by side and only when the data changes
+    """
+    output_dir = 'output/geo_png'
+
+    # Load the processed data
+    data = load_table(input_file)
+
+    # Convert year to string for better plotting
+    data['year'] = data['year'].astype(str)
+
+    line_plot_path = os.path.join(output_dir, 'line_Regions.png')
     heatmap_path = os.path.join(output_dir, 'heatmap_differences_regions.png')
-    plt.savefig(heatmap_path)
-    plt.close()
+    render_all([
+        (plot_region_trends, data, line_plot_path),
+        (plot_region_heatmap, data, heatmap_path),
+    ])
+    print(f"Line plot saved to: {line_plot_path}")
     print(f"Heatmap saved to: {heatmap_path}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Compare category prices across coast regions.")
+    parser.parse_args()
+
     input_file = 'output/geo_csv/avg_year_prov.csv'
     avg_file = cal_avg_per_region(input_file)
     pairwise_results = pairwise_region_comparison(avg_file)
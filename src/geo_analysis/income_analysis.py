@@ -1,9 +1,22 @@
+import argparse
 import os
+import sys
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import pearsonr, spearmanr
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from cached_loader import cached_loader
+from figures import render
+from parallel_stats import add_workers_argument, run_grouped_test
+from profiling import profiled
+import ref_date
+from ref_date import year_of
+from regions import PROVINCES
+from storage import load_table
+from temporal_join import join
+
 # File paths
 CSV_OUTPUT_DIR = "output/geo_csv/income"
 ITEM_SUMMARY_FILE = "output/geo_csv/avg_year_prov.csv"
@@ -13,49 +26,41 @@ INCOME_SUMMARY_FILE = "data/income.csv"
 PNG_OUTPUT_DIR = "output/geo_png"
 os.makedirs(PNG_OUTPUT_DIR, exist_ok=True)
 
-# List of provinces with data
-PROVINCES = [
-    "British Columbia", "Alberta", "Manitoba", "Quebec", "Ontario",
-    "Saskatchewan", "Prince Edward Island", "Newfoundland and Labrador",
-    "New Brunswick", "Nova Scotia"
-]
-
-def load_and_preprocess_income(filepath):
-    """Load and preprocess the income dataset."""
+@profiled
+@cached_loader(depends=[ref_date])
+def load_and_preprocess_income(filepath, provinces=PROVINCES):
+    """Load and preprocess the income dataset. Cached on the file contents, see cached_loader.py."""
     # Load income data and select relevant columns
     income = pd.read_csv(filepath, usecols=['REF_DATE', 'GEO', 'VALUE'])
     income.rename(columns={'REF_DATE': 'date', 'GEO': 'province', 'VALUE': 'income'}, inplace=True)
 
     # Extract the year from the date
-    income['year'] = pd.to_datetime(income['date']).dt.year
+    income['year'] = year_of(income['date'], name='year')
 
     # Average income by year and province
     income_avg = income.groupby(['province', 'year'])['income'].mean().reset_index()
 
     # Filter for relevant provinces
     income_avg['province'] = income_avg['province'].str.strip()
-    income_avg = income_avg[income_avg['province'].isin(PROVINCES)]
+    income_avg = income_avg[income_avg['province'].isin(provinces)]
     return income_avg
 
+@profiled
 def load_item_summary(filepath):
     """Load the item summary dataset."""
-    item_summary = pd.read_csv(filepath)
+    item_summary = load_table(filepath)
     item_summary.rename(columns={'avg_value': 'price'}, inplace=True)
     
     return item_summary
 
+@profiled
 def merge_data(item_summary, income_avg):
-    """Merge item prices and income data on year and province."""
-    merged = pd.merge(item_summary, income_avg, on=['year', 'province'], how='inner')
-
-    # if merged.empty:
-    #     print("Merged dataset is empty. Please check the input files.")
-    # else:
-    #     print("Merged dataset preview:")
-    #     print(merged.head())
+    """Merge item prices with the income of their province and year, or of the year before if that year has none."""
+    merged = join(item_summary, [(income_avg, ['income'], 'asof', 1)], ['province'], 'year', how='inner')
 
     return merged
 
+@profiled
 def analyze_income_vs_category_price(data):
     """Analyze how income of each province compares to the average price of each category."""
     comparison = data.groupby(['province', 'year', 'category']).agg({
@@ -70,8 +75,8 @@ def analyze_income_vs_category_price(data):
 
     return comparison
 
-def visualize_income_vs_price(data):
-    """Visualize the relationship between income and average category price."""
+def plot_income_vs_price(data):
+    """Draw the relationship between income and average category price."""
     plt.figure(figsize=(16, 10))
     sns.scatterplot(data=data, x='income', y='price', hue='category', style='province', palette='viridis')
     plt.title('Income vs Average Price of Categories by Province', fontsize=14)
@@ -80,29 +85,36 @@ def visualize_income_vs_price(data):
     plt.legend(title='Category & Province', bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=10)
     plt.tight_layout()
 
-    # Save the visualization
+@profiled
+def visualize_income_vs_price(data):
+    """Save the income vs price plot, redrawn only when the data changes."""
     output_png = os.path.join(PNG_OUTPUT_DIR, 'income_vs_price.png')
-    plt.savefig(output_png)
-    plt.show()
+    render(plot_income_vs_price, data, output_png)
     print(f"Visualization saved to {output_png}")
 
-def correlation_analysis(data):
-        """Perform correlation analysis between income and price."""
-        correlation_results = []
-        for category in data['category'].unique():
-            category_data = data[data['category'] == category]
-            correlation, p_value = spearmanr(category_data['income'], category_data['price'])
-            correlation_results.append({'Category': category, 'Correlation': correlation, 'P-Value': p_value})
+def spearman_by_category(category, income, price):
+    """Spearman correlation between income and price for one category."""
+    correlation, p_value = spearmanr(income, price)
+    return {'Category': category, 'Correlation': correlation, 'P-Value': p_value}
+
+@profiled
+def correlation_analysis(data, workers=None):
+    """Perform correlation analysis between income and price, with the categories split across workers."""
+    correlation_results = run_grouped_test(data, 'category', ['income', 'price'], spearman_by_category, workers)
 
-        # Convert to DataFrame
-        correlation_df = pd.DataFrame(correlation_results)
-        correlation_df.to_csv(os.path.join(CSV_OUTPUT_DIR, 'cor_income_analysis.csv'), index=False)
-        print(f"Correlation analysis results saved to {os.path.join(CSV_OUTPUT_DIR, 'cor_income_analysis.csv')}")
+    # Convert to DataFrame
+    correlation_df = pd.DataFrame(correlation_results)
+    correlation_df.to_csv(os.path.join(CSV_OUTPUT_DIR, 'cor_income_analysis.csv'), index=False)
+    print(f"Correlation analysis results saved to {os.path.join(CSV_OUTPUT_DIR, 'cor_income_analysis.csv')}")
 
-        return correlation_df
+    return correlation_df
 
 def main():
     """Main function to execute the income vs price analysis pipeline."""
+    parser = argparse.ArgumentParser(description="Correlate income with category prices.")
+    add_workers_argument(parser)
+    args = parser.parse_args()
+
     # Load and preprocess income data
     print(f"Loading income data from: {INCOME_SUMMARY_FILE}")
     income_avg = load_and_preprocess_income(INCOME_SUMMARY_FILE)
@@ -118,7 +130,7 @@ def main():
     comparison = analyze_income_vs_category_price(merged_data)
 
     # Perform correlation analysis
-    correlation_results = correlation_analysis(comparison)
+    correlation_results = correlation_analysis(comparison, args.workers)
     # Visualize the results
     visualize_income_vs_price(comparison)
 
@@ -1,9 +1,22 @@
+import argparse
 import os
+import sys
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import pearsonr, spearmanr
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from cached_loader import cached_loader
+from figures import render
+from parallel_stats import add_workers_argument, run_grouped_test
+from profiling import profiled
+import ref_date
+from ref_date import year_of
+from regions import PROVINCES
+from storage import load_table
+from temporal_join import join
+
 # File paths
 CSV_OUTPUT_DIR = "output/geo_csv/population"
 ITEM_SUMMARY_FILE = "output/geo_csv/avg_year_prov.csv"
@@ -13,44 +26,42 @@ POPULATION_FILE = "data/population.csv"
 PNG_OUTPUT_DIR = "output/geo_png"
 os.makedirs(PNG_OUTPUT_DIR, exist_ok=True)
 
-# List of provinces with data
-PROVINCES = [
-    "British Columbia", "Alberta", "Manitoba", "Quebec", "Ontario",
-    "Saskatchewan", "Prince Edward Island", "Newfoundland and Labrador",
-    "New Brunswick", "Nova Scotia"
-]
-
-def load_and_preprocess_population(filepath):
-    """Load and preprocess the population dataset."""
+@profiled
+@cached_loader(depends=[ref_date])
+def load_and_preprocess_population(filepath, provinces=PROVINCES):
+    """Load and preprocess the population dataset. Cached on the file contents, see cached_loader.py."""
     # Load population data and select relevant columns
     population = pd.read_csv(filepath, usecols=['REF_DATE', 'GEO', 'VALUE'])
     population.rename(columns={'REF_DATE': 'date', 'GEO': 'province', 'VALUE': 'population'}, inplace=True)
 
     # Extract the year from the date
-    population['year'] = pd.to_datetime(population['date']).dt.year
+    population['year'] = year_of(population['date'], name='year')
 
     # Average population by year and province
     population_avg = population.groupby(['province', 'year'])['population'].mean().reset_index()
 
     # Filter for relevant provinces
     population_avg['province'] = population_avg['province'].str.strip()
-    population_avg = population_avg[population_avg['province'].isin(PROVINCES)]
-   
+    population_avg = population_avg[population_avg['province'].isin(provinces)]
+
     return population_avg
 
+@profiled
 def load_item_summary(filepath):
     """Load the item summary dataset."""
-    item_summary = pd.read_csv(filepath)
+    item_summary = load_table(filepath)
     item_summary.rename(columns={'avg_value': 'price'}, inplace=True)
     
     return item_summary
 
+@profiled
 def merge_data(item_summary, population_avg):
-    """Merge item prices and population data on year and province."""
-    merged = pd.merge(item_summary, population_avg, on=['year', 'province'], how='inner')
+    """Merge item prices with the population of their province and year, or of the year before if that year has none."""
+    merged = join(item_summary, [(population_avg, ['population'], 'asof', 1)], ['province'], 'year', how='inner')
 
     return merged
 
+@profiled
 def analyze_population_vs_category_price(data):
     """Analyze how population compares to the average price of each category."""
     comparison = data.groupby(['province', 'year', 'category']).agg({
@@ -65,8 +76,8 @@ def analyze_population_vs_category_price(data):
 
     return comparison
 
-def visualize_population_vs_price(data):
-    """Visualize the relationship between population and average category price."""
+def plot_population_vs_price(data):
+    """Draw the relationship between population and average category price."""
     plt.figure(figsize=(16, 10))
     sns.scatterplot(data=data, x='population', y='price', hue='category', style='province', palette='viridis')
     plt.title('Population vs Average Price of Categories by Province', fontsize=14)
@@ -75,19 +86,22 @@ def visualize_population_vs_price(data):
     plt.legend(title='Category & Province', bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=10)
     plt.tight_layout()
 
-    # Save the visualization
+@profiled
+def visualize_population_vs_price(data):
+    """Save the population vs price plot, redrawn only when the data changes."""
     output_png = os.path.join(PNG_OUTPUT_DIR, 'population_vs_price.png')
-    plt.savefig(output_png)
-    plt.show()
+    render(plot_population_vs_price, data, output_png)
     print(f"Visualization saved to {output_png}")
 
-def correlation_analysis(data):
-    """Perform correlation analysis between population and price."""
-    correlation_results = []
-    for category in data['category'].unique():
-        category_data = data[data['category'] == category]
-        correlation, p_value = spearmanr(category_data['population'], category_data['price'])
-        correlation_results.append({'Category': category, 'Correlation': correlation, 'P-Value': p_value})
+def spearman_by_category(category, population, price):
+    """Spearman correlation between population and price for one category."""
+    correlation, p_value = spearmanr(population, price)
+    return {'Category': category, 'Correlation': correlation, 'P-Value': p_value}
+
+@profiled
+def correlation_analysis(data, workers=None):
+    """Perform correlation analysis between population and price, with the categories split across workers."""
+    correlation_results = run_grouped_test(data, 'category', ['population', 'price'], spearman_by_category, workers)
 
     # Convert to DataFrame
     correlation_df = pd.DataFrame(correlation_results)
@@ -98,6 +112,10 @@ def correlation_analysis(data):
 
 def main():
     """Main function to execute the population vs price analysis pipeline."""
+    parser = argparse.ArgumentParser(description="Correlate population with category prices.")
+    add_workers_argument(parser)
+    args = parser.parse_args()
+
     # Load and preprocess population data
     print(f"Loading population data from: {POPULATION_FILE}")
     population_avg = load_and_preprocess_population(POPULATION_FILE)
@@ -113,7 +131,7 @@ def main():
     comparison = analyze_population_vs_category_price(merged_data)
 
     # Perform correlation analysis
-    correlation_results = correlation_analysis(comparison)
+    correlation_results = correlation_analysis(comparison, args.workers)
 
     # Visualize the results
     visualize_population_vs_price(comparison)
@@ -1,15 +1,18 @@
+import argparse
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import ttest_ind, mannwhitneyu
 
-# Group provinces into urban and rural
-URBAN_PROVINCES = ["Ontario", "Quebec", "Alberta", "British Columbia", "New Brunswick", "Nova Scotia"]
-RURAL_PROVINCES = [
-     "Manitoba", "Saskatchewan", "Prince Edward Island",
-    "Newfoundland and Labrador"
-]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cleaning'))
+from figures import barplot, render_all
+from parallel_stats import add_workers_argument, parallel_map
+from profiling import profiled
+from query import aggregate, collect, derive, scan, where
+from regions import group_column
+from storage import load_table
 
 # Paths to CSV output files
 CSV_OUTPUT_DIR = "output/geo_csv/urban_rural"
@@ -18,44 +21,28 @@ ITEM_SUMMARY_FILE = "output/geo_csv/years/food_prices_item.csv"
 # Output directory for visualizations
 PNG_OUTPUT_DIR = "output/geo_png"
 os.makedirs(PNG_OUTPUT_DIR, exist_ok=True)
+PRICES_PNG = os.path.join(PNG_OUTPUT_DIR, "urban_vs_rural_prices.png")
+YEARLY_TRENDS_PNG = os.path.join(PNG_OUTPUT_DIR, "yearly_trends_by_region_and_category.png")
 
+@profiled
 def load_data(filepath):
     """Load the item summary CSV file."""
-    data = pd.read_csv(filepath)
+    data = load_table(filepath)
     return data
 
+@profiled
 def cal_avg_per_region(data):
     """
     Calculates the average value per category per year for all provinces in each region
     and saves the result to a CSV file.
     """
-    province_categories = {
-        'Ontario': 'Urban',
-        'Quebec': 'Urban',
-        'Alberta': 'Urban',
-        'British Columbia': 'Urban',
-        'New Brunswick': 'Urban',
-        'Nova Scotia': 'Urban',
-        'Manitoba': 'Rural',
-        'Saskatchewan': 'Rural',
-        'Prince Edward Island': 'Rural',
-        'Newfoundland and Labrador': 'Rural',
-    }
-
-    # Map provinces to regions
-
-    data = pd.read_csv(data)
-
-    data['region'] = data['province'].map(province_categories)
-    
-      # Filter 
+    # Filter, and map provinces to regions; only the needed rows and columns are read
     valid_categories = ['fruits', 'veggies', 'meat', 'dairy']
-    data = data[data['category'].str.lower().isin(valid_categories)]
+    plan = where(scan(data), ('category', 'iin', valid_categories))
+    plan = derive(plan, 'region', 'province', 'urban_rural')
 
     # Group by region, year, and category, then calculate the average
-    grouped = data.groupby(['region', 'year', 'category']).agg(
-        avg_value=('avg_value', 'mean')
-    ).reset_index()
+    grouped = collect(aggregate(plan, ['region', 'year', 'category'], avg_value=('avg_value', 'mean')))
 
     # Save the aggregated results to a new CSV file
     output_file = os.path.join(CSV_OUTPUT_DIR, "avg_val_urban_rural.csv")
@@ -65,13 +52,13 @@ def cal_avg_per_region(data):
     return grouped
 
 
+@profiled
 def add_urban_rural_column(data):
     """Add a column categorizing provinces as urban or rural."""
-    data['region_type'] = data['province'].apply(
-        lambda x: 'Urban' if x in URBAN_PROVINCES else 'Rural'
-    )
+    data['region_type'] = group_column(data['province'], 'urban_rural', default='Rural')
     return data
 
+@profiled
 def compute_average_by_region(data):
     """Compute average prices by region type (urban vs rural)."""
     region_summary = data.groupby(['Products', 'region_type'])['avg_total_yearly'].mean().reset_index()
@@ -79,39 +66,38 @@ def compute_average_by_region(data):
 
     return region_summary
 
-def perform_mannwhitneyu_test(region_summary):
-    """Perform Mann-Whitney U Test to compare urban and rural prices."""
-    results = []
-
+def mannwhitneyu_product(product, urban_price, rural_price):
+    """Mann-Whitney U Test of one product's urban and rural prices."""
+    # Check if either value is missing
+    if pd.isna(urban_price) or pd.isna(rural_price):
+        return {'Product': product, 'U-Statistic': None, 'P-Value': None, 'Notes': 'Missing data'}
+
+    # Check for very small differences
+    if abs(urban_price - rural_price) < 1e-6:  # Threshold for negligible difference
+        return {
+            'Product': product,
+            'U-Statistic': None,
+            'P-Value': None,
+            'Notes': 'Very small mean difference (treated as negligible)'
+        }
+
+    try:
+        # Perform Mann-Whitney U Test
+        stat, p_value = mannwhitneyu([urban_price], [rural_price], alternative='two-sided')
+        return {'Product': product, 'U-Statistic': stat, 'P-Value': p_value}
+    except Exception as inner_e:
+        return {'Product': product, 'U-Statistic': None, 'P-Value': None, 'Notes': f'Error: {str(inner_e)}'}
+
+def urban_rural_prices(region_summary):
+    """(product, urban price, rural price) for each product."""
     # Pivot data to separate urban and rural columns for each product
     pivoted_summary = region_summary.pivot(index='Products', columns='region_type', values='region_avg')
+    return list(zip(pivoted_summary.index, pivoted_summary['Urban'], pivoted_summary['Rural']))
 
-    # Loop through each product
-    for product in pivoted_summary.index:
-        urban_price = pivoted_summary.loc[product, 'Urban']
-        rural_price = pivoted_summary.loc[product, 'Rural']
-
-        # Check if either value is missing
-        if pd.isna(urban_price) or pd.isna(rural_price):
-            results.append({'Product': product, 'U-Statistic': None, 'P-Value': None, 'Notes': 'Missing data'})
-            continue
-
-        # Check for very small differences
-        if abs(urban_price - rural_price) < 1e-6:  # Threshold for negligible difference
-            results.append({
-                'Product': product,
-                'U-Statistic': None,
-                'P-Value': None,
-                'Notes': 'Very small mean difference (treated as negligible)'
-            })
-            continue
-
-        try:
-            # Perform Mann-Whitney U Test
-            stat, p_value = mannwhitneyu([urban_price], [rural_price], alternative='two-sided')
-            results.append({'Product': product, 'U-Statistic': stat, 'P-Value': p_value})
-        except Exception as inner_e:
-            results.append({'Product': product, 'U-Statistic': None, 'P-Value': None, 'Notes': f'Error: {str(inner_e)}'})
+@profiled
+def perform_mannwhitneyu_test(region_summary, workers=None):
+    """Perform Mann-Whitney U Test to compare urban and rural prices, with the products split across workers."""
+    results = parallel_map(mannwhitneyu_product, urban_rural_prices(region_summary), workers)
 
     # Convert results to DataFrame
     mannwhitneyu_results = pd.DataFrame(results)
@@ -120,47 +106,41 @@ def perform_mannwhitneyu_test(region_summary):
 
     return mannwhitneyu_results
 
-def perform_mannwhitneyu_test_small(region_summary):
-    """Perform Mann-Whitney U Test to compare urban and rural prices, and calculate trends."""
-    results = []
-
-    # Pivot data to separate urban and rural columns for each product
-    pivoted_summary = region_summary.pivot(index='Products', columns='region_type', values='region_avg')
-
-    # Loop through each product
-    for product in pivoted_summary.index:
-        urban_price = pivoted_summary.loc[product, 'Urban']
-        rural_price = pivoted_summary.loc[product, 'Rural']
-
-        # Check if either value is missing
-        if pd.isna(urban_price) or pd.isna(rural_price):
-            results.append({'Product': product, 'U-Statistic': None, 'P-Value': None, 
-                            'Effect Size': None, 'Urban-Rural Diff': None, 'Notes': 'Missing data'})
-            continue
-
-        # Calculate absolute and percentage difference
-        diff = urban_price - rural_price
-        percent_diff = (diff / rural_price) * 100 if rural_price != 0 else None
-
-        try:
-            # Perform Mann-Whitney U Test
-            stat, p_value = mannwhitneyu([urban_price], [rural_price], alternative='two-sided')
-
-            # Calculate effect size (absolute difference normalized by mean of both groups)
-            mean_price = (urban_price + rural_price) / 2
-            effect_size = diff / mean_price if mean_price != 0 else None
-
-            results.append({
-                'Product': product,
-                'U-Statistic': stat,
-                'P-Value': p_value,
-                'Effect Size': effect_size,
-                'Urban-Rural Diff': diff,
-                'Percent Diff (%)': percent_diff,
-            })
-        except Exception as inner_e:
-            results.append({'Product': product, 'U-Statistic': None, 'P-Value': None, 
-                            'Effect Size': None, 'Urban-Rural Diff': None, 'Notes': f'Error: {str(inner_e)}'})
+def mannwhitneyu_product_small(product, urban_price, rural_price):
+    """Mann-Whitney U Test of one product's urban and rural prices, with the effect size and differences."""
+    # Check if either value is missing
+    if pd.isna(urban_price) or pd.isna(rural_price):
+        return {'Product': product, 'U-Statistic': None, 'P-Value': None,
+                'Effect Size': None, 'Urban-Rural Diff': None, 'Notes': 'Missing data'}
+
+    # Calculate absolute and percentage difference
+    diff = urban_price - rural_price
+    percent_diff = (diff / rural_price) * 100 if rural_price != 0 else None
+
+    try:
+        # Perform Mann-Whitney U Test
+        stat, p_value = mannwhitneyu([urban_price], [rural_price], alternative='two-sided')
+
+        # Calculate effect size (absolute difference normalized by mean of both groups)
+        mean_price = (urban_price + rural_price) / 2
+        effect_size = diff / mean_price if mean_price != 0 else None
+
+        return {
+            'Product': product,
+            'U-Statistic': stat,
+            'P-Value': p_value,
+            'Effect Size': effect_size,
+            'Urban-Rural Diff': diff,
+            'Percent Diff (%)': percent_diff,
+        }
+    except Exception as inner_e:
+        return {'Product': product, 'U-Statistic': None, 'P-Value': None,
+                'Effect Size': None, 'Urban-Rural Diff': None, 'Notes': f'Error: {str(inner_e)}'}
+
+@profiled
+def perform_mannwhitneyu_test_small(region_summary, workers=None):
+    """Perform Mann-Whitney U Test to compare urban and rural prices, and calculate trends, with the products split across workers."""
+    results = parallel_map(mannwhitneyu_product_small, urban_rural_prices(region_summary), workers)
 
     # Convert results to DataFrame
     mannwhitneyu_results = pd.DataFrame(results)
@@ -170,7 +150,7 @@ def perform_mannwhitneyu_test_small(region_summary):
 
     return mannwhitneyu_results
 
-def visualize_yearly_trends_by_region(data):
+def plot_yearly_trends_by_region(data):
     """
     Create a line graph showing yearly trends in average values for each category by region (urban vs rural).
     """
@@ -195,28 +175,26 @@ def visualize_yearly_trends_by_region(data):
     plt.xticks(rotation=45)
     plt.tight_layout()
 
-    # Save the plot to a file
-    output_path = os.path.join(PNG_OUTPUT_DIR, "yearly_trends_by_region_and_category.png")
-    plt.savefig(output_path)
-    plt.show()
-
 
-def visualize_urban_rural_differences(region_summary):
+def plot_urban_rural_differences(region_summary):
     """Create bar chart comparing urban vs rural prices for each product."""
     plt.figure(figsize=(16, 10))  # Increased figure size for better readability
-    sns.barplot(data=region_summary, x='Products', y='region_avg', hue='region_type', palette='viridis')
+    # One bar per product and region type; past LARGE_BAR_CHART bars they are drawn without seaborn
+    barplot(region_summary, x='Products', y='region_avg', hue='region_type', palette='viridis')
     plt.title('Urban vs Rural Average Prices by Product', fontsize=14)
     plt.xlabel('Product', fontsize=12)
     plt.ylabel('Average Price', fontsize=12)
     plt.xticks(rotation=90, fontsize=10, ha='center')  # Rotate and align labels cleanly
     plt.legend(title='Region Type', loc='upper right', fontsize=10)
     plt.tight_layout()  # Adjust layout to prevent clipping
-    plt.savefig(os.path.join(PNG_OUTPUT_DIR, "urban_vs_rural_prices.png"))
-    plt.show()
 
 
 def main():
     """Main function to load data, analyze, and visualize."""
+    parser = argparse.ArgumentParser(description="Compare urban and rural food prices.")
+    add_workers_argument(parser)
+    args = parser.parse_args()
+
     # Load the item summary data
     print(f"Loading data from: {ITEM_SUMMARY_FILE}")
     data = load_data(ITEM_SUMMARY_FILE)
@@ -232,15 +210,15 @@ def main():
     # Compute average prices by region type
     region_summary = compute_average_by_region(data)
 
-    perform_mannwhitneyu_test(region_summary)
+    perform_mannwhitneyu_test(region_summary, args.workers)
     #preform small as vals are very close (thresholds)
-    perform_mannwhitneyu_test_small(region_summary)
-
-    # Visualize the differences
-    visualize_urban_rural_differences(region_summary)
+    perform_mannwhitneyu_test_small(region_summary, args.workers)
 
-    # Visualize yearly trends
-    visualize_yearly_trends_by_region(line_graph)
+    # Visualize the differences and the yearly trends, both at once
+    render_all([
+        (plot_urban_rural_differences, region_summary, PRICES_PNG),
+        (plot_yearly_trends_by_region, line_graph, YEARLY_TRENDS_PNG),
+    ])
 
 
     # Save the summary to a CSV file